@@ -1,4 +1,6 @@
 import heapq
+from algorithms import indexed_search, corridor_graph, hierarchical_search
+from algorithms.transition_graph import TransitionGraph
 from utils.helper import manhattan_distance, is_intersection_and_above_below, is_cell_in_margins
 
 
@@ -56,20 +58,29 @@ def get_possible_directions(grid, node):
     return neighbors
 
 
-def a_star(grid, start, goal):
+def a_star(grid, start, goal, graph=None):
     """
     Implements the A* algorithm to find the shortest path from a start node to a goal node.
     Considers movement costs and heuristic estimates (Manhattan distance) for optimal pathfinding.
+
+    Given the compiled state graph of the grid, the search runs over its integer states
+    (see `a_star_indexed`). Without one, the moves are worked out with `get_possible_directions`
+    as the search goes: compiling a graph visits every cell, which costs far more than a
+    single search that only expands the cells between start and goal.
     
     Parameters:
         grid (list[list[int]]): The 2D grid representing the environment.
         start (tuple): The starting node as ((x, y), direction).
         goal (tuple): The goal node as ((x, y), direction).
+        graph (TransitionGraph): The compiled state graph of the grid, if one is at hand.
         
     Returns:
         list[tuple]: A list of nodes representing the shortest path from start to goal.
                      Returns None if no path is found.
     """
+    if graph is not None:
+        return indexed_search.a_star_indexed(grid, start, goal, graph)
+
     # Initialize open and closed lists
 
     open_list = []
@@ -148,18 +159,23 @@ def reconstruct_path(came_from, current_node):
     return path
 
 
-def a_star_multiple_goals(grid, start):
+def a_star_multiple_goals(grid, start, graph=None):
     """
     Finds the shortest path from the start node to the nearest goal among multiple possible goals.
     Uses the A* algorithm to calculate paths to each goal and selects the shortest one.
+    As with `a_star`, the searches run over the integer states of the compiled graph when given.
     
     Parameters:
         grid (list[list[int]]): The 2D grid representing the environment.
         start (tuple): The starting node as ((x, y), direction).
+        graph (TransitionGraph): The compiled state graph of the grid, if one is at hand.
         
     Returns:
         list[tuple]: The shortest path to the nearest goal. Returns None if no path is found.
     """
+    if graph is not None:
+        return indexed_search.a_star_multiple_goals_indexed(grid, start, graph)
+
     # Identify all emergency services (goals)
     emergencies = []
     for y in range(len(grid)):
@@ -188,32 +204,100 @@ def a_star_multiple_goals(grid, start):
     return shortest_path
 
 
-def find_all_shortest_paths(grid):
+def get_step_cost(grid, cell):
+    """
+    Returns the cost of leaving a cell, matching the cost model used by `a_star`.
+    Intersections lying in the margins of the grid are penalized with `len(grid)//8`,
+    every other cell costs 1.
+
+    Parameters:
+        grid (list[list[int]]): The 2D grid representing the environment.
+        cell (tuple): The cell being left as (x, y).
+
+    Returns:
+        int: The cost of the move out of the cell.
+    """
+    x, y = cell
+    if grid[y][x] == 3 and is_cell_in_margins(grid, cell):
+        return len(grid) // 8
+    return 1
+
+
+def find_nearest_service_paths(grid, graph=None):
+    """
+    Finds the path and cost from every building to its nearest emergency service using
+    one backward search from all emergency services instead of one A* per pair.
+
+    Parameters:
+        grid (list[list[int]]): The 2D grid representing the environment.
+        graph (TransitionGraph | CorridorGraph | HierarchicalGraph): The compiled state graph
+                      of the grid, built when omitted. With a corridor graph the search
+                      crosses a corridor per expansion; with a hierarchical graph it runs
+                      over block entrances and refines the routes block by block.
+
+    Returns:
+        dict: A dictionary mapping each building position (x, y) to a (path, cost) tuple.
+              Buildings that cannot reach any emergency service map to (None, None).
+    """
+    if graph is None:
+        graph = TransitionGraph(grid)
+    if isinstance(graph, corridor_graph.CorridorGraph):
+        return corridor_graph.find_nearest_service_paths(graph)
+    if isinstance(graph, hierarchical_search.HierarchicalGraph):
+        return hierarchical_search.find_nearest_service_paths(graph)
+    return indexed_search.find_nearest_service_paths(graph)
+
+
+def find_all_path_costs(grid, graph=None):
+    """
+    Finds the cost, length and counted intersections of the path from every building to
+    its nearest emergency service without building any path lists. The result describes
+    the same paths as `find_all_shortest_paths`, so it is all `calculate_fitness_from_path_costs`
+    needs to score a grid.
+
+    Parameters:
+        grid (list[list[int]]): The 2D grid representing the environment.
+        graph (TransitionGraph | CorridorGraph | HierarchicalGraph): The compiled state graph
+                      of the grid, built when omitted.
+
+    Returns:
+        dict: A dictionary mapping each building position (x, y) to a (cost, path_length,
+              intersection_count) tuple, where path_length is the number of nodes and
+              intersection_count the number of nodes `calculate_fitness` counts as intersections.
+              Buildings that cannot reach any emergency service are left out.
+    """
+    if graph is None:
+        graph = TransitionGraph(grid)
+    if isinstance(graph, corridor_graph.CorridorGraph):
+        return corridor_graph.find_all_path_costs(graph)
+    if isinstance(graph, hierarchical_search.HierarchicalGraph):
+        return hierarchical_search.find_all_path_costs(graph)
+    return indexed_search.find_all_path_costs(graph)
+
+
+def find_all_shortest_paths(grid, graph=None):
     """
     Finds the shortest path from each building in the grid to the nearest emergency service.
-    Uses A* with multiple goals to calculate paths for each building.
+    All buildings are served by a single backward search from the emergency services
+    (see `find_nearest_service_paths`), and the paths are those `a_star_multiple_goals`
+    returns for each building.
+
+    The backward search keeps, for each building, the cheapest route with the fewest nodes,
+    while `a_star` keeps whichever cheapest route its heap reaches first. Buildings whose
+    route is not the only cheapest one, and every building on grids of fewer than 8 rows,
+    are therefore searched with A* instead (see `is_only_cheapest_route`).
     
     Parameters:
         grid (list[list[int]]): The 2D grid representing the environment.
+        graph (TransitionGraph | CorridorGraph | HierarchicalGraph): The compiled state graph
+                      of the grid, built when omitted.
         
     Returns:
         list[list[tuple]]: An array of shortest paths for each building. Each path is a list of nodes.
     """
-    buildings = []  # Array to store building positions
     shortest_paths = []  # Array to store the shortest paths for each building
 
-    # Step 1: Locate all buildings
-    for y in range(len(grid)):
-        for x in range(len(grid[0])):
-            if grid[y][x] == 1:  # Building marked as 1
-                buildings.append((x, y))
-
-    # print(f"Found {len(buildings)} buildings.")
-
-    # Step 2: For each building, use BFS to find the shortest path to the nearest emergency service
-    for building in buildings:
-        # print(f"Calculating shortest path for building at {building}...")
-        shortest_path = a_star_multiple_goals(grid, (building,None))  # Use BFS to get shortest path for the building
+    for building, (shortest_path, _) in find_nearest_service_paths(grid, graph).items():
         if shortest_path:
             shortest_paths.append(shortest_path)  # Add the path to the list if found
         else:
@@ -0,0 +1,502 @@
+import numpy as np
+from algorithms.transition_graph import (DIRECTIONS, TRANSITIONS, DIRECTION_OFFSETS, INTERSECTION, EVEN_ROW_ROAD,
+                                         OTHER_CELL, NO_DIRECTION, LEFT, RIGHT, TransitionGraph)
+from algorithms.indexed_search import find_a_star_path, describe_path
+from utils.city_grid import CityGrid
+from utils.genome import Genome
+from utils.population import PopulationTensor
+
+# TRANSITIONS as an array indexed by [cell kind, incoming direction, slot], -1 marking unused slots
+TRANSITION_TABLE = np.full((len(TRANSITIONS), NO_DIRECTION + 1, 4), -1, dtype=np.int64)
+for _kind, _kind_transitions in enumerate(TRANSITIONS):
+    for _direction, _moves in enumerate(_kind_transitions):
+        TRANSITION_TABLE[_kind, _direction, :len(_moves)] = _moves
+
+UNREACHABLE = np.iinfo(np.int64).max // 4  # Label of the states with no route to a service
+BATCH_SIZE = 256  # Grids searched together, bounding the size of the label arrays
+
+
+def to_cell_array(grids):
+    """
+    Stacks a population into one (pop, H, W) int8 array.
+
+    Parameters:
+        grids (PopulationTensor | numpy.ndarray | list): The grids, as a population tensor,
+            an array of cells or a list of CityGrid, Genome or list grids.
+
+    Returns:
+        numpy.ndarray: The cells of every grid.
+    """
+    if isinstance(grids, PopulationTensor):
+        return grids.cells
+    if isinstance(grids, np.ndarray):
+        return grids.astype(np.int8, copy=False)
+    arrays = []
+    for grid in grids:
+        if isinstance(grid, Genome):
+            grid = grid.to_grid()
+        arrays.append(grid.array if isinstance(grid, CityGrid) else np.asarray(grid, dtype=np.int8))
+    return np.stack(arrays)
+
+
+class BatchGraph:
+    """
+    The state graphs of a population of grids, as arrays with one row per grid.
+
+    States are numbered as in `TransitionGraph` (cell * 4 + direction, a cell (x, y) having
+    index x * height + y), plus one extra state, `state_count`, standing for "no state":
+    missing successors point to it and it can never reach a service.
+
+    Attributes:
+        size (int): The number of grids.
+        height (int): The number of rows of the grids.
+        width (int): The number of columns of the grids.
+        state_count (int): The number of states of one grid, without the extra state.
+        label_base (int): The base labels are packed with: cost * label_base + length.
+        values (numpy.ndarray): (size, cells) cell values.
+        neighbors (numpy.ndarray): (cells, 4) neighbor cell of each cell in each direction.
+        step_costs (numpy.ndarray): (size, cells) cost of leaving each cell.
+        successors (numpy.ndarray): (size, state_count + 1, 4) successors of every state.
+        edge_labels (numpy.ndarray): (size, state_count + 1) label added along an edge out
+                                     of each state.
+    """
+
+    def __init__(self, cells):
+        """
+        Parameters:
+            cells (numpy.ndarray): The (pop, H, W) cells of the grids.
+        """
+        self.size, self.height, self.width = cells.shape
+        cell_count = self.height * self.width
+        self.state_count = 4 * cell_count
+        self.label_base = self.state_count + 2
+
+        self.values = cells.transpose(0, 2, 1).reshape(self.size, cell_count).astype(np.int64)
+        x, y = np.divmod(np.arange(cell_count), self.height)
+        kinds = np.where(self.values == 3, INTERSECTION,
+                         np.where((y % 2 == 0) & (self.values == 0), EVEN_ROW_ROAD, OTHER_CELL))
+        # Like `get_step_cost`, the margins are checked reading (x, y) as (row, column)
+        in_margins = (x == 0) | (x == self.height - 1) | (y == 0) | (y == self.width - 1)
+        self.step_costs = np.where((self.values == 3) & in_margins, self.height // 8, 1)
+
+        self.neighbors = np.full((cell_count, 4), -1, dtype=np.int64)
+        for direction, (dx, dy) in enumerate(DIRECTION_OFFSETS):
+            inside = (0 <= x + dx) & (x + dx < self.width) & (0 <= y + dy) & (y + dy < self.height)
+            self.neighbors[inside, direction] = (x[inside] + dx) * self.height + y[inside] + dy
+
+        moves = TRANSITION_TABLE[kinds[:, :, np.newaxis], np.arange(4)].reshape(self.size, self.state_count, 4)
+        state_cells = np.arange(self.state_count) // 4
+        targets = np.where(moves >= 0, self.neighbors[state_cells[:, np.newaxis], np.maximum(moves, 0)], -1)
+        successors = np.where(targets >= 0, targets * 4 + moves, self.state_count)
+        self.successors = np.concatenate([successors, np.full((self.size, 1, 4), self.state_count)], axis=1)
+        step_costs = np.concatenate([self.step_costs[:, state_cells], np.zeros((self.size, 1), dtype=np.int64)], axis=1)
+        self.edge_labels = step_costs * self.label_base + 1
+
+    def flat_successors(self):
+        """
+        Returns:
+            numpy.ndarray: The successors of every state of every grid as indexes into the
+                           (size * (state_count + 1)) flattened state rows of all grids.
+        """
+        offsets = np.arange(self.size)[:, np.newaxis, np.newaxis] * (self.state_count + 1)
+        return (self.successors + offsets).ravel()
+
+    def flat_predecessors(self):
+        """
+        Returns:
+            numpy.ndarray: (size * (state_count + 1), 4) predecessors of every state of every
+                           grid as flattened indexes like `flat_successors`, unused slots
+                           pointing to the extra state of the first grid.
+        """
+        row_length = self.state_count + 1
+        sources = np.repeat(np.arange(self.size * row_length), 4)
+        targets = self.flat_successors()
+        valid = targets % row_length != self.state_count
+        sources, targets = sources[valid], targets[valid]
+        order = np.argsort(targets, kind="stable")
+        sources, targets = sources[order], targets[order]
+        # Rank of each edge among the edges into the same state
+        group_starts = np.flatnonzero(np.r_[True, targets[1:] != targets[:-1]])
+        ranks = np.arange(len(targets)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(targets)]))
+        predecessors = np.full((self.size * row_length, 4), self.state_count, dtype=np.int64)
+        predecessors[targets, ranks] = sources
+        return predecessors
+
+    def goals(self, services):
+        """
+        Marks, for every emergency service, the states in which `a_star` would stop, like
+        `TransitionGraph.goal_states` does for one grid.
+
+        Parameters:
+            services (list[tuple]): The (x, y) positions of the emergency services.
+
+        Returns:
+            numpy.ndarray: (services, size, state_count + 1) booleans.
+        """
+        goals = np.zeros((len(services), self.size, self.state_count + 1), dtype=bool)
+        for service, (x, y) in enumerate(services):
+            for cell_y, entering_direction in ((y - 1, RIGHT), (y + 1, LEFT)):
+                if not 0 <= cell_y < self.height:
+                    continue
+                cell = x * self.height + cell_y
+                goals[service, :, cell * 4 + entering_direction] = True
+                goals[service, self.values[:, cell] == 3, cell * 4:cell * 4 + 4] = True
+        return goals
+
+
+def wavefront_labels(graph, goals):
+    """
+    Computes the label of every state of every grid towards every emergency service with a
+    synchronous wavefront. The wavefront starts at the goal states; at each step, every
+    predecessor of a state whose label improved takes the best label among its successors
+    plus its edge label, for all grids and services at once, until no label improves.
+    Labels being packed (cost, length) pairs with positive edge labels, they converge to the
+    labels `search_from_emergency_services` settles.
+
+    Parameters:
+        graph (BatchGraph): The state graphs of the population.
+        goals (numpy.ndarray): (services, size, state_count + 1) goal states.
+
+    Returns:
+        numpy.ndarray: (services, size, state_count + 1) labels, UNREACHABLE for the states
+                       with no route to the service.
+    """
+    rows = goals.shape[0] * graph.size
+    row_length = graph.state_count + 1
+    grid_length = graph.size * row_length
+    successors = graph.flat_successors().reshape(-1, 4)
+    predecessors = graph.flat_predecessors()
+    edge_labels = graph.edge_labels.ravel()
+
+    labels = np.where(goals, 1, UNREACHABLE).ravel()
+    changed = np.flatnonzero(goals)
+    waiting = np.zeros(rows * row_length, dtype=bool)
+    while len(changed):
+        # Flattened indexes run over services first, the graph arrays over grids only
+        service_offsets, grid_states = np.divmod(changed, grid_length)
+        waiting[(predecessors[grid_states] + service_offsets[:, np.newaxis] * grid_length).ravel()] = True
+        states = np.flatnonzero(waiting)
+        waiting[states] = False
+        service_offsets, grid_states = np.divmod(states, grid_length)
+        candidates = labels[successors[grid_states] + service_offsets[:, np.newaxis] * grid_length].min(axis=1)
+        candidates = np.minimum(candidates + edge_labels[grid_states], UNREACHABLE)
+        improved = candidates < labels[states]
+        changed = states[improved]
+        labels[changed] = candidates[improved]
+    return labels.reshape(goals.shape)
+
+
+def route_successors(graph, labels, goals):
+    """
+    Picks the next state of every state on its route to each emergency service, the way
+    `get_best_successor` does: the successor with the smallest label plus edge label, the
+    smallest successor id winning ties.
+
+    Returns:
+        numpy.ndarray: (services, size, state_count + 1) next states, the extra state for
+                       goal states and for states with no route.
+    """
+    service_count = labels.shape[0]
+    successor_labels = labels.reshape(service_count, -1)[:, graph.flat_successors()]
+    successor_labels = successor_labels.reshape(labels.shape + (4,))
+    # All successors of a state share the edge label, so the smallest successor label wins
+    keys = np.where(successor_labels < UNREACHABLE,
+                    successor_labels * (graph.state_count + 1) + graph.successors, UNREACHABLE)
+    successors = keys.min(axis=3) % (graph.state_count + 1)
+    return np.where(goals | (labels >= UNREACHABLE), graph.state_count, successors)
+
+
+def ambiguous_states(graph, labels, goals):
+    """
+    Marks the states with several successors on a cheapest route to each emergency service,
+    whatever the number of nodes of these routes: `a_star` may leave the route of the labels
+    there (see `is_only_cheapest_route`).
+
+    Returns:
+        numpy.ndarray: (services, size, state_count + 1) 1 for such states, 0 for the others,
+                       goal states and states with no route included.
+    """
+    service_count = labels.shape[0]
+    successor_labels = labels.reshape(service_count, -1)[:, graph.flat_successors()]
+    successor_labels = successor_labels.reshape(labels.shape + (4,))
+    # All successors of a state share the edge cost, so the cheapest successors tie on their own cost
+    successor_costs = np.where(successor_labels < UNREACHABLE, successor_labels // graph.label_base, UNREACHABLE)
+    cheapest = (successor_costs == successor_costs.min(axis=3, keepdims=True)) & (successor_costs < UNREACHABLE)
+    return np.where(goals | (labels >= UNREACHABLE), 0, cheapest.sum(axis=3) > 1).astype(np.int64)
+
+
+def route_sums(values, successors, terminal):
+    """
+    Sums a per-state value along every route by pointer jumping: after k rounds each state
+    holds the sum over the first 2 ** k states of its route.
+
+    Parameters:
+        values (numpy.ndarray): (..., states) values, 0 for the terminal state.
+        successors (numpy.ndarray): (..., states) next states, `terminal` ending a route.
+        terminal (int): The state ending every route.
+
+    Returns:
+        numpy.ndarray: (..., states) sums over the routes starting at every state.
+    """
+    sums = values.copy()
+    jumps = successors
+    while (jumps != terminal).any():
+        sums += np.take_along_axis(sums, jumps, axis=-1)
+        jumps = np.take_along_axis(jumps, jumps, axis=-1)
+    return sums
+
+
+class BatchRoutes:
+    """
+    The routes from every building to its nearest emergency service in every grid of a
+    population, as computed by `find_nearest_routes`.
+
+    Attributes:
+        graph (BatchGraph): The state graphs of the population.
+        buildings (list[tuple]): The (x, y) position of each building, in row-major order.
+        found (numpy.ndarray): (pop, buildings) whether the building reaches a service.
+        services (numpy.ndarray): (pop, buildings) index of the service each building heads
+                                  to, in row-major order of the services.
+        first_steps (numpy.ndarray): (pop, buildings) first state of each route after the
+                                     building.
+        successors (numpy.ndarray): (services, pop, state_count + 1) next state of every
+                                    state on its route to each service.
+        costs (numpy.ndarray): (pop, buildings) route costs, -1 when unreachable.
+        lengths (numpy.ndarray): (pop, buildings) route lengths in nodes, -1 when unreachable.
+        intersection_counts (numpy.ndarray): (pop, buildings) intersections counted by
+                                             `calculate_fitness`, -1 when unreachable.
+        a_star_paths (dict): Maps the (grid index, building column) of each route that is not
+                             the only cheapest one to the path `find_a_star_path` found
+                             instead, as state ids. The arrays above describe that path.
+    """
+
+    def __init__(self, graph, buildings, found, services, first_steps, successors, costs, lengths,
+                 intersection_counts, a_star_paths=None):
+        self.graph = graph
+        self.buildings = buildings
+        self.found = found
+        self.services = services
+        self.first_steps = first_steps
+        self.successors = successors
+        self.costs = costs
+        self.lengths = lengths
+        self.intersection_counts = intersection_counts
+        self.a_star_paths = a_star_paths if a_star_paths is not None else {}
+
+    def __len__(self):
+        return self.graph.size
+
+    def path_costs(self, index):
+        """
+        Parameters:
+            index (int): The position of a grid in the population.
+
+        Returns:
+            dict: The `find_all_path_costs` result of the grid: each building that reaches a
+                  service mapped to its (cost, path_length, intersection_count).
+        """
+        return {building: (int(self.costs[index, column]), int(self.lengths[index, column]),
+                           int(self.intersection_counts[index, column]))
+                for column, building in enumerate(self.buildings) if self.found[index, column]}
+
+    def fitness_scores(self, index):
+        """
+        Parameters:
+            index (int): The position of a grid in the population.
+
+        Returns:
+            dict: The `calculate_fitness` scores of the grid's shortest paths.
+        """
+        path_penalty = 1
+        intersection_penalty = self.graph.height // 8
+        lengths = self.lengths[index].tolist()
+        intersection_counts = self.intersection_counts[index].tolist()
+        return {building: path_penalty * lengths[column] + intersection_penalty * intersection_counts[column]
+                for column, building in enumerate(self.buildings) if lengths[column] >= 0}
+
+    def shortest_paths(self, index):
+        """
+        Follows the routes of one grid into node lists.
+
+        Parameters:
+            index (int): The position of a grid in the population.
+
+        Returns:
+            list[list[tuple]]: The `find_all_shortest_paths` result of the grid: one path of
+                               ((x, y), direction) nodes per building that reaches a service.
+        """
+        height, state_count = self.graph.height, self.graph.state_count
+        successors = {}
+        paths = []
+        for column, building in enumerate(self.buildings):
+            if not self.found[index, column]:
+                continue
+            if (index, column) in self.a_star_paths:
+                path = [(building, None)]
+                for state in self.a_star_paths[index, column][1:]:
+                    cell, direction = divmod(state, 4)
+                    path.append((divmod(cell, height), DIRECTIONS[direction]))
+                paths.append(path)
+                continue
+            service = int(self.services[index, column])
+            if service not in successors:
+                successors[service] = self.successors[service, index].tolist()
+            service_successors = successors[service]
+            path = [(building, None)]
+            state = int(self.first_steps[index, column])
+            while state != state_count:
+                cell, direction = divmod(state, 4)
+                path.append((divmod(cell, height), DIRECTIONS[direction]))
+                state = service_successors[state]
+            paths.append(path)
+        return paths
+
+
+def find_nearest_routes(grids):
+    """
+    Finds, in every grid of a population sharing the same buildings and emergency services,
+    the route from every building to its nearest emergency service: the routes
+    `find_all_shortest_paths` follows in each grid.
+
+    Instead of one search per grid, the labels of all grids are computed together by
+    `wavefront_labels`, the routes follow `route_successors` and the intersections along
+    them are summed by `route_sums`. As in `choose_nearest_service`, each building heads to
+    the service whose cheapest route has the fewest nodes, the first service in scan order
+    winning ties. The states of each route with rival cheapest successors are summed the
+    same way (see `ambiguous_states`), and the buildings whose route has any, as well as
+    every building on grids of fewer than 8 rows, are searched with A* in their grid (see
+    `is_only_cheapest_route`).
+
+    Parameters:
+        grids (PopulationTensor | numpy.ndarray | list): The grids, all with the same shape,
+            buildings and emergency services.
+
+    Returns:
+        BatchRoutes: The routes of every grid.
+
+    Raises:
+        ValueError: If the grids do not share their buildings and emergency services.
+    """
+    cells = to_cell_array(grids)
+    if not ((cells == 1) == (cells[0] == 1)).all() or not ((cells == 2) == (cells[0] == 2)).all():
+        raise ValueError("The grids of a batch must share their buildings and emergency services!")
+    graph = BatchGraph(cells)
+    size, height, width = cells.shape
+    state_count, base = graph.state_count, graph.label_base
+
+    service_rows, service_columns = np.nonzero(cells[0] == 2)
+    building_rows, building_columns = np.nonzero(cells[0] == 1)
+    services = list(zip(service_columns.tolist(), service_rows.tolist()))
+    buildings = list(zip(building_columns.tolist(), building_rows.tolist()))
+
+    if not services:
+        unreachable = np.full((size, len(buildings)), -1, dtype=np.int64)
+        return BatchRoutes(graph, buildings, unreachable >= 0, unreachable, unreachable,
+                           np.zeros((0, size, state_count + 1), dtype=np.int64),
+                           unreachable, unreachable, unreachable)
+
+    goals = graph.goals(services)
+    labels = wavefront_labels(graph, goals)
+    successors = route_successors(graph, labels, goals)
+
+    # Like `calculate_fitness`, a node (x, y) counts when the cell at row x, column y is an
+    # interior intersection, which bounds x by both the height and the width, and y too
+    counted = np.zeros((size, width, height), dtype=np.int64)
+    xs, ys = slice(1, min(height - 1, width)), slice(1, min(width - 1, height))
+    counted[:, xs, ys] = cells[:, xs, ys] == 3
+    counted = counted.reshape(size, -1)
+    state_counts = np.concatenate([np.repeat(counted, 4, axis=1), np.zeros((size, 1), dtype=np.int64)], axis=1)
+    counts = route_sums(np.broadcast_to(state_counts, labels.shape), successors, state_count)
+
+    # The first steps out of each building, as the start node's successors in `TransitionGraph`
+    building_cells = building_columns * height + building_rows
+    moves = np.array(TRANSITIONS[OTHER_CELL][NO_DIRECTION])
+    targets = graph.neighbors[building_cells[:, np.newaxis], moves]
+    first_steps = np.where(targets >= 0, targets * 4 + moves, state_count)  # (buildings, moves)
+
+    # The cheapest route of each building to each service, the smallest first step on ties
+    step_labels = labels[:, :, first_steps]  # (services, pop, buildings, moves)
+    keys = np.where(step_labels < UNREACHABLE, step_labels * (state_count + 1) + first_steps, UNREACHABLE)
+    best_keys = keys.min(axis=3)
+    reachable = best_keys < UNREACHABLE
+    route_first_steps = best_keys % (state_count + 1)
+    route_labels = best_keys // (state_count + 1) + (graph.step_costs[:, building_cells] * base + 1)
+
+    # The nearest service of each building: the fewest nodes, then the first in scan order
+    route_lengths = np.where(reachable, route_labels % base, UNREACHABLE)
+    service = route_lengths.argmin(axis=0)[np.newaxis]  # (1, pop, buildings)
+    found = np.take_along_axis(reachable, service, axis=0)[0]
+    route_label = np.take_along_axis(route_labels, service, axis=0)[0]
+    first_step = np.take_along_axis(route_first_steps, service, axis=0)[0]
+    route_count = counts[service[0], np.arange(size)[:, np.newaxis], first_step] + counted[:, building_cells]
+
+    # Routes with a rival cheapest route from the building or from any of their states
+    ambiguous = route_sums(ambiguous_states(graph, labels, goals), successors, state_count)
+    step_costs = np.where(step_labels < UNREACHABLE, step_labels // base, UNREACHABLE)
+    first_ties = (step_costs == step_costs.min(axis=3, keepdims=True)).sum(axis=3) > 1
+    route_ambiguous = (np.take_along_axis(first_ties, service, axis=0)[0] |
+                       (ambiguous[service[0], np.arange(size)[:, np.newaxis], first_step] > 0))
+    if height < 8:
+        route_ambiguous[:] = True
+
+    costs = np.where(found, route_label // base, -1)
+    lengths = np.where(found, route_label % base, -1)
+    intersection_counts = np.where(found, route_count, -1)
+    a_star_paths = {}
+    transition_graphs = {}
+    for index, column in zip(*np.nonzero(found & route_ambiguous)):
+        index, column = int(index), int(column)
+        if index not in transition_graphs:
+            transition_graph = TransitionGraph(CityGrid(cells[index]))
+            transition_graphs[index] = (transition_graph, transition_graph.counted_cells())
+        transition_graph, counted_cells = transition_graphs[index]
+        # The route lengths bound the paths of `a_star` unless it may miss the cheapest route
+        bounds = None if height < 8 else [int(length) if length < UNREACHABLE else None
+                                          for length in route_lengths[:, index, column]]
+        path = find_a_star_path(transition_graph, int(building_cells[column]), bounds)
+        a_star_paths[index, column] = path
+        costs[index, column], lengths[index, column], intersection_counts[index, column] = describe_path(
+            transition_graph, counted_cells, path)
+
+    return BatchRoutes(graph, buildings, found, service[0], first_step, successors, costs=costs, lengths=lengths,
+                       intersection_counts=intersection_counts, a_star_paths=a_star_paths)
+
+
+def batch_fitness(grids, batch_size=BATCH_SIZE):
+    """
+    Batched `calculate_fitness(grid, find_all_shortest_paths(grid))` for grids sharing the
+    same buildings and emergency services (see `find_nearest_routes`).
+
+    Parameters:
+        grids (PopulationTensor | numpy.ndarray | list): The grids to evaluate.
+        batch_size (int): The number of grids searched together.
+
+    Returns:
+        list[dict]: The fitness score of each building, for each grid in order.
+    """
+    cells = to_cell_array(grids) if len(grids) else []
+    fitness_scores = []
+    for start in range(0, len(cells), batch_size):
+        routes = find_nearest_routes(cells[start:start + batch_size])
+        fitness_scores.extend(routes.fitness_scores(index) for index in range(len(routes)))
+    return fitness_scores
+
+
+def batch_evaluate(grids, batch_size=BATCH_SIZE):
+    """
+    Batched `find_all_shortest_paths` and `calculate_fitness` for grids sharing the same
+    buildings and emergency services (see `find_nearest_routes`).
+
+    Parameters:
+        grids (PopulationTensor | numpy.ndarray | list): The grids to evaluate.
+        batch_size (int): The number of grids searched together.
+
+    Returns:
+        list[tuple]: The shortest paths and fitness scores of each grid, in order.
+    """
+    cells = to_cell_array(grids) if len(grids) else []
+    results = []
+    for start in range(0, len(cells), batch_size):
+        routes = find_nearest_routes(cells[start:start + batch_size])
+        results.extend((routes.shortest_paths(index), routes.fitness_scores(index)) for index in range(len(routes)))
+    return results
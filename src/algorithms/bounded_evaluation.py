@@ -0,0 +1,275 @@
+import heapq
+from array import array
+from algorithms.transition_graph import TransitionGraph
+from algorithms.indexed_search import (get_best_successor, count_cheapest_successors, is_only_cheapest_route,
+                                       find_a_star_path_costs)
+
+
+class ServiceWave:
+    """
+    The backward Dijkstra search of `search_from_emergency_services` for one emergency
+    service, run lazily: states are only settled as far as the buildings evaluated so far
+    need. Settled labels and successors are the ones the complete search computes.
+
+    Attributes:
+        labels (array): The label of each state id, -1 for states not settled yet.
+        successors (array): The successor each settled state takes on its route, -1 for
+                            goal states and states not settled yet.
+        counts (array): The intersections counted along the route of each state, -1 until
+                        a building route goes through it.
+        unique (bytearray): 1 where the route of a state is the only cheapest one (see
+                            `is_only_cheapest_route`), 0 where it is not, set with `counts`.
+    """
+
+    def __init__(self, graph, goal_states):
+        """
+        Parameters:
+            graph (TransitionGraph): The compiled state graph of the grid.
+            goal_states (list[int]): The goal state ids of the service.
+        """
+        self.graph = graph
+        self.labels = array("q", [-1]) * graph.state_count
+        self.successors = array("i", [-1]) * graph.state_count
+        self.counts = array("i", [-1]) * graph.state_count
+        self.unique = bytearray(graph.state_count)
+        # Entries carry the successor they were relaxed from, like in the complete search
+        self._open_list = [(1, state, -1) for state in goal_states]
+        heapq.heapify(self._open_list)
+
+    def settle(self, states):
+        """
+        Runs the search until every given state is settled or the wave is exhausted.
+
+        Parameters:
+            states (list[int]): The state ids to settle.
+        """
+        labels, successors, open_list = self.labels, self.successors, self._open_list
+        pending = {state for state in states if labels[state] < 0}
+        base = self.graph.label_base
+        in_indptr, in_degree = self.graph.in_indptr, self.graph.in_degree
+        in_indices, in_costs = self.graph.in_indices, self.graph.in_costs
+        while pending and open_list:
+            label, state, successor = heapq.heappop(open_list)
+            if labels[state] >= 0:
+                continue
+            labels[state] = label
+            successors[state] = successor
+            pending.discard(state)
+
+            offset = in_indptr[state]
+            for edge in range(offset, offset + in_degree[state]):
+                predecessor = in_indices[edge]
+                if labels[predecessor] < 0:
+                    heapq.heappush(open_list, (label + in_costs[edge] * base + 1, predecessor, state))
+
+
+def reachable_states(graph):
+    """
+    Marks the states from which some emergency service can be reached, with a breadth-first
+    search backwards from every goal state.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+
+    Returns:
+        bytearray: 1 for each state id that can reach an emergency service, 0 otherwise.
+    """
+    in_indptr, in_degree, in_indices = graph.in_indptr, graph.in_degree, graph.in_indices
+    reachable = bytearray(graph.state_count)
+    stack = []
+    for goal_states in graph.goal_states():
+        for state in goal_states:
+            if not reachable[state]:
+                reachable[state] = 1
+                stack.append(state)
+    while stack:
+        state = stack.pop()
+        offset = in_indptr[state]
+        for edge in range(offset, offset + in_degree[state]):
+            predecessor = in_indices[edge]
+            if not reachable[predecessor]:
+                reachable[predecessor] = 1
+                stack.append(predecessor)
+    return reachable
+
+
+def path_length_lower_bounds(graph):
+    """
+    Computes, for every building and emergency service, a lower bound on the number of
+    nodes of the path between them: a path moves one cell per node, so it has at least the
+    Manhattan distance from the building to the nearest cell right above or below the
+    service, plus one, nodes.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+
+    Returns:
+        dict: Maps each building cell index to its lower bound for each emergency service,
+              in the row-major order of the services.
+    """
+    height = graph.height
+    service_goal_cells = []
+    for service_cell in graph.emergency_services():
+        x, y = divmod(service_cell, height)
+        service_goal_cells.append([(x, cell_y) for cell_y in (y - 1, y + 1) if 0 <= cell_y < height])
+
+    lower_bounds = {}
+    for cell in graph.buildings():
+        x, y = divmod(cell, height)
+        lower_bounds[cell] = [min(abs(x - goal_x) + abs(y - goal_y) for goal_x, goal_y in goal_cells) + 1
+                              for goal_cells in service_goal_cells]
+    return lower_bounds
+
+
+def choose_service(graph, waves, start, lower_bounds):
+    """
+    `choose_nearest_service` that only advances the waves it needs. Services are tried from
+    the closest to the farthest by their lower bound, and a service whose lower bound
+    exceeds the fewest nodes found so far cannot be chosen, so its wave is not advanced.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        waves (list[ServiceWave]): The waves of every emergency service.
+        start (int): The state id of the start node of a building.
+        lower_bounds (list[int]): The path length lower bound of the building for each service.
+
+    Returns:
+        tuple: The (label, successor) pair of the chosen route and the index of its
+               emergency service, or None if no emergency service can be reached.
+    """
+    base = graph.label_base
+    offset = graph.out_indptr[start]
+    first_steps = graph.out_indices[offset:offset + graph.out_degree[start]]
+
+    routes = {}
+    fewest_nodes = None
+    for service in sorted(range(len(waves)), key=lambda service: lower_bounds[service]):
+        if fewest_nodes is not None and lower_bounds[service] > fewest_nodes:
+            break
+        waves[service].settle(first_steps)
+        best = get_best_successor(graph, waves[service].labels, start)
+        if best:
+            routes[service] = best
+            if fewest_nodes is None or best[0] % base < fewest_nodes:
+                fewest_nodes = best[0] % base
+
+    # Fewest nodes, the first service in scan order winning ties
+    nearest = None
+    for service in sorted(routes):
+        if nearest is None or routes[service][0] % base < nearest[0][0] % base:
+            nearest = (routes[service], service)
+    return nearest
+
+
+def evaluate_with_cutoff(grid, cutoff=None, order=None, graph=None):
+    """
+    Evaluates the buildings of a grid one at a time and gives up as soon as the sum of
+    their `calculate_fitness` scores provably reaches `cutoff`.
+
+    Each building is scored exactly, the backward search of each emergency service
+    advancing only as far as that building needs (see `ServiceWave`). As in
+    `find_all_path_costs`, buildings whose route is not the only cheapest one are searched
+    with A*. After each building,
+    the scores so far plus a lower bound for the remaining buildings are compared with the
+    cutoff. A building scores at least its number of path nodes, itself at least
+    `path_length_lower_bounds`; buildings that cannot reach any emergency service are left
+    out of the scores, so only the ones `reachable_states` marks count in the bound.
+    Evaluating the previously worst buildings first exposes bad grids early.
+
+    Parameters:
+        grid (CityGrid): The grid to evaluate.
+        cutoff (float): The fitness sum at which to give up, never when None.
+        order (list[tuple]): The (x, y) positions of the buildings in the order they should
+                             be evaluated. Buildings left out come last, in row-major order.
+        graph (TransitionGraph): The compiled state graph of the grid, built when omitted.
+
+    Returns:
+        tuple:
+            - dict: The `calculate_fitness(grid, find_all_shortest_paths(grid))` scores, in
+                    row-major building order, or None if the evaluation was cut off.
+            - int: The number of buildings evaluated.
+    """
+    if graph is None:
+        graph = TransitionGraph(grid)
+    height, width, state_count, base = graph.height, graph.width, graph.state_count, graph.label_base
+    out_indptr, out_degree, out_indices = graph.out_indptr, graph.out_degree, graph.out_indices
+    intersection_penalty = len(grid) // 8
+
+    buildings = graph.buildings()
+    if order is not None:
+        ordered = [x * height + y for x, y in order]
+        listed = set(ordered)
+        buildings = ordered + [cell for cell in buildings if cell not in listed]
+
+    service_lower_bounds = path_length_lower_bounds(graph)
+    remaining_bound = 0
+    lower_bounds = {}
+    if cutoff is not None:
+        reachable = reachable_states(graph)
+        for cell, bounds in service_lower_bounds.items():
+            start = state_count + cell
+            offset = out_indptr[start]
+            if bounds and any(reachable[out_indices[edge]] for edge in range(offset, offset + out_degree[start])):
+                lower_bounds[cell] = min(bounds)
+                remaining_bound += lower_bounds[cell]
+
+    waves = [ServiceWave(graph, goal_states) for goal_states in graph.goal_states()]
+    counted_cells = graph.counted_cells()
+    scores = {}
+    total = 0
+    for evaluated, cell in enumerate(buildings, 1):
+        nearest = choose_service(graph, waves, state_count + cell, service_lower_bounds[cell])
+        if nearest is not None:
+            (label, successor), service = nearest
+            wave = waves[service]
+            intersection_count = route_intersections(counted_cells, wave, successor, cell)
+            path_length = label % base
+            if not (wave.unique[successor] and
+                    is_only_cheapest_route(graph, wave.labels.__getitem__, [state_count + cell, successor])):
+                _, path_length, intersection_count = find_a_star_path_costs(graph, counted_cells, cell,
+                                                                            service_lower_bounds[cell])
+            scores[cell] = path_length + intersection_penalty * intersection_count
+            total += scores[cell]
+
+        if cutoff is not None:
+            remaining_bound -= lower_bounds.get(cell, 0)
+            if total + remaining_bound >= cutoff and evaluated < len(buildings):
+                return None, evaluated
+
+    if cutoff is not None and total >= cutoff:
+        return None, len(buildings)
+    return {divmod(cell, height): scores[cell] for cell in graph.buildings() if cell in scores}, len(buildings)
+
+
+def route_intersections(counted_cells, wave, successor, cell):
+    """
+    Counts the nodes `calculate_fitness` sees as intersections on the route of a building,
+    sharing the counts of route suffixes between buildings like `find_all_path_costs`, and
+    marks in `wave.unique` whether each suffix is the only cheapest route.
+
+    Parameters:
+        counted_cells (bytearray): The cells counted as intersections (see
+                                   `TransitionGraph.counted_cells`).
+        wave (ServiceWave): The wave of the emergency service the building heads to.
+        successor (int): The first state of the route after the building.
+        cell (int): The cell index of the building.
+
+    Returns:
+        int: The number of counted intersections on the route.
+    """
+    counts, unique, successors = wave.counts, wave.unique, wave.successors
+    state_label = wave.labels.__getitem__
+    route = []
+    state = successor
+    while state != -1 and counts[state] < 0:
+        route.append(state)
+        state = successors[state]
+    count = counts[state] if state != -1 else 0
+    only = unique[state] if state != -1 else 1
+    for state in reversed(route):
+        count += counted_cells[state >> 2]
+        counts[state] = count
+        if only and successors[state] != -1:
+            only = count_cheapest_successors(wave.graph, state_label, state) == 1
+        unique[state] = only
+    return counts[successor] + counted_cells[cell]
@@ -0,0 +1,378 @@
+import heapq
+from array import array
+from functools import partial
+from algorithms.transition_graph import TransitionGraph
+from algorithms.indexed_search import (count_cheapest_successors, is_only_cheapest_route, route_length_bounds,
+                                       find_a_star_path, find_a_star_path_costs, path_cost)
+
+
+class CorridorGraph:
+    """
+    A contraction of the `TransitionGraph` in which the straight runs between decision
+    points are single weighted edges.
+
+    Most states have exactly one move: a road cell that is not an intersection lets traffic
+    go straight on or turn one way only. The route of such a state is forced, its label is
+    the label of its successor plus the move, so the backward search only has to settle the
+    decision states: goal states and states with no or several moves. A corridor is the run
+    of forced states from a move out of a decision state to the next decision state. Each
+    contracted edge keeps the packed cost * label_base + length of its corridor, so labels
+    are exactly those of the full graph, `get_step_cost` margin penalties included, and
+    keeps its first state, so ties between equal labels are broken on the same successor
+    ids as in `search_from_emergency_services`.
+
+    Attributes:
+        graph (TransitionGraph): The compiled state graph the corridors come from.
+        decision (bytearray): 1 for each decision state id, 0 for forced states.
+        decision_count (int): The number of decision states.
+        corridor_ends (array): For each forced state, the decision state its corridor leads
+                               to, -1 if it loops forever without reaching one.
+        corridor_labels (array): For each forced state, the packed cost and length from the
+                                 state to the end of its corridor.
+        corridor_counts (array): For each forced state, the number of states
+                                 `calculate_fitness` counts as intersections from the state
+                                 to the end of its corridor, the end excluded.
+        in_edges (list[list[tuple]]): For each decision state, the contracted edges leading
+                                      to it as (decision state, packed cost and length,
+                                      first state) triples.
+        counted_cells (bytearray): 1 for each cell whose nodes `calculate_fitness` counts as
+                                   intersections (see `TransitionGraph.counted_cells`).
+    """
+
+    def __init__(self, grid):
+        """
+        Parameters:
+            grid (TransitionGraph | CityGrid | list[list[int]]): The grid to contract, or its
+                                                                 already compiled state graph.
+        """
+        graph = grid if isinstance(grid, TransitionGraph) else TransitionGraph(grid)
+        self.graph = graph
+        state_count, base = graph.state_count, graph.label_base
+        out_indptr, out_degree = graph.out_indptr, graph.out_degree
+        out_indices, out_costs = graph.out_indices, graph.out_costs
+
+        self.counted_cells = graph.counted_cells()
+
+        self.decision = bytearray(state_count)
+        for goal_states in graph.goal_states():
+            for state in goal_states:
+                self.decision[state] = 1
+        for state in range(state_count):
+            if out_degree[state] != 1:
+                self.decision[state] = 1
+        self.decision_count = sum(self.decision)
+
+        # Follow every forced state down its corridor, resolving whole runs at once
+        self.corridor_ends = array("i", [-1]) * state_count
+        self.corridor_labels = array("q", [0]) * state_count
+        self.corridor_counts = array("i", [0]) * state_count
+        resolved = bytearray(state_count)
+        for first in range(state_count):
+            if self.decision[first] or resolved[first]:
+                continue
+            run = []
+            on_run = set()
+            state = first
+            while not self.decision[state] and not resolved[state] and state not in on_run:
+                run.append(state)
+                on_run.add(state)
+                state = out_indices[out_indptr[state]]
+            if self.decision[state]:
+                end, label, count = state, 0, 0
+            elif resolved[state]:
+                end, label, count = self.corridor_ends[state], self.corridor_labels[state], self.corridor_counts[state]
+            else:
+                end = -1  # A loop of forced states never reaches a decision state
+            for state in reversed(run):
+                if end >= 0:
+                    label += out_costs[out_indptr[state]] * base + 1
+                    count += self.counted_cells[state >> 2]
+                    self.corridor_labels[state] = label
+                    self.corridor_counts[state] = count
+                self.corridor_ends[state] = end
+                resolved[state] = 1
+
+        self.in_edges = [[] for _ in range(state_count)]
+        for state in range(state_count):
+            if not self.decision[state]:
+                continue
+            offset = out_indptr[state]
+            for edge in range(offset, offset + out_degree[state]):
+                first, packed = out_indices[edge], out_costs[edge] * base + 1
+                if self.decision[first]:
+                    self.in_edges[first].append((state, packed, first))
+                elif self.corridor_ends[first] >= 0:
+                    self.in_edges[self.corridor_ends[first]].append(
+                        (state, packed + self.corridor_labels[first], first))
+
+    def average_corridor_length(self):
+        """
+        Returns:
+            float: The number of states per decision state, roughly the factor by which the
+                   contraction cuts the expansions of a complete search.
+        """
+        return self.graph.state_count / self.decision_count if self.decision_count else 0.0
+
+    def state_label(self, service_labels, state):
+        """
+        Parameters:
+            service_labels (array): The decision state labels of one emergency service.
+            state (int): Any state id.
+
+        Returns:
+            int: The label of the state in the full graph, -1 if it was not settled.
+        """
+        if self.decision[state]:
+            return service_labels[state]
+        end = self.corridor_ends[state]
+        if end < 0 or service_labels[end] < 0:
+            return -1
+        return service_labels[end] + self.corridor_labels[state]
+
+    def best_successor(self, service_labels, state):
+        """
+        `get_best_successor` over the contracted labels.
+
+        Parameters:
+            service_labels (array): The decision state labels of one emergency service.
+            state (int): The current state id, possibly a start node.
+
+        Returns:
+            tuple: The best (label, successor) pair, or None if no successor is labelled.
+        """
+        graph = self.graph
+        base, out_indices, out_costs = graph.label_base, graph.out_indices, graph.out_costs
+        best = None
+        offset = graph.out_indptr[state]
+        for edge in range(offset, offset + graph.out_degree[state]):
+            neighbor = out_indices[edge]
+            label = self.state_label(service_labels, neighbor)
+            if label < 0:
+                continue
+            candidate = (label + out_costs[edge] * base + 1, neighbor)
+            if best is None or candidate < best:
+                best = candidate
+        return best
+
+    def choose_nearest_service(self, labels, state):
+        """
+        `choose_nearest_service` over the contracted labels.
+
+        Parameters:
+            labels (list[array]): The labels computed by `search_corridors`.
+            state (int): The state id of the start node.
+
+        Returns:
+            tuple: The (label, successor) pair of the chosen route and the index of its
+                   emergency service, or None if no emergency service can be reached.
+        """
+        base = self.graph.label_base
+        nearest = None
+        for service, service_labels in enumerate(labels):
+            best = self.best_successor(service_labels, state)
+            if best and (nearest is None or best[0] % base < nearest[0][0] % base):
+                nearest = (best, service)
+        return nearest
+
+    def expand(self, service_successors, state):
+        """
+        Expands the route of a state into the states of the full graph.
+
+        Parameters:
+            service_successors (array): The decision state successors of one emergency service.
+            state (int): The state id to start from.
+
+        Returns:
+            list[int]: The route as a list of state ids, down to the goal state.
+        """
+        graph = self.graph
+        route = [state]
+        while True:
+            if self.decision[state]:
+                state = service_successors[state]
+                if state == -1:
+                    return route
+            else:
+                state = graph.out_indices[graph.out_indptr[state]]
+            route.append(state)
+
+
+def search_corridors(corridors, complete=False):
+    """
+    `search_from_emergency_services` over the decision states of a `CorridorGraph`: each
+    expansion crosses a whole corridor. The labels and successors of the decision states
+    are those of the full search; the labels of forced states follow from their corridor
+    (see `CorridorGraph.state_label`). Unless `complete` is set, a wave stops as soon as
+    the corridors of the first steps out of every building have been labelled.
+
+    Parameters:
+        corridors (CorridorGraph): The contracted graph.
+        complete (bool): Whether to label every decision state that can reach each service.
+
+    Returns:
+        tuple:
+            - list[array]: Per emergency service, the label of each decision state id, -1 for
+                           forced states and states its wave did not settle.
+            - list[array]: Per emergency service, the successor each settled decision state
+                           takes on its route, -1 for goal states and unsettled states.
+    """
+    graph = corridors.graph
+    state_count = graph.state_count
+    out_indptr, out_degree, out_indices = graph.out_indptr, graph.out_degree, graph.out_indices
+    decision, corridor_ends, in_edges = corridors.decision, corridors.corridor_ends, corridors.in_edges
+
+    # The decision states the labels of the first steps depend on
+    needed = bytearray(state_count)
+    needed_count = 0
+    for cell in graph.buildings():
+        offset = out_indptr[state_count + cell]
+        for edge in range(offset, offset + out_degree[state_count + cell]):
+            state = out_indices[edge]
+            if not decision[state]:
+                state = corridor_ends[state]
+            if state >= 0 and not needed[state]:
+                needed[state] = 1
+                needed_count += 1
+
+    goal_states = graph.goal_states()
+    labels = [array("q", [-1]) * state_count for _ in goal_states]
+    successors = [array("i", [-1]) * state_count for _ in goal_states]
+    pending = [needed_count if not complete else state_count + 1] * len(goal_states)
+    open_list = [(1, service, state, -1) for service, states in enumerate(goal_states) for state in states]
+    heapq.heapify(open_list)
+    active_waves = len(goal_states) if needed_count or complete else 0
+
+    while open_list and active_waves:
+        label, service, state, successor = heapq.heappop(open_list)
+        service_labels = labels[service]
+        if not pending[service] or service_labels[state] >= 0:
+            continue
+        service_labels[state] = label
+        successors[service][state] = successor
+
+        if needed[state]:
+            pending[service] -= 1
+            if not pending[service]:
+                active_waves -= 1
+
+        for predecessor, packed, first in in_edges[state]:
+            if service_labels[predecessor] < 0:
+                heapq.heappush(open_list, (label + packed, service, predecessor, first))
+
+    return labels, successors
+
+
+def find_nearest_service_paths(corridors):
+    """
+    `indexed_search.find_nearest_service_paths` over a `CorridorGraph`: the search settles
+    decision states only and the chosen routes are expanded into full paths afterwards.
+    Buildings whose route is not the only cheapest one are searched with A* (see
+    `is_only_cheapest_route`).
+
+    Parameters:
+        corridors (CorridorGraph): The contracted graph.
+
+    Returns:
+        dict: A dictionary mapping each building position (x, y) to a (path, cost) tuple,
+              in row-major order. Buildings that cannot reach any emergency service map
+              to (None, None).
+    """
+    graph = corridors.graph
+    labels, successors = search_corridors(corridors)
+
+    results = {}
+    for cell in graph.buildings():
+        start = graph.state_count + cell
+        nearest = corridors.choose_nearest_service(labels, start)
+        if nearest is None:
+            results[divmod(cell, graph.height)] = (None, None)
+            continue
+        (label, state), service = nearest
+        route = [start] + corridors.expand(successors[service], state)
+        service_labels = labels[service]
+        if is_only_cheapest_route(graph, lambda state: corridors.state_label(service_labels, state), route):
+            cost = label // graph.label_base
+        else:
+            route = find_a_star_path(graph, cell, route_length_bounds(
+                graph, [partial(corridors.state_label, service_labels) for service_labels in labels], cell))
+            cost = path_cost(graph, route)
+        results[divmod(cell, graph.height)] = ([graph.decode(step) for step in route], cost)
+    return results
+
+
+def find_all_path_costs(corridors):
+    """
+    `indexed_search.find_all_path_costs` over a `CorridorGraph`: intersections are counted
+    a corridor at a time, sharing the counts of route suffixes between buildings at the
+    decision states, so no route is expanded. Whether a route suffix is the only cheapest
+    one is shared the same way: forced states have a single move, so only decision states
+    are checked. The paths of the other buildings are searched with A*.
+
+    Parameters:
+        corridors (CorridorGraph): The contracted graph.
+
+    Returns:
+        dict: A dictionary mapping each building position (x, y) to a (cost, path_length,
+              intersection_count) tuple, in row-major order. Buildings that cannot reach
+              any emergency service are left out.
+    """
+    graph = corridors.graph
+    height, base = graph.height, graph.label_base
+    out_indptr, out_indices = graph.out_indptr, graph.out_indices
+    decision, corridor_ends, corridor_counts = corridors.decision, corridors.corridor_ends, corridors.corridor_counts
+    counted_cells = corridors.counted_cells
+
+    labels, successors = search_corridors(corridors)
+    counts = [array("i", [-1]) * graph.state_count for _ in labels]
+    # 1 where the route of a decision state is the only cheapest one, 0 where it is not
+    unique = [bytearray(graph.state_count) for _ in labels]
+
+    def decision_count(service, state):
+        # Walk down the decision states to the first known count, then fill the counts back
+        # in, along with whether the route is the only cheapest one
+        service_counts, service_unique, service_successors = counts[service], unique[service], successors[service]
+        service_labels = labels[service]
+        route = []
+        while state != -1 and service_counts[state] < 0:
+            route.append(state)
+            state = service_successors[state]
+            if state != -1 and not decision[state]:
+                route.append(state)
+                state = corridor_ends[state]
+        count = service_counts[state] if state != -1 else 0
+        only = service_unique[state] if state != -1 else 1
+        for state in reversed(route):
+            if decision[state]:
+                count += counted_cells[state >> 2]
+                service_counts[state] = count
+                if only and service_successors[state] != -1:
+                    only = count_cheapest_successors(
+                        graph, lambda state: corridors.state_label(service_labels, state), state) == 1
+                service_unique[state] = only
+            else:
+                count += corridor_counts[state]
+        if route:
+            return service_counts[route[0]], service_unique[route[0]]
+        return count, only
+
+    path_costs = {}
+    for cell in graph.buildings():
+        start = graph.state_count + cell
+        nearest = corridors.choose_nearest_service(labels, start)
+        if nearest is None:
+            print(f"No path found to any emergency service for building at {divmod(cell, height)}.")
+            continue
+        (label, successor), service = nearest
+        if decision[successor]:
+            intersection_count, only = decision_count(service, successor)
+        else:
+            intersection_count, only = decision_count(service, corridor_ends[successor])
+            intersection_count += corridor_counts[successor]
+        service_labels = labels[service]
+        if only and is_only_cheapest_route(graph, lambda state: corridors.state_label(service_labels, state),
+                                           [start, successor]):
+            path_costs[divmod(cell, height)] = (label // base, label % base, intersection_count + counted_cells[cell])
+        else:
+            path_costs[divmod(cell, height)] = find_a_star_path_costs(graph, counted_cells, cell, route_length_bounds(
+                graph, [partial(corridors.state_label, service_labels) for service_labels in labels], cell))
+    return path_costs
@@ -39,4 +39,22 @@ def calculate_fitness(grid, shortest_paths):
         fitness = path_penalty * path_length + intersection_penalty * intersection_count
         fitness_scores[path[0][0]] = fitness
 
-    return fitness_scores
\ No newline at end of file
+    return fitness_scores
+
+
+def calculate_fitness_from_path_costs(grid, path_costs):
+    """
+    Calculates the same fitness scores as `calculate_fitness` from the per-building path
+    lengths and intersection counts of `find_all_path_costs`, so no path lists are needed.
+
+    Parameters:
+        grid (list[list[int]]): The 2D city grid.
+        path_costs (dict): Maps each building to its (cost, path_length, intersection_count).
+
+    Returns:
+        dict: A dictionary mapping each building position to its fitness score.
+    """
+    path_penalty = 1
+    intersection_penalty = len(grid) // 8
+    return {building: path_penalty * path_length + intersection_penalty * intersection_count
+            for building, (_, path_length, intersection_count) in path_costs.items()}
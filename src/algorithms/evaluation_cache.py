@@ -0,0 +1,424 @@
+from collections import OrderedDict
+from itertools import chain
+from algorithms.a_star_algo import find_all_shortest_paths, find_all_path_costs
+from algorithms.cost_function import calculate_fitness, calculate_fitness_from_path_costs
+from algorithms.batch_evaluation import batch_fitness
+from algorithms.corridor_graph import CorridorGraph
+from utils.city_grid import CityGrid
+from utils.genome import Genome, to_city_grid
+
+
+def compute_fitness(grid):
+    """
+    Computes the `calculate_fitness` scores of a grid with the distance-only search, run
+    over the corridors of the grid (see `CorridorGraph`) rather than cell by cell.
+    This is the uncached evaluation, run in worker processes by `EvaluationCache.fitness_many`.
+
+    Parameters:
+        grid (CityGrid | Genome): The grid to evaluate.
+
+    Returns:
+        dict: The fitness score of each building.
+    """
+    grid = to_city_grid(grid)
+    return calculate_fitness_from_path_costs(grid, find_all_path_costs(grid, CorridorGraph(grid)))
+
+
+class SharedFitnessStore:
+    """
+    Fitness scores shared between processes optimizing the same initial grid, so one
+    optimizer can reuse the evaluations of the others.
+
+    Entries are keyed by the `CityGrid.key()` of the expanded grid, so a genome and the grid
+    it expands to share an entry. The mapping is typically a `multiprocessing.Manager().dict()`
+    proxy, every lookup being a round trip to the manager process, so callers check their
+    own in-process memo first and only ask the store before running a search. The grids
+    must share their buildings and emergency services. The counters are kept by each
+    process for its own lookups.
+
+    Attributes:
+        entries (dict): The shared mapping of grid keys to `calculate_fitness` scores.
+        hits (int): The number of lookups answered by the store.
+        scoring_hits (int): The number of lookups answered by the store for grids whose
+                            paths still had to be searched, which only saved their scoring.
+        misses (int): The number of lookups of grids nobody had evaluated.
+        published (int): The number of exact evaluations stored, one per grid evaluated
+                         by this process.
+        local_hits (int): The number of lookups answered by the in-process memo of the
+                          optimizer before reaching the store, reported by the optimizer.
+    """
+
+    def __init__(self, entries=None):
+        """
+        Parameters:
+            entries (dict): The shared mapping, a plain in-process dict when None.
+        """
+        self.entries = entries if entries is not None else {}
+        self.hits = 0
+        self.scoring_hits = 0
+        self.misses = 0
+        self.published = 0
+        self.local_hits = 0
+
+    def get(self, grid, scoring_only=False):
+        """
+        Parameters:
+            grid (CityGrid | Genome): The grid to look up.
+            scoring_only (bool): Whether the caller searches the paths of the grid anyway,
+                                 so a hit only saves its scoring and counts as a scoring hit.
+
+        Returns:
+            dict: The fitness scores of the grid, or None if nobody has evaluated it yet.
+        """
+        fitness_scores = self.entries.get(to_city_grid(grid).key())
+        if fitness_scores is None:
+            self.misses += 1
+        elif scoring_only:
+            self.scoring_hits += 1
+        else:
+            self.hits += 1
+        return fitness_scores
+
+    def put(self, grid, fitness_scores):
+        """
+        Publishes the exact fitness scores of a grid.
+
+        Parameters:
+            grid (CityGrid | Genome): The evaluated grid.
+            fitness_scores (dict): Its `calculate_fitness` scores.
+        """
+        self.entries[to_city_grid(grid).key()] = fitness_scores
+        self.published += 1
+
+    def hit_share(self):
+        """
+        Returns:
+            float: The share of the evaluations asked for that were answered by a cache,
+                   in-process or shared, 0 when nothing was asked for. Scoring hits ran a
+                   search, so they count as evaluations asked for but not as hits.
+        """
+        hits = self.hits + self.local_hits
+        asked = hits + self.scoring_hits + self.published
+        return hits / asked if asked else 0.0
+
+
+class EvaluationCache:
+    """
+    A bounded LRU memo of grid evaluations, keyed by `CityGrid.key()` or `Genome.key()`.
+    Genomes are only expanded into grids on a miss.
+
+    Each entry holds the `calculate_fitness` scores of a grid and, once they have been asked
+    for, its `find_all_shortest_paths` result. Fitness-only lookups use the distance-only
+    search, so no path lists are built for grids that are never rendered or crossed over.
+    The cached objects are shared between callers and must not be modified.
+
+    Attributes:
+        max_entries (int): The number of grids kept before the least recently used is evicted.
+        enabled (bool): When False every lookup is computed from scratch and nothing is stored.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that had to run the search.
+        evictions (int): The number of entries dropped to respect `max_entries`.
+        shared (SharedFitnessStore): The store asked for the fitness scores missing from the
+                                     cache and given every fitness computed, if any.
+    """
+
+    def __init__(self, max_entries=4096, enabled=True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.shared = None
+        self._entries = OrderedDict()
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reset_stats(self):
+        """
+        Resets the hit, miss and eviction counters.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        """
+        Drops every cached entry and resets the counters.
+        """
+        self._entries.clear()
+        self.reset_stats()
+
+    def hit_rate(self):
+        """
+        Returns:
+            float: The share of lookups answered from the cache, 0 when nothing was looked up.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _lookup(self, grid):
+        """
+        Returns the key and the cached [paths, fitness] entry of a grid, or None for the entry.
+        """
+        if not isinstance(grid, (CityGrid, Genome)):
+            grid = CityGrid(grid)
+        key = grid.key()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return key, entry
+
+    def _store(self, key, entry):
+        """
+        Stores an entry and evicts the least recently used ones beyond `max_entries`.
+        """
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def evaluate(self, grid):
+        """
+        Returns the shortest paths and fitness scores of a grid, computing them on a miss.
+
+        On a miss, the shared store is asked for the fitness scores before searching. The
+        paths of the grid are not shared, so it is still searched and a shared hit only
+        saves its scoring, which the store counts as a scoring hit.
+
+        Parameters:
+            grid (CityGrid | Genome | list[list[int]]): The grid to evaluate.
+
+        Returns:
+            tuple:
+                - list[list[tuple]]: The shortest path of each building.
+                - dict: The fitness score of each building.
+        """
+        if not self.enabled:
+            self.misses += 1
+            grid = to_city_grid(grid)
+            shared_scores = self.shared.get(grid, scoring_only=True) if self.shared is not None else None
+            shortest_paths = find_all_shortest_paths(grid)
+            return shortest_paths, self._score(grid, shortest_paths, shared_scores)
+
+        key, entry = self._lookup(grid)
+        if entry is not None and entry[0] is not None:
+            self.hits += 1
+            return entry[0], entry[1]
+
+        self.misses += 1
+        grid = to_city_grid(grid)
+        if entry is not None:
+            entry[0] = find_all_shortest_paths(grid)
+        else:
+            shared_scores = self.shared.get(grid, scoring_only=True) if self.shared is not None else None
+            shortest_paths = find_all_shortest_paths(grid)
+            entry = [shortest_paths, self._score(grid, shortest_paths, shared_scores)]
+            self._store(key, entry)
+        return entry[0], entry[1]
+
+    def _score(self, grid, shortest_paths, shared_scores):
+        """
+        Returns the fitness scores of a searched grid: the ones found in the shared store,
+        if any, computed from its paths and published otherwise.
+        """
+        if shared_scores is not None:
+            return shared_scores
+        fitness_scores = calculate_fitness(grid, shortest_paths)
+        if self.shared is not None:
+            self.shared.put(grid, fitness_scores)
+        return fitness_scores
+
+    def fitness(self, grid):
+        """
+        Returns the fitness scores of a grid, computing them without paths on a miss.
+
+        Parameters:
+            grid (CityGrid | Genome | list[list[int]]): The grid to evaluate.
+
+        Returns:
+            dict: The fitness score of each building.
+        """
+        if not self.enabled:
+            self.misses += 1
+            return self._compute_fitness(grid)
+
+        key, entry = self._lookup(grid)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        fitness_scores = self._compute_fitness(grid)
+        self._store(key, [None, fitness_scores])
+        return fitness_scores
+
+    def _compute_fitness(self, grid):
+        """
+        Returns the fitness scores of a grid missing from the cache, from the shared store
+        when another process already evaluated it, computed and published otherwise.
+        """
+        if self.shared is None:
+            return compute_fitness(grid)
+        fitness_scores = self.shared.get(grid)
+        if fitness_scores is None:
+            fitness_scores = compute_fitness(grid)
+            self.shared.put(grid, fitness_scores)
+        return fitness_scores
+
+    def fitness_many(self, grids, executor=None, chunksize=1, batch=False):
+        """
+        Returns the fitness scores of several grids, computing the missing ones in a pool.
+
+        Each distinct grid that is not cached yet is computed once, without paths, by
+        `compute_fitness` in the executor. Results are stored and returned in the order of
+        `grids`, so the outcome does not depend on the number of workers.
+
+        With a shared store (see `SharedFitnessStore`), the grids it holds are not computed.
+
+        With `batch`, the missing grids are scored together by `batch_fitness` instead, one
+        batch per chunk when there is an executor. The grids must then share their buildings
+        and emergency services, like the members of a population.
+
+        Parameters:
+            grids (list[CityGrid | Genome]): The grids to evaluate.
+            executor (concurrent.futures.Executor): The pool to compute missing grids in.
+                                                    They are computed in-process when None.
+            chunksize (int): The number of grids sent to a worker at once.
+            batch (bool): Whether to score the missing grids with the batched wavefront search.
+
+        Returns:
+            list[dict]: The fitness scores of each grid, in order.
+        """
+        fitness_scores = [None] * len(grids)
+        pending = {}  # Key of each grid to compute -> (grid, indexes of its copies in `grids`)
+        for index, grid in enumerate(grids):
+            if not isinstance(grid, (CityGrid, Genome)):
+                grid = CityGrid(grid)
+            if self.enabled:
+                key, entry = self._lookup(grid)
+                if entry is not None:
+                    self.hits += 1
+                    fitness_scores[index] = entry[1]
+                    continue
+            else:
+                key = index
+            if key in pending:
+                self.hits += 1
+                pending[key][1].append(index)
+            else:
+                self.misses += 1
+                pending[key] = (grid, [index])
+
+        shared_scores = {}
+        if self.shared is not None:
+            for key, (grid, _) in pending.items():
+                scores = self.shared.get(grid)
+                if scores is not None:
+                    shared_scores[key] = scores
+
+        missing_grids = [grid for key, (grid, _) in pending.items() if key not in shared_scores]
+        if batch and executor is None:
+            results = batch_fitness(missing_grids)
+        elif batch:
+            chunks = [missing_grids[start:start + chunksize] for start in range(0, len(missing_grids), chunksize)]
+            results = chain.from_iterable(executor.map(batch_fitness, chunks))
+        elif executor is None:
+            results = map(compute_fitness, missing_grids)
+        else:
+            results = executor.map(compute_fitness, missing_grids, chunksize=chunksize)
+
+        results = iter(results)
+        for key, (grid, indexes) in pending.items():
+            if key in shared_scores:
+                scores = shared_scores[key]
+            else:
+                scores = next(results)
+                if self.shared is not None:
+                    self.shared.put(grid, scores)
+            if self.enabled:
+                self._store(key, [None, scores])
+            for index in indexes:
+                fitness_scores[index] = scores
+        return fitness_scores
+
+
+# Process-wide cache shared by the optimizers
+evaluation_cache = EvaluationCache()
+
+
+def configure_evaluation_cache(max_entries=None, enabled=None):
+    """
+    Changes the size limit of the process-wide cache or turns it on and off.
+    Turning the cache off also empties it.
+
+    Parameters:
+        max_entries (int): The new number of grids to keep, unchanged when None.
+        enabled (bool): Whether lookups should use the cache, unchanged when None.
+    """
+    if max_entries is not None:
+        evaluation_cache.max_entries = max_entries
+        while len(evaluation_cache) > max_entries:
+            evaluation_cache._entries.popitem(last=False)
+            evaluation_cache.evictions += 1
+    if enabled is not None:
+        evaluation_cache.enabled = enabled
+        if not enabled:
+            evaluation_cache._entries.clear()
+
+
+def share_evaluations(store):
+    """
+    Makes the process-wide cache ask a shared store for the fitness scores it misses and
+    publish the ones it computes.
+
+    Parameters:
+        store (SharedFitnessStore): The store, None to stop sharing.
+    """
+    evaluation_cache.shared = store
+
+
+def cached_shortest_paths(grid):
+    """
+    Memoized `find_all_shortest_paths` backed by the process-wide cache.
+
+    Parameters:
+        grid (CityGrid | Genome): The grid to evaluate.
+
+    Returns:
+        list[list[tuple]]: The shortest path of each building.
+    """
+    return evaluation_cache.evaluate(grid)[0]
+
+
+def cached_fitness(grid, with_paths=True):
+    """
+    Memoized `calculate_fitness(grid, find_all_shortest_paths(grid))` backed by the
+    process-wide cache.
+
+    Parameters:
+        grid (CityGrid | Genome): The grid to evaluate.
+        with_paths (bool): Whether a miss should also build and cache the paths. Callers that
+                           will not need the paths of this grid can skip them.
+
+    Returns:
+        dict: The fitness score of each building.
+    """
+    if with_paths:
+        return evaluation_cache.evaluate(grid)[1]
+    return evaluation_cache.fitness(grid)
+
+
+def cached_fitness_many(grids, executor=None, chunksize=1, batch=False):
+    """
+    Memoized fitness scores of several grids backed by the process-wide cache, the missing
+    ones being computed in a pool (see `EvaluationCache.fitness_many`).
+
+    Parameters:
+        grids (list[CityGrid | Genome]): The grids to evaluate.
+        executor (concurrent.futures.Executor): The pool to compute missing grids in.
+        chunksize (int): The number of grids sent to a worker at once.
+        batch (bool): Whether to score the missing grids with the batched wavefront search.
+
+    Returns:
+        list[dict]: The fitness scores of each grid, in order.
+    """
+    return evaluation_cache.fitness_many(grids, executor, chunksize, batch)
@@ -0,0 +1,170 @@
+from algorithms.bounded_evaluation import reachable_states
+
+FEASIBILITY_POLICIES = ("penalize", "reject", "ignore")
+
+
+def unreachable_buildings(graph, search_state=None, changed_cells=None):
+    """
+    Lists the buildings of a grid that cannot reach any emergency service, without running
+    any path search.
+
+    Without a search state, the states that can reach an emergency service are marked by
+    `reachable_states` over the whole graph. With the search state of a grid differing from
+    this one in a few cells, the paths of that grid serve as certificates instead: a move
+    only changes when the cell it leaves changes, so a path that does not leave a changed
+    cell is still a valid path, and so is the suffix of a path after its last changed cell.
+    Only buildings whose path leaves a changed cell are searched, forwards from their start
+    node until they reach a goal state or a certified state, so the check usually costs a
+    few steps per changed cell.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        search_state (SearchState): The search state of a grid sharing its buildings and
+                                    emergency services, if any.
+        changed_cells (list[tuple]): The (y, x) positions of the cells that differ between
+                                     the grid of the search state and this one.
+
+    Returns:
+        list[tuple]: The (x, y) positions, as keyed by the fitness scores, of the buildings
+                     that cannot reach any emergency service, sorted.
+    """
+    height, state_count = graph.height, graph.state_count
+    out_indptr, out_degree, out_indices = graph.out_indptr, graph.out_degree, graph.out_indices
+
+    if search_state is None:
+        reachable = reachable_states(graph)
+        unreachable = []
+        for cell in graph.buildings():
+            start = state_count + cell
+            offset = out_indptr[start]
+            if not any(reachable[out_indices[edge]] for edge in range(offset, offset + out_degree[start])):
+                unreachable.append(divmod(cell, height))
+        return sorted(unreachable)
+
+    changed = {x * height + y for y, x in changed_cells}
+
+    def state_cell(state):
+        return state - state_count if state >= state_count else state >> 2
+
+    certified = {state for goal_states in graph.goal_states() for state in goal_states}
+    suspects = []
+    for building, (path, _, _) in search_state.paths.items():
+        if path is None:
+            suspects.append(building)
+            continue
+        last_changed = max((index for index, state in enumerate(path) if state_cell(state) in changed), default=-1)
+        certified.update(path[last_changed + 1:])
+        if last_changed >= 0:
+            suspects.append(building)
+
+    dead_ends = set()  # States proven unable to reach an emergency service
+    unreachable = []
+    for x, y in suspects:
+        start = state_count + x * height + y
+        visited = {start}
+        stack = [start]
+        found = False
+        while stack and not found:
+            state = stack.pop()
+            offset = out_indptr[state]
+            for edge in range(offset, offset + out_degree[state]):
+                successor = out_indices[edge]
+                if successor in certified:
+                    found = True
+                    break
+                if successor not in visited and successor not in dead_ends:
+                    visited.add(successor)
+                    stack.append(successor)
+        if found:
+            certified.add(start)
+        else:
+            dead_ends |= visited
+            unreachable.append((x, y))
+    return sorted(unreachable)
+
+
+class FeasibilityFilter:
+    """
+    Decides how grids with buildings that cannot reach any emergency service are scored.
+
+    `calculate_fitness` leaves such buildings out, so without a filter an infeasible grid
+    scores the sum of its reachable buildings only and looks better than it is. Policies:
+      - "penalize": every unreachable building adds `penalty` to the fitness sum.
+      - "reject": as "penalize", but while the grid they derive from is feasible, candidate
+        grids are checked with `unreachable_buildings` and turned down before any path
+        search when they are not. Penalizing rather than rejecting infeasible grids lets
+        a search started from an infeasible grid move towards feasible ones.
+      - "ignore": unreachable buildings are left out of the sum, as `calculate_fitness` does.
+
+    Attributes:
+        policy (str): The policy.
+        penalty (float): The fitness added per unreachable building.
+        building_count (int): The number of buildings of the grids.
+        rejected (int): The number of grids rejected before being searched.
+    """
+
+    def __init__(self, grid, policy="penalize", penalty=None):
+        """
+        Parameters:
+            grid (CityGrid): Any grid of the run, giving the buildings.
+            policy (str): "penalize", "reject" or "ignore".
+            penalty (float): The fitness added per unreachable building, by default the
+                             number of cells of the grid, more than any route scores in
+                             practice.
+        """
+        if policy not in FEASIBILITY_POLICIES:
+            raise ValueError(f"Unknown feasibility policy {policy!r}, expected one of {FEASIBILITY_POLICIES}")
+        height, width = grid.shape
+        self.policy = policy
+        self.penalty = penalty if penalty is not None else height * width
+        self.building_count = len(grid.buildings())
+        self.rejected = 0
+
+    def admits(self, graph, search_state, changed_cells):
+        """
+        Tells whether a candidate grid is worth searching. Only the "reject" policy turns
+        grids down, when some of their buildings cannot reach an emergency service while
+        all the buildings of the grid they derive from can.
+
+        Parameters:
+            graph (TransitionGraph): The compiled state graph of the candidate grid.
+            search_state (SearchState): The search state of the grid it derives from.
+            changed_cells (list[tuple]): The (y, x) positions of the cells that differ
+                                         between the two grids.
+
+        Returns:
+            bool: False if the candidate is rejected.
+        """
+        if self.policy != "reject" or len(search_state.fitness_scores) < self.building_count:
+            return True
+        if not unreachable_buildings(graph, search_state, changed_cells):
+            return True
+        self.rejected += 1
+        return False
+
+    def fitness(self, fitness_scores):
+        """
+        Parameters:
+            fitness_scores (dict): The `calculate_fitness` scores of a grid.
+
+        Returns:
+            float: The fitness sum of the grid under the policy.
+        """
+        total = sum(fitness_scores.values())
+        missing = self.building_count - len(fitness_scores)
+        if missing <= 0 or self.policy == "ignore":
+            return total
+        return total + self.penalty * missing
+
+    def average(self, fitness_scores):
+        """
+        Parameters:
+            fitness_scores (dict): The `calculate_fitness` scores of a grid.
+
+        Returns:
+            float: The average fitness score of the grid under the policy, over every
+                   building, or over the buildings the grid reaches with "ignore".
+        """
+        if self.policy == "ignore":
+            return sum(fitness_scores.values()) / len(fitness_scores)
+        return self.fitness(fitness_scores) / self.building_count
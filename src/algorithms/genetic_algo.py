@@ -1,14 +1,20 @@
 import random
-from copy import deepcopy
 from datetime import datetime
 import os
-from algorithms.a_star_algo import find_all_shortest_paths
-from utils.helper import generate_neighbor, best_path_retention
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from algorithms.evaluation_cache import evaluation_cache, cached_shortest_paths, cached_fitness, cached_fitness_many
+from utils.genome import GenomeLayout, Genome, mutate_genome, crossover_genomes
+from algorithms.surrogate import SurrogateModel, prescreen
+from algorithms.feasibility import FeasibilityFilter
 from utils.grid_generation import place_intersections_in_every_column_randomly
+from utils.population import PopulationTensor, path_cells, retention_writes
 from visuals.visualization import save_city_grid_with_annotation, combine_images, remove_images_by_prefix
-from algorithms.cost_function import calculate_fitness
 from grid_constants import RES_DIR
 
+DUPLICATE_POLICIES = ("skip", "immigrants")
+MAX_IMMIGRANT_ATTEMPTS = 10  # Random grids drawn before a duplicate is kept after all
+
 
 def initialize_population(size, initial_grid):
     """
@@ -17,14 +23,14 @@ def initialize_population(size, initial_grid):
 
     Parameters:
         size (int): The number of grids in the population.
-        initial_grid (list[list[int]]): The initial grid to serve as a base for population creation.
+        initial_grid (CityGrid): The initial grid to serve as a base for population creation.
 
     Returns:
-        list[list[list[int]]]: A list of grids, each representing a member of the population.
+        list[CityGrid]: A list of grids, each representing a member of the population.
     """
     population = []
     for i in range(size):
-        grid = deepcopy(initial_grid)
+        grid = initial_grid.copy()
         grid_with_intersections = place_intersections_in_every_column_randomly(
             grid)
         population.append(grid_with_intersections)
@@ -33,7 +39,23 @@ def initialize_population(size, initial_grid):
     return population
 
 
-def select_best_grids(population, fitness_scores, num_selected):
+def initialize_population_tensor(size, initial_grid, rng):
+    """
+    Vectorized `initialize_population`: places the intersections of every grid of the
+    population at once (see `PopulationTensor.initialize`).
+
+    Parameters:
+        size (int): The number of grids in the population.
+        initial_grid (CityGrid): The initial grid to serve as a base for population creation.
+        rng (numpy.random.Generator): The random generator.
+
+    Returns:
+        list[CityGrid]: A list of grids, each representing a member of the population.
+    """
+    return PopulationTensor.repeat(initial_grid, size).initialize(rng).to_grids()
+
+
+def select_best_grids(population, fitness_scores, num_selected, feasibility=None):
     """
     Selects the best grids based on their average fitness scores.
 
@@ -43,19 +65,25 @@ def select_best_grids(population, fitness_scores, num_selected):
     3. Selects the top num_selected grids for the next generation.
 
     Parameters:
-        population (list[list[list[int]]]): The current population of grids.
+        population (list[Genome]): The current population of grids.
         fitness_scores (list[dict]): A list of fitness score dictionaries for each grid in the population.
                                      Each dictionary maps buildings to their fitness scores.
         num_selected (int): The number of grids to select for the next generation.
+        feasibility (FeasibilityFilter): How unreachable buildings are scored (see
+                                         `FeasibilityFilter.average`). Without one they
+                                         are left out of the average.
 
     Returns:
         tuple: 
-            - list[list[list[int]]]: The selected grids.
+            - list[Genome]: The selected grids.
             - list[float]: The average fitness scores of the selected grids.
     """
     avg_fitness_scores = []
     for grid, fitness_dict in zip(population, fitness_scores):
-        avg_fitness = sum(fitness_dict.values()) / len(fitness_dict)
+        if feasibility is not None:
+            avg_fitness = feasibility.average(fitness_dict)
+        else:
+            avg_fitness = sum(fitness_dict.values()) / len(fitness_dict)
         avg_fitness_scores.append((grid, avg_fitness))
 
     # Sort by average fitness (ascending)
@@ -69,7 +97,159 @@ def select_best_grids(population, fitness_scores, num_selected):
     return selected_population, avg_fitness
 
 
-def genetic_algorithm(population_size, generations, mutation_rate, initial_grid):
+def breed_next_generation(selected_population, population_size, mutation_rate):
+    """
+    Builds the next population from the selected genomes: `population_size` children are
+    bred by crossover (best path retention) of random pairs of selected genomes, then every
+    child is mutated with probability `mutation_rate`. The selected genomes themselves are
+    carried over unchanged (elitism). Crossover and mutation work on the intersection
+    bitsets, only the parents' paths and scores come from the evaluation cache.
+
+    Parameters:
+        selected_population (list[Genome]): The genomes selected as parents.
+        population_size (int): The number of children to breed.
+        mutation_rate (float): The probability of mutating a child.
+
+    Returns:
+        list[Genome]: The selected genomes followed by the children.
+    """
+    # Create a new population with the best grid explicitly included
+    new_population = []  # Start with the best grid
+
+    while len(new_population) < population_size:
+        parent1, parent2 = random.sample(selected_population, 2)
+
+        parent1_paths = cached_shortest_paths(parent1)
+
+        parent2_paths = cached_shortest_paths(parent2)
+
+        child = crossover_genomes(
+            parent1, parent2, parent1_paths, parent2_paths, cached_fitness(parent1), cached_fitness(parent2))
+
+        new_population.append(child)
+
+    combined_population = selected_population + new_population
+
+    return [
+        mutate_genome(grid) if (
+            grid not in selected_population and random.random() < mutation_rate) else grid
+        for grid in combined_population
+    ]
+
+
+def breed_next_generation_tensor(selected_population, population_size, mutation_rate, rng):
+    """
+    Vectorized `breed_next_generation`: the children of all the random pairs of selected
+    genomes are merged at once (see `PopulationTensor.merge_intersections`) and the children
+    drawn for mutation are mutated at once (see `PopulationTensor.mutate`). Like in
+    `breed_next_generation`, children identical to a selected genome are never mutated and
+    the selected genomes are carried over unchanged. The random numbers are drawn from
+    `rng`, so the children differ from those of `breed_next_generation` under the same seed.
+
+    Parameters:
+        selected_population (list[Genome]): The genomes selected as parents.
+        population_size (int): The number of children to breed.
+        mutation_rate (float): The probability of mutating a child.
+        rng (numpy.random.Generator): The random generator.
+
+    Returns:
+        list[Genome]: The selected genomes followed by the children.
+    """
+    layout = selected_population[0].layout
+    parents = PopulationTensor.from_grids([genome.to_grid() for genome in selected_population])
+    shape = parents.cells.shape[1:]
+    cells = [path_cells(shape, cached_shortest_paths(genome)) for genome in selected_population]
+    fitness_scores = [cached_fitness(genome) for genome in selected_population]
+
+    # Two distinct random parents for every child
+    pairs = rng.random((population_size, len(selected_population))).argsort(axis=1)[:, :2]
+    writes = [retention_writes(cells[first], cells[second], fitness_scores[first], fitness_scores[second])
+              for first, second in pairs]
+    children = parents.merge_intersections(pairs[:, 0], pairs[:, 1], writes)
+
+    mutated = np.array([Genome.from_grid(layout, grid) not in selected_population for grid in children.to_grids()])
+    mutated &= rng.random(population_size) < mutation_rate
+    children = children.mutate(rng, mutated)
+
+    return selected_population + [Genome.from_grid(layout, grid) for grid in children.to_grids()]
+
+
+def deduplicate_population(population, policy, layout, initial_grid):
+    """
+    Finds the copies of the same genome in a population, by hash, before it is scored.
+
+    With the "skip" policy copies stay in the population but only their first occurrence
+    is scored, the others sharing its scores. With the "immigrants" policy every copy is
+    replaced by a fresh random immigrant built like the members of the initial population;
+    a copy is only kept (and skipped) when `MAX_IMMIGRANT_ATTEMPTS` immigrants in a row are
+    themselves copies.
+
+    Parameters:
+        population (list[Genome]): The population to score.
+        policy (str): "skip" or "immigrants".
+        layout (GenomeLayout): The layout shared by the genomes.
+        initial_grid (CityGrid): The initial grid immigrants are created from.
+
+    Returns:
+        tuple:
+            - list[Genome]: The population, with immigrants in place of the copies they replace.
+            - list[Genome]: Its distinct genomes, in order of first occurrence.
+            - list[int]: For each member, the index of its genome among the distinct ones.
+            - int: The number of evaluations saved, one per copy left in the population.
+            - int: The number of immigrants brought in.
+    """
+    members, unique_grids, owners = [], [], []
+    positions = {}  # Genome -> index among the distinct genomes
+    evaluations_saved = 0
+    immigrants = 0
+    for genome in population:
+        if genome in positions and policy == "immigrants":
+            for _ in range(MAX_IMMIGRANT_ATTEMPTS):
+                immigrant = Genome.from_grid(layout, initialize_population(1, initial_grid)[0])
+                if immigrant not in positions:
+                    genome = immigrant
+                    immigrants += 1
+                    break
+        if genome in positions:
+            evaluations_saved += 1
+        else:
+            positions[genome] = len(unique_grids)
+            unique_grids.append(genome)
+        members.append(genome)
+        owners.append(positions[genome])
+    return members, unique_grids, owners, evaluations_saved, immigrants
+
+
+def evaluate_population(population, executor=None, max_workers=1, batch=False):
+    """
+    Scores every grid of a population through the process-wide evaluation cache.
+
+    Without an executor the grids are evaluated one by one together with their paths.
+    With one, the grids missing from the cache are sent to the worker processes in their
+    compact pickled form (genome bitsets, the shared layout being pickled once per chunk)
+    and scored without paths; the scores come back in population order, so a run stays
+    reproducible under a fixed seed. With `batch`, the missing grids are scored without
+    paths by the batched wavefront search (see `batch_fitness`), as a whole in-process or
+    one batch per chunk in the pool; the scores are the same.
+
+    Parameters:
+        population (list[Genome]): The grids to score.
+        executor (concurrent.futures.Executor): The worker pool, or None to score in-process.
+        max_workers (int): The number of workers of the pool, used to size the chunks.
+        batch (bool): Whether to score the grids with the batched wavefront search.
+
+    Returns:
+        list[dict]: The fitness scores of each grid, in population order.
+    """
+    if executor is None and not batch:
+        return [cached_fitness(grid) for grid in population]
+    chunksize = max(1, len(population) // (4 * max_workers))
+    return cached_fitness_many(population, executor, chunksize, batch)
+
+
+def genetic_algorithm(population_size, generations, mutation_rate, initial_grid, max_workers=1,
+                      batch_evaluation=False, duplicates="skip", screen_fraction=1.0, tensor_operators=False,
+                      feasibility="penalize", unreachable_penalty=None, dir_path=None):
     """
     Implements a genetic algorithm to optimize city grid configurations for better fitness scores.
     Includes elitism to preserve the best grid across generations.
@@ -84,84 +264,150 @@ def genetic_algorithm(population_size, generations, mutation_rate, initial_grid)
     3. Visualizes and logs the grids and fitness scores for each generation.
     4. Returns the globally best grid and its shortest paths.
 
+    Individuals are stored as `Genome` bitsets over the layout of the initial grid and are
+    only expanded into grids to be searched or rendered. Paths and fitness scores come from
+    the process-wide evaluation cache, so grids that are scored, rendered, used as parents
+    or carried over as elites are only searched once.
+    With `max_workers` above 1 each generation is scored in a process pool
+    (see `evaluate_population`), which makes large populations practical. With
+    `batch_evaluation` the grids of a generation are searched together by the batched
+    wavefront search instead of one by one, with the same scores.
+    Crossover often reproduces a parent and most children are not mutated, so each
+    generation is deduplicated by hash before it is scored (see `deduplicate_population`):
+    copies either share the scores of their first occurrence or are replaced by random
+    immigrants, and the number of evaluations saved is logged per generation.
+    With `screen_fraction` below 1, a surrogate model (see `SurrogateModel`) ranks the new
+    genomes of each generation and only the most promising fraction of them is evaluated
+    exactly and competes for selection; the elites carried over are always kept. The model
+    learns from the genomes evaluated so far and its rank correlation with the exact scores
+    is printed at the end of the run.
+    With `tensor_operators`, the initial population is created and every generation is bred
+    by the vectorized operators of `PopulationTensor` instead of genome by genome (see
+    `breed_next_generation_tensor`). Their random numbers come from a NumPy generator seeded
+    from `random`, so a run stays reproducible under a fixed seed, but follows a different
+    course than without the flag.
+    Grids are compared by their average fitness under the `feasibility` policy (see
+    `FeasibilityFilter`), so by default every building a grid cannot serve adds
+    `unreachable_penalty` to its sum. Children are not derived from a single searched grid
+    their reachability could be checked against, so "reject" scores them like "penalize".
+
     Parameters:
         population_size (int): The number of grids in the population.
         generations (int): The number of generations to evolve the population.
         mutation_rate (float): The probability of mutating a grid in the population.
-        initial_grid (list[list[int]]): The initial grid used to create the initial population.
+        initial_grid (CityGrid): The initial grid used to create the initial population.
+        max_workers (int): The number of worker processes scoring the population, None for
+                           one per CPU. A single worker scores everything in-process.
+        batch_evaluation (bool): Whether to score each generation with the batched search.
+        duplicates (str): "skip" to score copies of a genome once, "immigrants" to replace
+                          them with random immigrants.
+        screen_fraction (float): The share of the new genomes of a generation that is
+                                 evaluated exactly, all of them with 1.
+        tensor_operators (bool): Whether to create and breed the population with the
+                                 vectorized population operators.
+        feasibility (str): "penalize", "reject" or "ignore".
+        unreachable_penalty (float): The fitness added per unreachable building, by default
+                                     the number of cells of the grid.
+        dir_path (str): The directory the visualizations are saved to, created if needed.
+                        A new timestamped directory in RES_DIR when omitted.
 
     Returns:
         tuple:
-            - list[list[int]]: The globally best grid configuration.
+            - CityGrid: The globally best grid configuration.
             - list[list[tuple]]: The shortest paths corresponding to the best grid.
     """
-    population = initialize_population(population_size, initial_grid)
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy {duplicates!r}, expected one of {DUPLICATE_POLICIES}")
+
+    feasibility_filter = FeasibilityFilter(initial_grid, feasibility, unreachable_penalty)
+
+    # Individuals are genomes sharing the layout of the initial grid
+    layout = GenomeLayout(initial_grid)
+    if tensor_operators:
+        rng = np.random.default_rng(random.getrandbits(64))
+        initial_population = initialize_population_tensor(population_size, initial_grid, rng)
+    else:
+        initial_population = initialize_population(population_size, initial_grid)
+    population = [Genome.from_grid(layout, grid) for grid in initial_population]
     best_fitness = float('inf')  # Initialize with a very high fitness score
 
-    dir_path = os.path.join(
-        RES_DIR, "genetic_algorithm_" + datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
-    os.mkdir(dir_path)
-    for generation in range(generations):
-        fitness_scores = []
-        for grid in population:
-            shortest_paths = find_all_shortest_paths(grid)
-            fitness = calculate_fitness(grid, shortest_paths)
-            fitness_scores.append(fitness)
-
-        # Select the best grids
-        selected_population, avg_fitness = select_best_grids(
-            population, fitness_scores, num_selected=6)
-
-        # Identify the best grid in the current generation
-        current_best_index = avg_fitness.index(min(avg_fitness))
-        current_best_grid = selected_population[current_best_index]
-        current_best_fitness = avg_fitness[current_best_index]
-
-        image_paths = []
-
-        # Visualize the selected grids
-        for i, grid in enumerate(selected_population):
-            shortest_paths = find_all_shortest_paths(grid)
-            annotated_path = save_city_grid_with_annotation(
-                grid, shortest_paths, dir_path, f"generation_{generation+1}grid{i+1}.png", avg_fitness[i]
-            )
-            image_paths.append(annotated_path)
-
+    if dir_path is None:
+        dir_path = os.path.join(
+            RES_DIR, "genetic_algorithm_" + datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        os.mkdir(dir_path)
+    else:
+        os.makedirs(dir_path, exist_ok=True)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers) if max_workers > 1 else None
+    surrogate = SurrogateModel(initial_grid) if screen_fraction < 1 else None
+    selected_population = []
+    try:
+        for generation in range(generations):
+            population, unique_grids, owners, evaluations_saved, immigrants = deduplicate_population(
+                population, duplicates, layout, initial_grid)
+
+            # Only the kept genomes are evaluated, the others leave the population unscored
+            kept = list(range(len(unique_grids)))
+            if surrogate is not None:
+                new_genomes = [index for index, genome in enumerate(unique_grids) if genome not in selected_population]
+                screened = prescreen(surrogate, [unique_grids[index] for index in new_genomes], screen_fraction)
+                kept = sorted(set(kept) - set(new_genomes) | {new_genomes[index] for index in screened})
+            kept_fitness_scores = evaluate_population([unique_grids[index] for index in kept], executor, max_workers,
+                                                      batch_evaluation)
+            unique_fitness_scores = dict(zip(kept, kept_fitness_scores))
+            if surrogate is not None:
+                surrogate.observe([unique_grids[index] for index in kept],
+                                  [feasibility_filter.average(scores) for scores in kept_fitness_scores])
+            screened_out = sum(owner not in unique_fitness_scores for owner in owners)
+            population, fitness_scores = map(list, zip(*[(genome, unique_fitness_scores[owner])
+                                                         for genome, owner in zip(population, owners)
+                                                         if owner in unique_fitness_scores]))
+
+            # Select the best grids
+            selected_population, avg_fitness = select_best_grids(
+                population, fitness_scores, num_selected=6, feasibility=feasibility_filter)
+
+            # Identify the best grid in the current generation
+            current_best_index = avg_fitness.index(min(avg_fitness))
+            current_best_grid = selected_population[current_best_index]
+            current_best_fitness = avg_fitness[current_best_index]
+
+            image_paths = []
+
+            # Visualize the selected grids
+            for i, grid in enumerate(selected_population):
+                shortest_paths = cached_shortest_paths(grid)
+                annotated_path = save_city_grid_with_annotation(
+                    grid.to_grid(), shortest_paths, dir_path, f"generation_{generation+1}grid{i+1}.png", avg_fitness[i]
+                )
+                image_paths.append(annotated_path)
+
+                print(
+                    f"Generation {generation + 1}, Grid {i + 1} (Fitness: {avg_fitness[i]})")
+
+            combine_images(image_paths, os.path.join(
+                dir_path, f"Generation_{generation+1}_summary.png"))
+            remove_images_by_prefix(dir_path, "generation_")
+
+            if tensor_operators:
+                population = breed_next_generation_tensor(selected_population, population_size, mutation_rate, rng)
+            else:
+                population = breed_next_generation(selected_population, population_size, mutation_rate)
+
+            # Log the best fitness of the generation
             print(
-                f"Generation {generation + 1}, Grid {i + 1} (Fitness: {avg_fitness[i]})")
-
-        combine_images(image_paths, os.path.join(
-            dir_path, f"Generation_{generation+1}_summary.png"))
-        remove_images_by_prefix(dir_path, "generation_")
-
-        # Create a new population with the best grid explicitly included
-        new_population = []  # Start with the best grid
-
-        while len(new_population) < population_size:
-            parent1, parent2 = random.sample(selected_population, 2)
-
-            parent1_paths = find_all_shortest_paths(parent1)
-
-            parent2_paths = find_all_shortest_paths(parent2)
-
-            child = best_path_retention(
-                parent1, parent2, parent1_paths, parent2_paths)
-
-            new_population.append(child)
-
-        combined_population = selected_population + new_population
-
-        population = [
-            generate_neighbor(grid) if (
-                grid not in selected_population and random.random() < mutation_rate) else grid
-            for grid in combined_population
-        ]
-
-        # Log the best fitness of the generation
-        print(
-            f"Generation {generation + 1}: Best Fitness = {current_best_fitness}")
-        best_fitness = current_best_fitness
-
-    short_paths = find_all_shortest_paths(current_best_grid)
-
-    return current_best_grid, short_paths, best_fitness
+                f"Generation {generation + 1}: Best Fitness = {current_best_fitness} "
+                f"({evaluations_saved} evaluations saved, {immigrants} immigrants, {screened_out} screened out)")
+            best_fitness = current_best_fitness
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    short_paths = cached_shortest_paths(current_best_grid)
+    print(f"Evaluation cache: {evaluation_cache.hits} hits, {evaluation_cache.misses} misses "
+          f"({evaluation_cache.hit_rate():.0%} hit rate)")
+    if surrogate is not None:
+        print(surrogate.report())
+
+    return current_best_grid.to_grid(), short_paths, best_fitness
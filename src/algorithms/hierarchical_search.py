@@ -0,0 +1,511 @@
+import heapq
+from array import array
+from algorithms.transition_graph import TransitionGraph
+from algorithms.indexed_search import is_only_cheapest_route, find_a_star_path, find_a_star_path_costs, path_cost
+
+BLOCK_SIZE = 16  # Cells per side of a block
+
+
+class HierarchicalGraph:
+    """
+    An HPA*-style abstraction of the `TransitionGraph` of a large grid.
+
+    The grid is partitioned into square blocks. The abstract nodes are the entry states of
+    every block, the states reached by a move from another block, and the goal states of the
+    emergency services. The abstract edges of a block are precomputed by one Dijkstra search
+    inside the block from each of its entry states: they lead to the goal states of the
+    block and, through the moves leaving it, to the entry states of the neighboring blocks,
+    weighted by the packed cost * label_base + length of the best route inside the block.
+
+    Unlike HPA*, which keeps one transition per entrance to keep the abstract graph small,
+    every move across a block border is kept, so the abstract search has no optimality
+    gap: the label of every abstract node is the label of the full search. Routes are then
+    refined block by block (see `search_block`), which yields exactly the routes of the
+    flat backward search, and the buildings whose route is not the only cheapest one are
+    searched with A* (see `is_only_cheapest_route`), so the paths are those of
+    `find_all_shortest_paths`.
+
+    That A* search runs over the full state graph and dominates the searches of large
+    grids. Built with `exact=False`, the graph skips it and keeps the route the labels
+    choose (see `indexed_search.choose_nearest_service`): the cheapest route with the fewest
+    nodes to each service, the service with the shortest such route winning. The paths of
+    the buildings with several cheapest routes, and so their costs, lengths and counted
+    intersections, may then differ from those of `find_all_shortest_paths`; on grids of 8
+    rows or more, where A* finds cheapest routes, their paths are never longer.
+
+    When cells change, `update_cells` patches the state graph and rebuilds the abstract
+    edges of the blocks of the changed cells and of the blocks next to them only.
+
+    Attributes:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        block_size (int): The number of cells per side of a block.
+        exact (bool): Whether the buildings with several cheapest routes are searched with A*.
+        block_rows (int): The number of blocks per column of blocks.
+        block_of (array): The block index of each cell.
+        entries (list[list[int]]): The entry states of each block.
+        block_edges (list[list[tuple]]): The abstract edges of each block as
+                                         (entry state, target state, packed label) triples.
+        in_edges (dict): Maps each abstract node to the abstract edges leading to it, grouped
+                         by block as {block: [(entry state, packed label), ...]}.
+    """
+
+    def __init__(self, grid, block_size=BLOCK_SIZE, graph=None, exact=True):
+        """
+        Parameters:
+            grid (CityGrid | list[list[int]]): The grid.
+            block_size (int): The number of cells per side of a block.
+            graph (TransitionGraph): The compiled state graph of the grid, built when omitted.
+            exact (bool): Whether the buildings with several cheapest routes are searched
+                          with A*, as `find_all_shortest_paths` does.
+        """
+        self.graph = graph if graph is not None else TransitionGraph(grid)
+        self.block_size = block_size
+        self.exact = exact
+        height, width = self.graph.height, self.graph.width
+        self.block_rows = -(-height // block_size)
+        block_count = self.block_rows * -(-width // block_size)
+
+        self.block_of = array("i", [0]) * self.graph.cell_count
+        self.block_cells = [[] for _ in range(block_count)]
+        for x in range(width):
+            for y in range(height):
+                block = (x // block_size) * self.block_rows + y // block_size
+                self.block_of[x * height + y] = block
+                self.block_cells[block].append(x * height + y)
+
+        self.entries = [[] for _ in range(block_count)]
+        self.block_edges = [[] for _ in range(block_count)]
+        self.in_edges = {}
+        self._reset_goals()
+        for block in range(block_count):
+            self._build_block(block)
+
+    def _reset_goals(self):
+        self.goal_states = self.graph.goal_states()
+        self._goal_set = {state for states in self.goal_states for state in states}
+        self._labels = None
+        self._block_labels = {}
+
+    def _build_block(self, block):
+        """
+        Finds the entry states of a block and computes its abstract edges.
+        """
+        graph = self.graph
+        neighbors, block_of, in_degree = graph.neighbors, self.block_of, graph.in_degree
+
+        for target in {target for _, target, _ in self.block_edges[block]}:
+            del self.in_edges[target][block]
+            if not self.in_edges[target]:
+                del self.in_edges[target]
+
+        entries = []
+        for cell in self.block_cells[block]:
+            for move in range(4):
+                state = cell * 4 + move
+                predecessor_cell = neighbors[cell * 4 + (3 - move)]  # The cell behind the move
+                if predecessor_cell >= 0 and block_of[predecessor_cell] != block and in_degree[state]:
+                    entries.append(state)
+        self.entries[block] = entries
+
+        edges = []
+        for entry in entries:
+            edges.extend((entry, target, packed) for target, packed in self.block_targets(entry).items())
+
+        self.block_edges[block] = edges
+        for entry, target, packed in edges:
+            self.in_edges.setdefault(target, {}).setdefault(block, []).append((entry, packed))
+
+    def block_targets(self, source):
+        """
+        Dijkstra search forwards from a state, inside its block.
+
+        Parameters:
+            source (int): The state id to search from.
+
+        Returns:
+            dict: The packed cost and length of the best route inside the block from the
+                  state to each goal state of the block it reaches, and to each state of
+                  another block it reaches in one move out of the block.
+        """
+        graph = self.graph
+        base, block_of, goal_set = graph.label_base, self.block_of, self._goal_set
+        out_indptr, out_degree = graph.out_indptr, graph.out_degree
+        out_indices, out_costs = graph.out_indices, graph.out_costs
+        block = block_of[source >> 2]
+
+        distances = {source: 0}
+        targets = {}
+        open_list = [(0, source)]
+        while open_list:
+            distance, state = heapq.heappop(open_list)
+            if distance > distances[state]:
+                continue
+            if state in goal_set and state != source:
+                targets[state] = distance
+            offset = out_indptr[state]
+            for edge in range(offset, offset + out_degree[state]):
+                successor = out_indices[edge]
+                successor_distance = distance + out_costs[edge] * base + 1
+                if block_of[successor >> 2] != block:
+                    # Leaving the block: the successor is an entry state of its block
+                    if successor_distance < targets.get(successor, successor_distance + 1):
+                        targets[successor] = successor_distance
+                elif successor_distance < distances.get(successor, successor_distance + 1):
+                    distances[successor] = successor_distance
+                    heapq.heappush(open_list, (successor_distance, successor))
+        return targets
+
+    def update_cells(self, grid, changed_cells):
+        """
+        Patches the graph in place after some cells of its grid changed value: the state
+        graph is patched around the changed cells and the abstract edges of their blocks,
+        and of the blocks next to them, are rebuilt.
+
+        Parameters:
+            grid (CityGrid | list[list[int]]): The grid after the change.
+            changed_cells (list[tuple]): The (y, x) positions of the changed cells.
+        """
+        graph = self.graph
+        graph.update_cells(grid, changed_cells)
+        blocks = set()
+        for y, x in changed_cells:
+            cell = x * graph.height + y
+            blocks.add(self.block_of[cell])
+            for move in range(4):
+                neighbor_cell = graph.neighbors[cell * 4 + move]
+                if neighbor_cell >= 0:
+                    blocks.add(self.block_of[neighbor_cell])
+        self._reset_goals()
+        for block in sorted(blocks):
+            self._build_block(block)
+
+    def copy(self):
+        """
+        Returns an independent copy of the graph, to be patched for a neighboring grid.
+
+        Returns:
+            HierarchicalGraph: The copied graph.
+        """
+        new_graph = HierarchicalGraph.__new__(HierarchicalGraph)
+        new_graph.__dict__.update(self.__dict__)
+        new_graph.graph = self.graph.copy()
+        # Blocks are rebuilt by replacing their lists, which can therefore be shared
+        new_graph.entries = list(self.entries)
+        new_graph.block_edges = list(self.block_edges)
+        new_graph.in_edges = {target: dict(groups) for target, groups in self.in_edges.items()}
+        new_graph._goal_set = set(self._goal_set)
+        new_graph._labels = None
+        new_graph._block_labels = {}
+        return new_graph
+
+    def abstract_node_count(self):
+        """
+        Returns:
+            int: The number of abstract nodes: entry states and goal states.
+        """
+        return len(self._goal_set.union(*map(set, self.entries)))
+
+    def abstract_edge_count(self):
+        """
+        Returns:
+            int: The number of abstract edges.
+        """
+        return sum(map(len, self.block_edges))
+
+    def labels(self):
+        """
+        Runs the backward search of every emergency service over the abstract graph, once
+        per version of the graph: `update_cells` discards the labels.
+
+        Returns:
+            list[dict]: Per emergency service, the label of each abstract node that can
+                        reach it, as in `search_from_emergency_services`.
+        """
+        if self._labels is None:
+            self._labels = [search_abstract_graph(self, goal_states) for goal_states in self.goal_states]
+        return self._labels
+
+    def block_labels(self, block, service):
+        """
+        Returns the labels of every state of a block for one emergency service, searching
+        the block if needed (see `search_block`).
+        """
+        key = (block, service)
+        if key not in self._block_labels:
+            self._block_labels[key] = search_block(self, block, service)
+        return self._block_labels[key]
+
+    def state_label(self, service, state):
+        """
+        Parameters:
+            service (int): The index of the emergency service.
+            state (int): Any state id.
+
+        Returns:
+            int: The label of the state in the full search, -1 if it cannot reach the service.
+        """
+        return self.block_labels(self.block_of[state >> 2], service).get(state, -1)
+
+    def best_successor(self, service, state):
+        """
+        `get_best_successor` over the refined labels.
+
+        Parameters:
+            service (int): The index of the emergency service.
+            state (int): The current state id, possibly a start node.
+
+        Returns:
+            tuple: The best (label, successor) pair, or None if no successor is labelled.
+        """
+        graph = self.graph
+        base, out_indices, out_costs = graph.label_base, graph.out_indices, graph.out_costs
+        best = None
+        offset = graph.out_indptr[state]
+        for edge in range(offset, offset + graph.out_degree[state]):
+            neighbor = out_indices[edge]
+            label = self.state_label(service, neighbor)
+            if label < 0:
+                continue
+            candidate = (label + out_costs[edge] * base + 1, neighbor)
+            if best is None or candidate < best:
+                best = candidate
+        return best
+
+    def service_routes(self, state):
+        """
+        The best first step of a start node towards every emergency service, over the
+        abstract labels. The label of each first step for every service follows from one
+        `block_targets` search, the targets carrying their abstract labels, so the block of
+        the building is not refined for every service.
+
+        Parameters:
+            state (int): The state id of the start node.
+
+        Returns:
+            list: Per emergency service, the best (label, successor) pair, or None if the
+                  service cannot be reached.
+        """
+        graph = self.graph
+        base = graph.label_base
+        labels = self.labels()
+        first_steps = []
+        offset = graph.out_indptr[state]
+        for edge in range(offset, offset + graph.out_degree[state]):
+            first_steps.append((graph.out_indices[edge], graph.out_costs[edge] * base + 1, self.block_targets(graph.out_indices[edge])))
+
+        routes = []
+        for service_labels, goal_states in zip(labels, self.goal_states):
+            best = None
+            for first_step, packed, targets in first_steps:
+                if first_step in goal_states:
+                    label = 1
+                else:
+                    label = min((distance + service_labels[target] for target, distance in targets.items()
+                                 if target in service_labels), default=-1)
+                if label < 0:
+                    continue
+                candidate = (label + packed, first_step)
+                if best is None or candidate < best:
+                    best = candidate
+            routes.append(best)
+        return routes
+
+    def choose_nearest_service(self, state):
+        """
+        `choose_nearest_service` over the abstract labels (see `service_routes`).
+
+        Parameters:
+            state (int): The state id of the start node.
+
+        Returns:
+            tuple: The (label, successor) pair of the chosen route and the index of its
+                   emergency service, or None if no emergency service can be reached.
+        """
+        base = self.graph.label_base
+        nearest = None
+        for service, best in enumerate(self.service_routes(state)):
+            if best and (nearest is None or best[0] % base < nearest[0][0] % base):
+                nearest = (best, service)
+        return nearest
+
+    def route_length_bounds(self, cell):
+        """
+        `indexed_search.route_length_bounds` over the abstract labels (see `service_routes`).
+
+        Parameters:
+            cell (int): The cell index of the building.
+
+        Returns:
+            list: The bound of each emergency service, None for the services the building
+                  cannot reach, or None on grids of fewer than 8 rows.
+        """
+        graph = self.graph
+        if graph.height < 8:
+            return None
+        return [best[0] % graph.label_base if best else None for best in self.service_routes(graph.state_count + cell)]
+
+    def extract_path(self, service, state):
+        """
+        `extract_path` over the refined labels: follows the best successors from a state
+        down to one emergency service, refining the blocks the route enters.
+
+        Returns:
+            list[int]: The path as a list of state ids.
+        """
+        path = [state]
+        while self.state_label(service, state) != 1:
+            _, state = self.best_successor(service, state)
+            path.append(state)
+        return path
+
+
+def search_abstract_graph(hierarchy, goal_states):
+    """
+    Dijkstra search backwards from the goal states of one emergency service over the
+    abstract edges.
+
+    Parameters:
+        hierarchy (HierarchicalGraph): The abstract graph.
+        goal_states (list[int]): The goal state ids of the service.
+
+    Returns:
+        dict: The label of each abstract node that can reach the service.
+    """
+    in_edges = hierarchy.in_edges
+    labels = {}
+    open_list = [(1, state) for state in goal_states]
+    heapq.heapify(open_list)
+    while open_list:
+        label, state = heapq.heappop(open_list)
+        if state in labels:
+            continue
+        labels[state] = label
+        for edges in in_edges.get(state, {}).values():
+            for entry, packed in edges:
+                if entry not in labels:
+                    heapq.heappush(open_list, (label + packed, entry))
+    return labels
+
+
+def search_block(hierarchy, block, service):
+    """
+    Refines the labels of one emergency service inside a block: a Dijkstra search
+    backwards over the states of the block, started from the goal states of the service
+    in the block and from the moves leaving the block, whose targets carry their abstract
+    labels. Every route out of a state of the block either reaches a goal state inside the
+    block or leaves it through one of these moves, so the labels are those of the full search.
+
+    Parameters:
+        hierarchy (HierarchicalGraph): The abstract graph.
+        block (int): The block index.
+        service (int): The index of the emergency service.
+
+    Returns:
+        dict: The label of each state of the block that can reach the service, and of the
+              abstract nodes just outside it the block's routes leave through.
+    """
+    graph = hierarchy.graph
+    base, block_of = graph.label_base, hierarchy.block_of
+    out_indptr, out_degree, out_indices, out_costs = graph.out_indptr, graph.out_degree, graph.out_indices, graph.out_costs
+    in_indptr, in_degree, in_indices, in_costs = graph.in_indptr, graph.in_degree, graph.in_indices, graph.in_costs
+    abstract_labels = hierarchy.labels()[service]
+    goal_states = set(hierarchy.goal_states[service])
+
+    labels = {}
+    open_list = []
+    for cell in hierarchy.block_cells[block]:
+        for state in range(cell * 4, cell * 4 + 4):
+            if state in goal_states:
+                open_list.append((1, state))
+                continue
+            offset = out_indptr[state]
+            for edge in range(offset, offset + out_degree[state]):
+                successor = out_indices[edge]
+                if block_of[successor >> 2] != block and successor in abstract_labels:
+                    labels[successor] = abstract_labels[successor]
+                    open_list.append((abstract_labels[successor] + out_costs[edge] * base + 1, state))
+    heapq.heapify(open_list)
+
+    settled = set()
+    while open_list:
+        label, state = heapq.heappop(open_list)
+        if state in settled:
+            continue
+        settled.add(state)
+        labels[state] = label
+        offset = in_indptr[state]
+        for edge in range(offset, offset + in_degree[state]):
+            predecessor = in_indices[edge]
+            if block_of[predecessor >> 2] == block and predecessor not in settled:
+                heapq.heappush(open_list, (label + in_costs[edge] * base + 1, predecessor))
+    return labels
+
+
+def find_nearest_service_paths(hierarchy):
+    """
+    `indexed_search.find_nearest_service_paths` over a `HierarchicalGraph`.
+
+    Parameters:
+        hierarchy (HierarchicalGraph): The abstract graph.
+
+    Returns:
+        dict: A dictionary mapping each building position (x, y) to a (path, cost) tuple,
+              in row-major order. Buildings that cannot reach any emergency service map
+              to (None, None). Unless the graph is exact, the buildings with several
+              cheapest routes keep their refined route (see `HierarchicalGraph`).
+    """
+    graph = hierarchy.graph
+    results = {}
+    for cell in graph.buildings():
+        start = graph.state_count + cell
+        nearest = hierarchy.choose_nearest_service(start)
+        if nearest is None:
+            results[divmod(cell, graph.height)] = (None, None)
+            continue
+        (label, state), service = nearest
+        path = [start] + hierarchy.extract_path(service, state)
+        if not hierarchy.exact or is_only_cheapest_route(graph, lambda state: hierarchy.state_label(service, state), path):
+            cost = label // graph.label_base
+        else:
+            path = find_a_star_path(graph, cell, hierarchy.route_length_bounds(cell))
+            cost = path_cost(graph, path)
+        results[divmod(cell, graph.height)] = ([graph.decode(step) for step in path], cost)
+    return results
+
+
+def find_all_path_costs(hierarchy):
+    """
+    `indexed_search.find_all_path_costs` over a `HierarchicalGraph`. The routes are refined
+    to count the states `calculate_fitness` counts as intersections (see
+    `TransitionGraph.counted_cells`). As in `find_nearest_service_paths`, buildings whose
+    route is not the only cheapest one are searched with A*, unless the graph is not exact.
+
+    Parameters:
+        hierarchy (HierarchicalGraph): The abstract graph.
+
+    Returns:
+        dict: A dictionary mapping each building position (x, y) to a (cost, path_length,
+              intersection_count) tuple, in row-major order. Buildings that cannot reach
+              any emergency service are left out.
+    """
+    graph = hierarchy.graph
+    height, base = graph.height, graph.label_base
+    counted_cells = graph.counted_cells()
+
+    path_costs = {}
+    for cell in graph.buildings():
+        start = graph.state_count + cell
+        nearest = hierarchy.choose_nearest_service(start)
+        if nearest is None:
+            print(f"No path found to any emergency service for building at {divmod(cell, height)}.")
+            continue
+        (label, successor), service = nearest
+        route = hierarchy.extract_path(service, successor)
+        if hierarchy.exact and not is_only_cheapest_route(graph, lambda state: hierarchy.state_label(service, state),
+                                                          [start] + route):
+            path_costs[divmod(cell, height)] = find_a_star_path_costs(graph, counted_cells, cell,
+                                                                      hierarchy.route_length_bounds(cell))
+            continue
+        intersection_count = counted_cells[cell] + sum(counted_cells[state >> 2] for state in route)
+        path_costs[divmod(cell, height)] = (label // base, label % base, intersection_count)
+    return path_costs
@@ -0,0 +1,277 @@
+import heapq
+from algorithms.transition_graph import TransitionGraph
+from algorithms.indexed_search import (search_from_emergency_services, choose_nearest_service,
+                                       get_best_successor, extract_path, find_nearest_service_path,
+                                       is_only_cheapest_route)
+from algorithms.cost_function import calculate_fitness
+
+MAX_CHANGED_CELLS = 6  # Beyond this many changed cells a repair costs about as much as a fresh search
+
+
+class SearchState:
+    """
+    Everything needed to re-evaluate a grid after a few of its cells change.
+
+    Attributes:
+        grid (CityGrid): The grid the state was computed for.
+        graph (TransitionGraph): The compiled state graph of the grid.
+        labels (list[array]): Complete per-service labels from `search_from_emergency_services`.
+        paths (dict): Maps each building (x, y) to its (path, service index, nodes), where
+                      path lists state ids and nodes the same path as ((x, y), direction)
+                      nodes, or to (None, None, None) when it cannot reach any emergency service.
+                      The service index is None for paths searched with A*.
+        shortest_paths (list[list[tuple]]): The paths in the order of `find_all_shortest_paths`.
+        fitness_scores (dict): The `calculate_fitness` scores of the paths.
+        repaired_buildings (int): How many building paths were recomputed to build this state.
+    """
+
+    def __init__(self, grid, graph, labels, paths, repaired_buildings, fitness_scores=None):
+        self.grid = grid
+        self.graph = graph
+        self.labels = labels
+        self.paths = paths
+        self.shortest_paths = [nodes for _, _, nodes in paths.values() if nodes]
+        if fitness_scores is None:
+            fitness_scores = calculate_fitness(grid, self.shortest_paths)
+        self.fitness_scores = fitness_scores
+        self.repaired_buildings = repaired_buildings
+
+
+def evaluate_from_scratch(grid, graph=None):
+    """
+    Runs a complete backward search on a grid and keeps its state for later repairs.
+
+    Parameters:
+        grid (CityGrid): The grid to evaluate.
+        graph (TransitionGraph): The compiled state graph of the grid, built when omitted.
+
+    Returns:
+        SearchState: The search state of the grid.
+    """
+    if graph is None:
+        graph = TransitionGraph(grid)
+    labels, _ = search_from_emergency_services(graph, complete=True)
+    paths = {}
+    for cell in graph.buildings():
+        path, _, service = find_nearest_service_path(graph, labels, cell)
+        nodes = [graph.decode(state) for state in path] if path else None
+        paths[divmod(cell, graph.height)] = (path, service, nodes)
+    return SearchState(grid, graph, labels, paths, len(paths))
+
+
+def repair_labels(graph, labels, goal_states, changed_cells):
+    """
+    Repairs the labels of one emergency service after some cells changed value, so that
+    they equal the labels a complete search on the new grid would produce.
+
+    States whose label was derived through a changed cell are invalidated first, then a
+    Dijkstra search restarted from them relabels them and propagates any cheaper routes
+    the change opened up.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the new grid.
+        labels (array): The labels of the service on the old grid. Updated in place.
+        goal_states (set): The goal state ids of the service on the new grid.
+        changed_cells (list[int]): The cell indexes of the changed cells.
+
+    Returns:
+        set: The state ids whose label changed.
+    """
+    base = graph.label_base
+    in_indptr, in_degree, in_indices, in_costs = graph.in_indptr, graph.in_degree, graph.in_indices, graph.in_costs
+
+    # Invalidate every state whose route went through a changed cell
+    suspects = {cell * 4 + direction for cell in changed_cells for direction in range(4)}
+    stack = [state for state in suspects if labels[state] >= 0]
+    while stack:
+        state = stack.pop()
+        label = labels[state]
+        offset = in_indptr[state]
+        for edge in range(offset, offset + in_degree[state]):
+            predecessor = in_indices[edge]
+            if predecessor in suspects or labels[predecessor] < 0:
+                continue
+            if labels[predecessor] == label + in_costs[edge] * base + 1:
+                suspects.add(predecessor)
+                stack.append(predecessor)
+
+    old_labels = {}
+    for state in suspects:
+        old_labels[state] = labels[state]
+        labels[state] = -1
+
+    # Relabel the invalidated states from their surviving successors
+    open_list = []
+    for state in suspects:
+        if state in goal_states:
+            label = 1
+        else:
+            best = get_best_successor(graph, labels, state)
+            label = best[0] if best else -1
+        if label >= 0:
+            labels[state] = label
+            heapq.heappush(open_list, (label, state))
+
+    # Propagate the new labels, including cheaper routes through the changed cells
+    while open_list:
+        label, state = heapq.heappop(open_list)
+        if labels[state] != label:
+            continue
+        offset = in_indptr[state]
+        for edge in range(offset, offset + in_degree[state]):
+            predecessor = in_indices[edge]
+            candidate = label + in_costs[edge] * base + 1
+            if labels[predecessor] < 0 or candidate < labels[predecessor]:
+                if predecessor not in old_labels:
+                    old_labels[predecessor] = labels[predecessor]
+                labels[predecessor] = candidate
+                heapq.heappush(open_list, (candidate, predecessor))
+
+    return {state for state, old_label in old_labels.items() if labels[state] != old_label}
+
+
+def reevaluate(grid, search_state, changed_cells=None, max_changed_cells=MAX_CHANGED_CELLS, graph=None,
+               cutoff=None, order=None):
+    """
+    Re-evaluates a grid that differs from a previously evaluated grid in a few cells.
+
+    The state graph of the previous grid is copied and patched around the changed cells,
+    its labels are repaired and only the buildings whose path could be affected are
+    recomputed: those whose first step changed label for any service, or whose path passes
+    through or next to a state whose label changed. The result is the same as a full
+    `find_all_shortest_paths` + `calculate_fitness` evaluation of the new grid. When more
+    than `max_changed_cells` cells changed, a repair costs about as much as a fresh search
+    and the grid is searched from scratch on the patched graph instead.
+
+    With `cutoff`, the buildings are scored one at a time once the labels are repaired, in
+    `order` first, and the evaluation gives up as soon as the sum of their scores provably
+    reaches the cutoff. A building scores at least the number of nodes of its route, which
+    the repaired labels give without building its path, so the scores so far plus the
+    route lengths of the remaining buildings are compared with the cutoff after each
+    building. The cutoff is not applied to a grid searched from scratch.
+
+    Parameters:
+        grid (CityGrid): The new grid.
+        search_state (SearchState): The search state of the previous grid.
+        changed_cells (list[tuple]): The (y, x) positions of the cells that changed. Computed
+                                     by comparing both grids when omitted.
+        max_changed_cells (int): The largest number of changed cells worth repairing.
+        graph (TransitionGraph): The state graph of the previous grid already patched for
+                                 the new one, patched from a copy when omitted.
+        cutoff (float): The fitness sum at which to give up, never when None.
+        order (list[tuple]): The (x, y) positions of the buildings in the order they should
+                             be scored with a cutoff. Buildings left out come last.
+
+    Returns:
+        SearchState: The search state of the new grid, with its paths and fitness scores,
+                     or None if the evaluation was cut off.
+    """
+    if changed_cells is None:
+        changed_cells = search_state.grid.changed_cells(grid)
+    if not changed_cells:
+        return SearchState(grid, search_state.graph, search_state.labels, search_state.paths, 0)
+
+    if graph is None:
+        graph = search_state.graph.copy()
+        graph.update_cells(grid, changed_cells)
+    if len(changed_cells) > max_changed_cells:
+        return evaluate_from_scratch(grid, graph)
+
+    height, neighbors = graph.height, graph.neighbors
+    changed_indexes = [x * height + y for y, x in changed_cells]
+    labels = []
+    dirty_cells = []
+    for service_labels, service_goal_states in zip(search_state.labels, graph.goal_states()):
+        service_labels = service_labels[:]
+        changed_states = repair_labels(graph, service_labels, set(service_goal_states), changed_indexes)
+        labels.append(service_labels)
+
+        # A path can only change where one of its successors changed label
+        service_dirty_cells = set(changed_indexes)
+        for state in changed_states:
+            cell = state >> 2
+            service_dirty_cells.add(cell)
+            service_dirty_cells.update(neighbors[cell * 4:cell * 4 + 4])
+        dirty_cells.append(service_dirty_cells)
+
+    buildings = list(search_state.paths)
+    lower_bounds = {}
+    remaining_bound = 0
+    if cutoff is not None:
+        if order is not None:
+            listed = set(order)
+            buildings = [building for building in order if building in search_state.paths] + \
+                        [building for building in buildings if building not in listed]
+        for building in buildings:
+            nearest = choose_nearest_service(graph, labels, graph.state_count + building[0] * height + building[1])
+            lower_bounds[building] = nearest[0][0] % graph.label_base if nearest else 0
+            remaining_bound += lower_bounds[building]
+
+    paths = {}
+    fitness_scores = {}
+    total = 0
+    repaired_buildings = 0
+    for building in buildings:
+        path, service, nodes = search_state.paths[building]
+        new_path = repair_path(graph, labels, dirty_cells, path, service) if path is not None else None
+        # A repaired route may have gained an equally cheap rival, where `a_star` could go another way
+        if new_path is not None and not is_only_cheapest_route(graph, labels[service].__getitem__, new_path):
+            new_path = None
+        if new_path is None:
+            new_path, _, service = find_nearest_service_path(graph, labels, building[0] * height + building[1])
+        if new_path is not path:
+            repaired_buildings += 1
+            nodes = [graph.decode(state) for state in new_path] if new_path else None
+        paths[building] = (new_path, service, nodes)
+
+        if cutoff is not None:
+            if nodes:
+                fitness_scores.update(calculate_fitness(grid, [nodes]))
+                total += fitness_scores[building]
+            remaining_bound -= lower_bounds[building]
+            if total + remaining_bound >= cutoff:
+                return None
+
+    if cutoff is None:
+        return SearchState(grid, graph, labels, paths, repaired_buildings)
+    paths = {building: paths[building] for building in search_state.paths}
+    fitness_scores = {building: fitness_scores[building] for building in paths if building in fitness_scores}
+    return SearchState(grid, graph, labels, paths, repaired_buildings, fitness_scores)
+
+
+def repair_path(graph, labels, dirty_cells, path, service):
+    """
+    Checks whether a building keeps its previous path on the repaired labels and rebuilds
+    the part of it that changed otherwise. Only states lying on or next to a state whose
+    label changed need to be checked.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the new grid.
+        labels (list[array]): The repaired labels of every emergency service.
+        dirty_cells (list[set]): Per service, the cell indexes next to a changed label.
+        path (list[int]): The previous path of the building as state ids.
+        service (int): The index of the emergency service the previous path leads to, None
+                       when it was searched with A* (see `find_nearest_service_path`).
+
+    Returns:
+        list[int]: The same path object if nothing changed, a rebuilt path otherwise,
+                   or None if the building must head to another emergency service.
+    """
+    nearest = choose_nearest_service(graph, labels, path[0])
+    if nearest is None or nearest[1] != service or nearest[0][1] != path[1]:
+        return None
+
+    service_labels = labels[service]
+    service_dirty_cells = dirty_cells[service]
+    for index in range(1, len(path)):
+        state = path[index]
+        if state >> 2 not in service_dirty_cells:
+            continue
+        if service_labels[state] == 1:
+            if index == len(path) - 1:
+                return path
+            return path[:index + 1]
+        best = get_best_successor(graph, service_labels, state)
+        if index == len(path) - 1 or best[1] != path[index + 1]:
+            return path[:index + 1] + extract_path(graph, service_labels, best[1])
+    return path
@@ -0,0 +1,588 @@
+import heapq
+from array import array
+from algorithms.transition_graph import TransitionGraph
+
+
+def a_star_indexed(grid, start, goal, graph=None):
+    """
+    Integer-state version of `a_star` that returns exactly the same paths.
+
+    States are plain ints, costs and parents live in arrays preallocated for every state
+    of the grid and the moves out of each state are read from the rows of the compiled
+    `TransitionGraph`.
+
+    Parameters:
+        grid (list[list[int]]): The 2D grid representing the environment.
+        start (tuple): The starting node as ((x, y), direction).
+        goal (tuple): The goal node as ((x, y), direction).
+        graph (TransitionGraph): The compiled state graph of the grid, built when omitted.
+
+    Returns:
+        list[tuple]: A list of nodes representing the shortest path from start to goal.
+                     Returns None if no path is found.
+    """
+    if graph is None:
+        graph = TransitionGraph(grid)
+    height = graph.height
+    values = graph.values
+    out_indptr, out_degree = graph.out_indptr, graph.out_degree
+    out_indices, out_costs = graph.out_indices, graph.out_costs
+
+    source_count = len(out_degree)
+    start_state = graph.encode(start)
+    (goal_x, goal_y), _ = goal
+
+    g_costs = array("i", [-1]) * source_count
+    came_from = array("i", [-1]) * source_count
+    closed = bytearray(source_count)
+
+    g_costs[start_state] = 0
+    start_x, start_y = start[0]
+    open_list = [(abs(start_x - goal_x) + abs(start_y - goal_y), start_state)]
+
+    while open_list:
+        _, state = heapq.heappop(open_list)
+        if closed[state]:
+            continue
+
+        if state >= graph.state_count:
+            cell, direction = state - graph.state_count, None
+        else:
+            cell, direction = state >> 2, state & 3
+        x, y = divmod(cell, height)
+        if x == goal_x and ((y + 1 == goal_y and direction == 2) or  # Entered moving right
+                            (y - 1 == goal_y and direction == 1) or  # Entered moving left
+                            (values[cell] == 3 and (y == goal_y - 1 or y == goal_y + 1))):
+            return reconstruct_indexed_path(graph, came_from, state)
+
+        closed[state] = 1
+        g_cost = g_costs[state]
+        offset = out_indptr[state]
+        for edge in range(offset, offset + out_degree[state]):
+            neighbor = out_indices[edge]
+            if closed[neighbor]:
+                continue
+            tentative_g_cost = g_cost + out_costs[edge]
+            neighbor_g_cost = g_costs[neighbor]
+            if neighbor_g_cost < 0 or tentative_g_cost < neighbor_g_cost:
+                came_from[neighbor] = state
+                g_costs[neighbor] = tentative_g_cost
+                neighbor_x, neighbor_y = divmod(neighbor >> 2, height)
+                h_cost = abs(neighbor_x - goal_x) + abs(neighbor_y - goal_y)
+                heapq.heappush(open_list, (tentative_g_cost + h_cost, neighbor))
+
+    return None
+
+
+def reconstruct_indexed_path(graph, came_from, state):
+    """
+    Rebuilds the ((x, y), direction) path ending in a state from the parent array.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        came_from (array): The parent of each state id, -1 for none.
+        state (int): The state id the path ends in.
+
+    Returns:
+        list[tuple]: The path as a list of nodes from start to goal.
+    """
+    path = []
+    while state != -1:
+        path.append(graph.decode(state))
+        state = came_from[state]
+    path.reverse()
+    return path
+
+
+def a_star_multiple_goals_indexed(grid, start, graph=None):
+    """
+    Integer-state version of `a_star_multiple_goals`: runs `a_star_indexed` to every
+    emergency service and keeps the path with the fewest nodes.
+
+    Parameters:
+        grid (list[list[int]]): The 2D grid representing the environment.
+        start (tuple): The starting node as ((x, y), direction).
+        graph (TransitionGraph): The compiled state graph of the grid, built when omitted.
+
+    Returns:
+        list[tuple]: The shortest path to the nearest goal. Returns None if no path is found.
+    """
+    if graph is None:
+        graph = TransitionGraph(grid)
+
+    shortest_path = None
+    shortest_length = float('inf')
+    for service_cell in graph.emergency_services():
+        path = a_star_indexed(grid, start, (divmod(service_cell, graph.height), None), graph)
+        if path and len(path) < shortest_length:
+            shortest_path = path
+            shortest_length = len(path)
+    return shortest_path
+
+
+def search_from_emergency_services(graph, complete=False):
+    """
+    Runs a single Dijkstra search backwards from all emergency services at once over the
+    reversed rows of the compiled state graph.
+
+    The wave started at each emergency service is kept apart, so every state ends up with
+    one label per service: the cost and number of nodes of its cheapest route to that
+    service, packed as cost * graph.label_base + length. Labels compare like (cost, length)
+    tuples, so among equally cheap routes the one with fewer nodes wins. Unless `complete`
+    is set, a wave stops as soon as the first step out of every building has been labelled.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        complete (bool): Whether to label every state that can reach each service, which
+                         is needed when the labels are repaired later on.
+
+    Returns:
+        tuple:
+            - list[array]: Per emergency service, the label of each state id, -1 for
+                           states its wave did not settle.
+            - list[array]: Per emergency service, the successor each settled state takes
+                           on its route, -1 for goal states and unsettled states.
+    """
+    state_count, base = graph.state_count, graph.label_base
+    out_indptr, out_degree, out_indices = graph.out_indptr, graph.out_degree, graph.out_indices
+    in_indptr, in_degree = graph.in_indptr, graph.in_degree
+    in_indices, in_costs = graph.in_indices, graph.in_costs
+
+    first_steps = bytearray(state_count)
+    first_step_count = 0
+    for cell in graph.buildings():
+        offset = out_indptr[state_count + cell]
+        for edge in range(offset, offset + out_degree[state_count + cell]):
+            if not first_steps[out_indices[edge]]:
+                first_steps[out_indices[edge]] = 1
+                first_step_count += 1
+
+    goal_states = graph.goal_states()
+    labels = [array("q", [-1]) * state_count for _ in goal_states]
+    successors = [array("i", [-1]) * state_count for _ in goal_states]
+    pending = [first_step_count if not complete else state_count + 1] * len(goal_states)
+    # Entries carry the successor they were relaxed from: among equal labels the smallest
+    # successor pops first, which is the one `get_best_successor` would pick
+    open_list = [(1, service, state, -1) for service, states in enumerate(goal_states) for state in states]
+    heapq.heapify(open_list)
+    active_waves = len(goal_states) if first_step_count or complete else 0
+
+    while open_list and active_waves:
+        label, service, state, successor = heapq.heappop(open_list)
+        service_labels = labels[service]
+        if not pending[service] or service_labels[state] >= 0:
+            continue
+        service_labels[state] = label
+        successors[service][state] = successor
+
+        if first_steps[state]:
+            pending[service] -= 1
+            if not pending[service]:
+                active_waves -= 1
+
+        offset = in_indptr[state]
+        for edge in range(offset, offset + in_degree[state]):
+            predecessor = in_indices[edge]
+            if service_labels[predecessor] < 0:
+                heapq.heappush(open_list, (label + in_costs[edge] * base + 1, service, predecessor, state))
+
+    return labels, successors
+
+
+def get_best_successor(graph, service_labels, state):
+    """
+    Picks the successor of a state that lies on its cheapest route to one emergency service.
+    Ties on the label are broken by the smallest successor id, which makes the chosen route
+    a pure function of the labels.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        service_labels (array): The labels of one emergency service.
+        state (int): The current state id, possibly a start node.
+
+    Returns:
+        tuple: The best (label, successor) pair, or None if no successor is labelled.
+    """
+    base = graph.label_base
+    out_indices, out_costs = graph.out_indices, graph.out_costs
+    best = None
+    offset = graph.out_indptr[state]
+    for edge in range(offset, offset + graph.out_degree[state]):
+        neighbor = out_indices[edge]
+        label = service_labels[neighbor]
+        if label < 0:
+            continue
+        candidate = (label + out_costs[edge] * base + 1, neighbor)
+        if best is None or candidate < best:
+            best = candidate
+    return best
+
+
+def extract_path(graph, service_labels, state):
+    """
+    Follows the best successors from a state down to one emergency service.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        service_labels (array): The labels of one emergency service.
+        state (int): The state id to start from.
+
+    Returns:
+        list[int]: The path as a list of state ids.
+    """
+    path = [state]
+    while service_labels[state] != 1:
+        _, state = get_best_successor(graph, service_labels, state)
+        path.append(state)
+    return path
+
+
+def choose_nearest_service(graph, labels, state):
+    """
+    Picks the emergency service a start node should head to and the first step towards it.
+
+    As in `a_star_multiple_goals`, the cheapest route to each service is considered and
+    the service whose route has the fewest nodes is kept, the first service in scan order
+    winning ties. When a service can be reached by several equally cheap routes, the one
+    with the fewest nodes is considered, which need not be the one `a_star` returns: check
+    the chosen route with `is_only_cheapest_route` before relying on it.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        labels (list[array]): The labels computed by `search_from_emergency_services`.
+        state (int): The state id of the start node.
+
+    Returns:
+        tuple: The (label, successor) pair of the chosen route and the index of its
+               emergency service, or None if no emergency service can be reached.
+    """
+    base = graph.label_base
+    nearest = None
+    for service, service_labels in enumerate(labels):
+        best = get_best_successor(graph, service_labels, state)
+        if best and (nearest is None or best[0] % base < nearest[0][0] % base):
+            nearest = (best, service)
+    return nearest
+
+
+def count_cheapest_successors(graph, state_label, state):
+    """
+    Counts the successors of a state through which it has a cheapest route to one
+    emergency service, whatever the number of nodes of these routes.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        state_label (callable): Gives the label of a state id for the service, -1 when it
+                                has none, e.g. the `__getitem__` of the service's labels.
+        state (int): The state id, possibly a start node.
+
+    Returns:
+        int: The number of successors on a cheapest route.
+    """
+    base = graph.label_base
+    out_indices, out_costs = graph.out_indices, graph.out_costs
+    cheapest, count = -1, 0
+    offset = graph.out_indptr[state]
+    for edge in range(offset, offset + graph.out_degree[state]):
+        label = state_label(out_indices[edge])
+        if label < 0:
+            continue
+        cost = label // base + out_costs[edge]
+        if cheapest < 0 or cost < cheapest:
+            cheapest, count = cost, 1
+        elif cost == cheapest:
+            count += 1
+    return count
+
+
+def is_only_cheapest_route(graph, state_label, route):
+    """
+    Checks whether a route is the only cheapest route from its first state to its emergency
+    service, in which case it is the route `a_star` returns.
+
+    The Manhattan heuristic of `a_star` never drops by more than a step costs, so `a_star`
+    returns a cheapest route, but among several it keeps whichever its heap reaches first.
+    These ties are common: an intersection in the margins costs len(grid) // 8 to leave,
+    as much as a detour through as many plain cells, and the backward search prefers the
+    route with the fewest nodes. A route with a single cheapest successor at every state
+    leaves `a_star` no choice. It also leaves it no choice of service: every other service
+    gets a route with at least as many nodes as its fewest, so the service whose fewest is
+    the smallest, the first in scan order on ties, is kept. On grids of fewer than 8 rows,
+    intersections in the margins cost 0, the heuristic overestimates and `a_star` may miss
+    the cheapest route, so no route is vouched for.
+
+    Since every step costs at least 1, the successors on a cheapest route have smaller
+    labels than the state itself: labels settled by a search stopped early are enough.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        state_label (callable): Gives the label of a state id for the service of the route
+                                (see `count_cheapest_successors`).
+        route (list[int]): The route as state ids, down to its goal state.
+
+    Returns:
+        bool: Whether `a_star` is bound to return the route.
+    """
+    if graph.height < 8:
+        return False
+    return all(count_cheapest_successors(graph, state_label, state) == 1 for state in route[:-1])
+
+
+def route_length_bounds(graph, state_labels, cell):
+    """
+    Bounds the number of nodes of the path `a_star_indexed` returns from a building to each
+    emergency service by those of the service's cheapest route with the fewest nodes, read
+    from the labels of the building's first steps: `a_star` returns a cheapest route, so it
+    has at least as many nodes. On grids of fewer than 8 rows `a_star` may miss the cheapest
+    route (see `is_only_cheapest_route`), so no bounds are given.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        state_labels (list[callable]): For each emergency service, in row-major order, gives
+                                       the label of a state id (see `count_cheapest_successors`).
+        cell (int): The cell index of the building.
+
+    Returns:
+        list: The bound of each emergency service, None for the services the building cannot
+              reach, or None on grids of fewer than 8 rows.
+    """
+    if graph.height < 8:
+        return None
+    base = graph.label_base
+    out_indices, out_costs = graph.out_indices, graph.out_costs
+    start = graph.state_count + cell
+    offset = graph.out_indptr[start]
+    bounds = []
+    for state_label in state_labels:
+        best = -1
+        for edge in range(offset, offset + graph.out_degree[start]):
+            label = state_label(out_indices[edge])
+            if label >= 0 and (best < 0 or label + out_costs[edge] * base + 1 < best):
+                best = label + out_costs[edge] * base + 1
+        bounds.append(best % base if best >= 0 else None)
+    return bounds
+
+
+def find_a_star_path(graph, cell, length_bounds=None):
+    """
+    Runs `a_star_multiple_goals_indexed` from a building whose route the backward search
+    cannot vouch for (see `is_only_cheapest_route`).
+
+    `a_star_multiple_goals` keeps the path with the fewest nodes, the first service in scan
+    order winning ties. Given a lower bound on the number of nodes of the path to each
+    service, the services are searched from the lowest bound up, and those whose bound
+    shows they cannot win are not searched at all: usually only the services tied with the
+    chosen one are.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        cell (int): The cell index of the building.
+        length_bounds (list): For each emergency service, in row-major order, a lower bound
+                              on the number of nodes of the path `a_star_indexed` returns to
+                              it, None for a service the building cannot reach (see
+                              `route_length_bounds`). Every service is searched when omitted.
+
+    Returns:
+        list[int]: The path of `a_star_multiple_goals` as a list of state ids, or None if
+                   no emergency service can be reached.
+    """
+    start = (divmod(cell, graph.height), None)
+    if length_bounds is None:
+        path = a_star_multiple_goals_indexed(None, start, graph)
+    else:
+        service_cells = graph.emergency_services()
+        path = path_service = None
+        for service in sorted((service for service, bound in enumerate(length_bounds) if bound is not None),
+                              key=lambda service: (length_bounds[service], service)):
+            if path is not None and length_bounds[service] > len(path):
+                break
+            if path is not None and length_bounds[service] == len(path) and service > path_service:
+                continue  # At best a tie, which the earlier service wins
+            candidate = a_star_indexed(None, start, (divmod(service_cells[service], graph.height), None), graph)
+            if candidate and (path is None or len(candidate) < len(path) or
+                              (len(candidate) == len(path) and service < path_service)):
+                path, path_service = candidate, service
+    return [graph.encode(node) for node in path] if path else None
+
+
+def path_cost(graph, path):
+    """
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        path (list[int]): A path as state ids, from the start node of a building.
+
+    Returns:
+        int: The cost of the path: the step cost of every cell it leaves.
+    """
+    step_costs = graph.step_costs
+    return step_costs[path[0] - graph.state_count] + sum(step_costs[state >> 2] for state in path[1:-1])
+
+
+def describe_path(graph, counted_cells, path):
+    """
+    Describes a path from a building the way `find_all_path_costs` describes routes.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        counted_cells (bytearray): The cells counted as intersections (see
+                                   `TransitionGraph.counted_cells`).
+        path (list[int]): The path as state ids, from the start node of the building.
+
+    Returns:
+        tuple: The (cost, path_length, intersection_count) of the path.
+    """
+    intersection_count = counted_cells[path[0] - graph.state_count] + sum(counted_cells[state >> 2]
+                                                                          for state in path[1:])
+    return path_cost(graph, path), len(path), intersection_count
+
+
+def find_a_star_path_costs(graph, counted_cells, cell, length_bounds=None):
+    """
+    Describes the path of `find_a_star_path` from a building (see `describe_path`).
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        counted_cells (bytearray): The cells counted as intersections (see
+                                   `TransitionGraph.counted_cells`).
+        cell (int): The cell index of the building.
+        length_bounds (list): The path length lower bounds of the building for each
+                              emergency service, if any (see `find_a_star_path`).
+
+    Returns:
+        tuple: The (cost, path_length, intersection_count) of the path, or None if no
+               emergency service can be reached.
+    """
+    path = find_a_star_path(graph, cell, length_bounds)
+    return describe_path(graph, counted_cells, path) if path is not None else None
+
+
+def find_nearest_service_path(graph, labels, cell):
+    """
+    Extracts the path `a_star_multiple_goals` returns from a building: the route to the
+    emergency service chosen by `choose_nearest_service`, or the path of `find_a_star_path`
+    when that route is not the only cheapest one.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+        labels (list[array]): The labels computed by `search_from_emergency_services`.
+        cell (int): The cell index of the building.
+
+    Returns:
+        tuple: The path as a list of state ids, its cost and the index of the emergency
+               service it leads to, None for a path of `find_a_star_path`, or
+               (None, None, None) if no emergency service can be reached.
+    """
+    start = graph.state_count + cell
+    nearest = choose_nearest_service(graph, labels, start)
+    if nearest is None:
+        return None, None, None
+    (label, successor), service = nearest
+    path = [start] + extract_path(graph, labels[service], successor)
+    if is_only_cheapest_route(graph, labels[service].__getitem__, path):
+        return path, label // graph.label_base, service
+    path = find_a_star_path(graph, cell, route_length_bounds(
+        graph, [service_labels.__getitem__ for service_labels in labels], cell))
+    return path, path_cost(graph, path), None
+
+
+def find_nearest_service_paths(graph):
+    """
+    Finds the path and cost from every building to its nearest emergency service using
+    one backward search from all emergency services instead of one A* per pair. Only the
+    buildings whose route is not the only cheapest one are searched with A* (see
+    `is_only_cheapest_route`), so the paths are those of `a_star_multiple_goals`.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+
+    Returns:
+        dict: A dictionary mapping each building position (x, y) to a (path, cost) tuple,
+              in row-major order. Buildings that cannot reach any emergency service map
+              to (None, None).
+    """
+    labels, successors = search_from_emergency_services(graph)
+
+    results = {}
+    for cell in graph.buildings():
+        start = graph.state_count + cell
+        nearest = choose_nearest_service(graph, labels, start)
+        if nearest is None:
+            results[divmod(cell, graph.height)] = (None, None)
+            continue
+        (label, state), service = nearest
+        service_successors = successors[service]
+        route = [start]
+        while state != -1:
+            route.append(state)
+            state = service_successors[state]
+        if is_only_cheapest_route(graph, labels[service].__getitem__, route):
+            cost = label // graph.label_base
+        else:
+            route = find_a_star_path(graph, cell, route_length_bounds(
+                graph, [service_labels.__getitem__ for service_labels in labels], cell))
+            cost = path_cost(graph, route)
+        results[divmod(cell, graph.height)] = ([graph.decode(state) for state in route], cost)
+    return results
+
+
+def find_all_path_costs(graph):
+    """
+    Finds the cost, length and counted intersections of the path from every building to
+    its nearest emergency service without building any path lists. The length comes with
+    the search labels and the intersections are counted by following the successor of
+    each state, sharing the count of route suffixes between buildings, as is whether the
+    suffix is the only cheapest route (see `is_only_cheapest_route`). The paths of the
+    other buildings are searched with A*.
+
+    Like `calculate_fitness`, a node (x, y) counts as an intersection when the cell at
+    row x, column y is an intersection off the border.
+
+    Parameters:
+        graph (TransitionGraph): The compiled state graph of the grid.
+
+    Returns:
+        dict: A dictionary mapping each building position (x, y) to a (cost, path_length,
+              intersection_count) tuple, in row-major order. Buildings that cannot reach
+              any emergency service are left out.
+    """
+    height, base = graph.height, graph.label_base
+    counted_cells = graph.counted_cells()
+
+    labels, successors = search_from_emergency_services(graph)
+    counts = [array("i", [-1]) * graph.state_count for _ in labels]
+    # 1 where the route of a state is the only cheapest one, 0 where it is not
+    unique = [bytearray(graph.state_count) for _ in labels]
+
+    path_costs = {}
+    for cell in graph.buildings():
+        start = graph.state_count + cell
+        nearest = choose_nearest_service(graph, labels, start)
+        if nearest is None:
+            print(f"No path found to any emergency service for building at {divmod(cell, height)}.")
+            continue
+        (label, successor), service = nearest
+
+        # Walk down to the first state whose count is known, then fill the counts back in
+        service_counts, service_successors = counts[service], successors[service]
+        service_unique, state_label = unique[service], labels[service].__getitem__
+        route = []
+        state = successor
+        while state != -1 and service_counts[state] < 0:
+            route.append(state)
+            state = service_successors[state]
+        count = service_counts[state] if state != -1 else 0
+        only = service_unique[state] if state != -1 else 1
+        for state in reversed(route):
+            count += counted_cells[state >> 2]
+            service_counts[state] = count
+            if only and service_successors[state] != -1:
+                only = count_cheapest_successors(graph, state_label, state) == 1
+            service_unique[state] = only
+
+        if service_unique[successor] and is_only_cheapest_route(graph, state_label, [start, successor]):
+            intersection_count = service_counts[successor] + counted_cells[cell]
+            path_costs[divmod(cell, height)] = (label // base, label % base, intersection_count)
+        else:
+            path_costs[divmod(cell, height)] = find_a_star_path_costs(graph, counted_cells, cell, route_length_bounds(
+                graph, [service_labels.__getitem__ for service_labels in labels], cell))
+    return path_costs
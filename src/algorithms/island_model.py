@@ -0,0 +1,199 @@
+import multiprocessing
+import queue
+import random
+import time
+import traceback
+from algorithms.evaluation_cache import evaluation_cache, cached_fitness, cached_shortest_paths
+from algorithms.genetic_algo import initialize_population, select_best_grids, breed_next_generation
+from algorithms.feasibility import FeasibilityFilter
+from utils.genome import GenomeLayout, Genome
+
+RESULT_POLL_SECONDS = 1.0  # How long to wait on the results queue before checking the processes are alive
+
+
+def run_island(island, initial_grid, population_size, generations, mutation_rate, num_selected,
+               migration_interval, num_migrants, seed, inbox, outbox, results):
+    """
+    Evolves one island population in its own process and reports its best grid.
+
+    The island runs the generational loop of `genetic_algorithm` with the same operators.
+    Every `migration_interval` generations it sends copies of its `num_migrants` best grids
+    to the next island and replaces its worst selected grids with the ones it receives, which
+    then breed and are carried over like any other selected grid.
+
+    Parameters:
+        island (int): The index of the island.
+        initial_grid (CityGrid): The initial grid used to create the population.
+        population_size (int): The number of children bred per generation.
+        generations (int): The number of generations to evolve the population.
+        mutation_rate (float): The probability of mutating a child.
+        num_selected (int): The number of grids selected as parents each generation.
+        migration_interval (int): The number of generations between migrations.
+        num_migrants (int): The number of grids sent at each migration.
+        seed (int): The seed of the island's random generator.
+        inbox (multiprocessing.Queue): The queue migrants arrive on.
+        outbox (multiprocessing.Queue): The inbox of the next island.
+        results (multiprocessing.Queue): The queue the island reports its outcome on.
+    """
+    try:
+        random.seed(seed)
+        evaluation_cache.clear()  # A forked island would start with the parent's entries
+        start_time = time.perf_counter()
+        stats = {
+            "island": island,
+            "best_fitness": float('inf'),
+            "best_generation": None,
+            "history": [],
+            "migrants_sent": 0,
+            "migrants_received": 0,
+        }
+        best_grid = None
+
+        layout = GenomeLayout(initial_grid)
+        feasibility = FeasibilityFilter(initial_grid)  # Unreachable buildings are penalized, as in `genetic_algorithm`
+        population = [Genome.from_grid(layout, grid) for grid in initialize_population(population_size, initial_grid)]
+        for generation in range(generations):
+            fitness_scores = [cached_fitness(grid) for grid in population]
+            selected_population, avg_fitness = select_best_grids(population, fitness_scores, num_selected, feasibility)
+
+            # The selected grids are sorted, the first one is the best of the generation
+            stats["history"].append(avg_fitness[0])
+            if avg_fitness[0] < stats["best_fitness"]:
+                stats["best_fitness"] = avg_fitness[0]
+                stats["best_generation"] = generation + 1
+                best_grid = selected_population[0]
+
+            if (generation + 1) % migration_interval == 0 and generation + 1 < generations:
+                outbox.put(selected_population[:num_migrants])
+                stats["migrants_sent"] += num_migrants
+                immigrants = inbox.get()
+                stats["migrants_received"] += len(immigrants)
+                selected_population = selected_population[:len(selected_population) - len(immigrants)] + immigrants
+
+            population = breed_next_generation(selected_population, population_size, mutation_rate)
+
+        stats["evaluations"] = evaluation_cache.misses
+        stats["cache_hit_rate"] = evaluation_cache.hit_rate()
+        stats["elapsed"] = time.perf_counter() - start_time
+        results.put((island, best_grid, stats))
+    except Exception:
+        results.put((island, None, {"island": island, "error": traceback.format_exc()}))
+
+
+def collect_results(processes, results, name):
+    """
+    Drains the outcome every process reports on a results queue, so that none of them
+    blocks on a full queue before being joined.
+
+    The queue is polled with a timeout rather than waited on, so a process that dies
+    without reporting (killed by a signal or by the system running out of memory) is
+    noticed instead of blocking the caller forever. A process flushes its outcome to the
+    queue before it exits, so one found exited at two polls in a row without having
+    reported never will.
+
+    Parameters:
+        processes (list[multiprocessing.Process]): The started processes, by index.
+        results (multiprocessing.Queue): The queue each process reports its outcome on, as
+                                         a tuple starting with its index and ending with
+                                         its stats, which hold an "error" on failure.
+        name (str): What a process is called in error messages, e.g. "Island".
+
+    Returns:
+        list[tuple]: The outcome of every process, in the order they arrived.
+
+    Raises:
+        RuntimeError: If a process reported an error or exited without reporting. The other
+                      processes are terminated first.
+    """
+    def fail(message):
+        for process in processes:
+            process.terminate()
+        raise RuntimeError(message)
+
+    outcomes = []
+    exited = set()
+    while len(outcomes) < len(processes):
+        try:
+            outcome = results.get(timeout=RESULT_POLL_SECONDS)
+        except queue.Empty:
+            reported = {outcome[0] for outcome in outcomes}
+            lost = sorted(index for index in exited if index not in reported)
+            if lost:
+                fail(f"{name} {lost[0] + 1} exited with code {processes[lost[0]].exitcode} without reporting")
+            exited = {index for index, process in enumerate(processes) if process.exitcode is not None}
+            continue
+        if "error" in outcome[-1]:
+            fail(f"{name} {outcome[0] + 1} failed:\n{outcome[-1]['error']}")
+        outcomes.append(outcome)
+    return outcomes
+
+
+def island_genetic_algorithm(num_islands, population_size, generations, mutation_rate, initial_grid,
+                             migration_interval=5, num_migrants=2, num_selected=6, seed=None):
+    """
+    Runs an island-model genetic algorithm: `num_islands` independent populations evolve in
+    separate processes and only exchange their best grids every `migration_interval`
+    generations, over queues arranged in a ring (island i sends to island i + 1).
+
+    Each island draws its seed from the main random generator (or from `seed`), and
+    migrations happen at fixed generations, so a run is reproducible under a fixed seed.
+    Unlike `genetic_algorithm`, the islands do not render their generations.
+
+    Parameters:
+        num_islands (int): The number of island populations, one process each.
+        population_size (int): The number of children bred per generation on each island.
+        generations (int): The number of generations to evolve each island.
+        mutation_rate (float): The probability of mutating a child.
+        initial_grid (CityGrid): The initial grid used to create the populations.
+        migration_interval (int): The number of generations between migrations.
+        num_migrants (int): The number of grids each island sends at a migration. Must be
+                            smaller than `num_selected`.
+        num_selected (int): The number of grids selected as parents each generation.
+        seed (int): The seed the island seeds are derived from, the main random generator
+                    being used when None.
+
+    Returns:
+        tuple:
+            - CityGrid: The best grid found on any island.
+            - list[list[tuple]]: The shortest paths corresponding to the best grid.
+            - float: The average fitness of the best grid.
+            - list[dict]: Per island statistics: its best fitness and the generation it was
+                          reached in, the best fitness of every generation, the number of
+                          migrants sent and received, the number of evaluations, the cache
+                          hit rate and the elapsed time.
+    """
+    if not 0 < num_migrants < num_selected:
+        raise ValueError("The number of migrants must be positive and smaller than the number of selected grids!")
+
+    generator = random.Random(seed) if seed is not None else random
+    seeds = [generator.getrandbits(32) for _ in range(num_islands)]
+    inboxes = [multiprocessing.Queue() for _ in range(num_islands)]
+    results = multiprocessing.Queue()
+
+    processes = []
+    for island in range(num_islands):
+        process = multiprocessing.Process(
+            target=run_island,
+            args=(island, initial_grid, population_size, generations, mutation_rate, num_selected,
+                  migration_interval, num_migrants, seeds[island], inboxes[island],
+                  inboxes[(island + 1) % num_islands], results))
+        process.start()
+        processes.append(process)
+
+    # Drain the results before joining, so no island blocks on a full queue. A failed island
+    # would leave its neighbor waiting for migrants, so the others are stopped right away
+    outcomes = collect_results(processes, results, "Island")
+    for process in processes:
+        process.join()
+    outcomes.sort(key=lambda outcome: outcome[0])
+
+    island_stats = [stats for _, _, stats in outcomes]
+    best_island = min(range(num_islands), key=lambda island: island_stats[island]["best_fitness"])
+    best_grid = outcomes[best_island][1].to_grid()
+    best_fitness = island_stats[best_island]["best_fitness"]
+
+    for stats in island_stats:
+        print(f"Island {stats['island'] + 1}: Best Fitness = {stats['best_fitness']} "
+              f"(generation {stats['best_generation']}, {stats['evaluations']} evaluations)")
+
+    return best_grid, cached_shortest_paths(best_grid), best_fitness, island_stats
@@ -1,61 +1,451 @@
 import os
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from algorithms.a_star_algo import find_all_shortest_paths
 from utils.helper import generate_neighbor, best_path_retention
-from algorithms.cost_function import calculate_fitness
+from algorithms.incremental_search import evaluate_from_scratch, reevaluate, MAX_CHANGED_CELLS
+from algorithms.bounded_evaluation import evaluate_with_cutoff
+from algorithms.batch_evaluation import batch_evaluate, batch_fitness
+from algorithms.transposition_table import TranspositionTable
+from algorithms.surrogate import SurrogateModel, prescreen
+from algorithms.feasibility import FeasibilityFilter
 from visuals.visualization import save_city_grid
 from utils.grid_generation import place_intersections_in_every_column_randomly
+from utils.city_grid import CityGrid
 from grid_constants import RES_DIR
 
+IMPROVEMENT_POLICIES = ("first", "best")
 
-def local_search_algorithm(grid, max_iterations=200):
+# Search state of the current grid, kept by each worker process between candidates
+_worker_state = None
+
+
+def fitness_sum(fitness_scores, feasibility=None):
+    """
+    Parameters:
+        fitness_scores (dict): The `calculate_fitness` scores of a grid.
+        feasibility (FeasibilityFilter): How unreachable buildings are scored, left out of
+                                         the sum when None.
+
+    Returns:
+        float: The fitness sum the climb compares grids by.
+    """
+    return feasibility.fitness(fitness_scores) if feasibility is not None else sum(fitness_scores.values())
+
+
+def evaluate_candidate(current_state, neighbor, table=None, current_hash=None, early_abort=False,
+                       feasibility=None, shared_store=None):
+    """
+    Turns a neighbor of the current grid into a candidate configuration: the neighbor is
+    evaluated, merged with the current grid by `best_path_retention` and the merged grid is
+    evaluated. Both evaluations repair the paths of an already evaluated grid.
+
+    The merge often lands on a configuration the climb has already scored, typically the
+    current grid itself. With a transposition table, such a merged grid gets its score
+    from the table and is not evaluated again. With `early_abort`, the merged grid is
+    evaluated with the current fitness sum as cutoff, the previously worst buildings first,
+    since it will almost always be rejected: its repair gives up once the merged grid
+    provably scores no better (see `reevaluate`), and a merged grid too different from both
+    evaluated grids to be repaired is searched with `evaluate_with_cutoff`. With the "reject"
+    feasibility policy, a neighbor with unreachable buildings is turned down before any
+    path search (see `FeasibilityFilter`). With a shared store, a merged grid another
+    process already evaluated gets its score from the store, and the merged grids
+    evaluated here are published to it.
+
+    Parameters:
+        current_state (SearchState): The search state of the current grid.
+        neighbor (CityGrid): A grid produced by `generate_neighbor` from the current grid.
+        table (TranspositionTable): The scores of the configurations seen so far, if any.
+        current_hash (int): The table hash of the current grid.
+        early_abort (bool): Whether to evaluate the merged grid with a cutoff.
+        feasibility (FeasibilityFilter): How grids with unreachable buildings are scored.
+        shared_store (SharedFitnessStore): The fitness scores shared with other processes.
+
+    Returns:
+        tuple: The search state of the merged grid (only the merged grid itself when its
+               score came from the table, the shared store or the cutoff evaluation, the
+               neighbor when
+               it was rejected) and the sum of its fitness scores, infinite when the cutoff
+               evaluation gave up or the neighbor was rejected.
+    """
+    if feasibility is not None and feasibility.policy == "reject":
+        neighbor_changed_cells = current_state.grid.changed_cells(neighbor)
+        graph = current_state.graph.copy()
+        graph.update_cells(neighbor, neighbor_changed_cells)
+        if not feasibility.admits(graph, current_state, neighbor_changed_cells):
+            return neighbor, float('inf')
+        neighbor_state = reevaluate(neighbor, current_state, neighbor_changed_cells, graph=graph)
+    else:
+        neighbor_state = reevaluate(neighbor, current_state)
+    merged_grid = best_path_retention(current_state.grid, neighbor, current_state.shortest_paths,
+                                      neighbor_state.shortest_paths)
+
+    changed_cells = current_state.grid.changed_cells(merged_grid)
+    if table is not None:
+        merged_hash = table.update_hash(current_hash, changed_cells)
+        fitness = table.lookup(merged_hash)
+        if fitness is not None:
+            return merged_grid, fitness
+    if shared_store is not None:
+        fitness_scores = shared_store.get(merged_grid)
+        if fitness_scores is not None:
+            fitness = fitness_sum(fitness_scores, feasibility)
+            if table is not None:
+                table.store(merged_hash, fitness)
+            return merged_grid, fitness
+
+    # Repair from whichever evaluated grid is closest to the merged one
+    base_state = current_state
+    neighbor_changed_cells = neighbor_state.grid.changed_cells(merged_grid)
+    if len(neighbor_changed_cells) < len(changed_cells):
+        base_state, changed_cells = neighbor_state, neighbor_changed_cells
+
+    cutoff = order = None
+    if early_abort:
+        current_scores = current_state.fitness_scores
+        cutoff = fitness_sum(current_scores, feasibility)
+        order = sorted(current_scores, key=lambda building: current_scores[building], reverse=True)
+    if early_abort and len(changed_cells) > MAX_CHANGED_CELLS:
+        graph = base_state.graph.copy()
+        graph.update_cells(merged_grid, changed_cells)
+        fitness_scores, _ = evaluate_with_cutoff(merged_grid, cutoff, order, graph)
+        if fitness_scores is None:
+            return merged_grid, float('inf')
+        candidate, fitness = merged_grid, fitness_sum(fitness_scores, feasibility)
+    else:
+        candidate = reevaluate(merged_grid, base_state, changed_cells, cutoff=cutoff, order=order)
+        if candidate is None:
+            return merged_grid, float('inf')
+        fitness_scores = candidate.fitness_scores
+        fitness = fitness_sum(fitness_scores, feasibility)
+    if shared_store is not None:
+        shared_store.put(merged_grid, fitness_scores)
+    if table is not None:
+        table.store(merged_hash, fitness)
+    return candidate, fitness
+
+
+def evaluate_candidate_in_worker(current_grid, neighbor, early_abort=False, feasibility=None):
+    """
+    Pool task behind `evaluate_candidate`. Each worker keeps the search state of the last
+    current grid it saw and repairs it when the climb has moved on, so the current grid
+    is never searched from scratch more than once per worker. The feasibility filter is a
+    copy private to the task, so whether it rejected the neighbor is sent back for the
+    climb to count.
+
+    Parameters:
+        current_grid (CityGrid): The current grid of the climb.
+        neighbor (CityGrid): A neighbor of the current grid.
+        early_abort (bool): Whether to evaluate the merged grid with a cutoff.
+        feasibility (FeasibilityFilter): How grids with unreachable buildings are scored.
+
+    Returns:
+        tuple: The merged grid (the neighbor itself when it was rejected), the sum of its
+               fitness scores and the number of neighbors the feasibility filter rejected,
+               0 or 1.
+    """
+    global _worker_state
+    if _worker_state is None or _worker_state.grid.shape != current_grid.shape:
+        _worker_state = evaluate_from_scratch(current_grid)
+    elif _worker_state.grid != current_grid:
+        _worker_state = reevaluate(current_grid, _worker_state)
+    rejected = feasibility.rejected if feasibility is not None else 0
+    new_state, fitness = evaluate_candidate(_worker_state, neighbor, early_abort=early_abort, feasibility=feasibility)
+    rejected = feasibility.rejected - rejected if feasibility is not None else 0
+    return getattr(new_state, "grid", new_state), fitness, rejected
+
+
+def evaluate_candidates_in_batch(current_state, neighbors, table=None, current_hash=None, feasibility=None):
+    """
+    Batched `evaluate_candidate` for all the neighbors of an iteration: the neighbors are
+    searched together, merged with the current grid by `best_path_retention`, and the
+    merged grids missing from the transposition table, if any, are scored together by the
+    batched wavefront search. Neighbors turned down by the feasibility filter are not searched.
+
+    Parameters:
+        current_state (SearchState): The search state of the current grid.
+        neighbors (list[CityGrid]): Grids produced by `generate_neighbor` from the current grid.
+        table (TranspositionTable): The scores of the configurations seen so far, if any.
+        current_hash (int): The table hash of the current grid.
+        feasibility (FeasibilityFilter): How grids with unreachable buildings are scored.
+
+    Returns:
+        list[tuple]: The merged grid (the neighbor itself when it was rejected) and the sum
+                     of its fitness scores, for each neighbor in order.
+    """
+    results = [(neighbor, float('inf')) for neighbor in neighbors]
+    admitted = list(range(len(neighbors)))
+    if feasibility is not None and feasibility.policy == "reject":
+        admitted = []
+        for index, neighbor in enumerate(neighbors):
+            changed_cells = current_state.grid.changed_cells(neighbor)
+            graph = current_state.graph.copy()
+            graph.update_cells(neighbor, changed_cells)
+            if feasibility.admits(graph, current_state, changed_cells):
+                admitted.append(index)
+    neighbors = [neighbors[index] for index in admitted]
+
+    merged_grids = [best_path_retention(current_state.grid, neighbor, current_state.shortest_paths, paths)
+                    for neighbor, (paths, _) in zip(neighbors, batch_evaluate(neighbors))]
+    if table is None:
+        scores = [fitness_sum(fitness_scores, feasibility) for fitness_scores in batch_fitness(merged_grids)]
+    else:
+        hashes = [table.update_hash(current_hash, current_state.grid.changed_cells(grid)) for grid in merged_grids]
+        scores = [table.lookup(merged_hash) for merged_hash in hashes]
+        missing = [index for index, fitness in enumerate(scores) if fitness is None]
+        for index, fitness_scores in zip(missing, batch_fitness([merged_grids[index] for index in missing])):
+            scores[index] = fitness_sum(fitness_scores, feasibility)
+            table.store(hashes[index], scores[index])
+    for index, merged_grid, fitness in zip(admitted, merged_grids, scores):
+        results[index] = (merged_grid, fitness)
+    return results
+
+
+def record_candidates(candidates, scored):
+    """
+    Passes scored candidates through, appending each (grid, fitness sum) pair to `scored`,
+    so the candidates a lazy selection actually evaluated can be told apart.
+
+    Parameters:
+        candidates (iterable[tuple]): (candidate, fitness sum) pairs.
+        scored (list[tuple]): The list the (grid, fitness sum) pairs are appended to.
+
+    Yields:
+        tuple: The candidate pairs, unchanged.
+    """
+    for candidate, fitness in candidates:
+        scored.append((getattr(candidate, "grid", candidate), fitness))
+        yield candidate, fitness
+
+
+def collect_candidates(futures, feasibility):
+    """
+    Waits for the candidates scored by `evaluate_candidate_in_worker`, in submission order,
+    and adds the neighbors the workers' copies of the feasibility filter rejected to its count.
+
+    Parameters:
+        futures (list[concurrent.futures.Future]): The pool tasks of an iteration.
+        feasibility (FeasibilityFilter): The filter of the climb.
+
+    Yields:
+        tuple: The (merged grid, fitness sum) pair of each task.
+    """
+    for future in futures:
+        candidate, fitness, rejected = future.result()
+        feasibility.rejected += rejected
+        yield candidate, fitness
+
+
+def select_candidate(candidates, current_fitness, policy):
+    """
+    Picks the candidate to accept among scored candidates.
+
+    Parameters:
+        candidates (iterable[tuple]): (candidate, fitness sum) pairs, in the order the
+                                      neighbors were drawn. Consumed lazily.
+        current_fitness (float): The fitness sum of the current grid.
+        policy (str): "first" stops at the first improving candidate, "best" looks at all of
+                      them and keeps the lowest fitness sum (the earliest one on ties).
+
+    Returns:
+        object: The accepted candidate, or None if no candidate improves on the current grid.
+    """
+    best = None
+    for candidate, fitness in candidates:
+        if fitness >= current_fitness:
+            continue
+        if policy == "first":
+            return candidate
+        if best is None or fitness < best[1]:
+            best = (candidate, fitness)
+    return best[0] if best else None
+
+
+def local_search_algorithm(grid, max_iterations=200, num_candidates=1, policy="first", max_workers=None,
+                           batch_evaluation=False, max_table_entries=65536, early_abort=False,
+                           screen_fraction=1.0, feasibility="penalize", unreachable_penalty=None, dir_path=None,
+                           shared_store=None, progress=None):
     """
     Implements the hill climbing algorithm to optimize the placement of  intersections in a city grid.
 
     Steps:
     1. Iteratively generates neighboring configurations and evaluates their fitness scores.
+       Each neighbor differs from the current grid in a few cells only, so its paths are
+       repaired from the current search state instead of being recomputed from scratch.
     2. Accepts a new configuration if it improves the fitness score.
     3. Saves the grid visualization at each step for progress tracking.
 
+    With `num_candidates` above 1 every iteration draws that many neighbors, merges each of
+    them with the current grid through `best_path_retention` and scores the merged grids in
+    a process pool. The `policy` then decides which improving candidate is accepted. The
+    neighbors are drawn in the main process, so a run is reproducible under a fixed seed
+    whatever the number of workers. With `batch_evaluation`, the candidates of an iteration
+    are instead scored together in-process by the batched wavefront search (see
+    `evaluate_candidates_in_batch`), which accepts the same candidates.
+
+    In-process, the scores of the merged grids are kept in a transposition table keyed by
+    an incrementally updated Zobrist hash, so configurations the climb returns to are not
+    evaluated again. Hill climbing accepts the same candidates with or without it.
+
+    With `screen_fraction` below 1, a surrogate model (see `SurrogateModel`) ranks the
+    neighbors of each iteration and only the most promising fraction of them is turned into
+    candidates and evaluated exactly. The model learns from the neighbors evaluated so far,
+    each with the score of the candidate merged from it (evaluations given up, which could
+    not beat the current grid, count as scoring like the current grid), so the first
+    iterations are not screened. Its rank correlation with the exact scores over the
+    neighbors it ranked is printed at the end of the climb.
+
+    Buildings that cannot reach any emergency service are left out of their grid's fitness
+    scores. The `feasibility` policy decides how such grids compare (see
+    `FeasibilityFilter`): by default each unreachable building adds `unreachable_penalty`
+    to the sum ("penalize"), and in addition, once the current grid is feasible, neighbors
+    with one can be turned down before being searched ("reject"). Scores are averaged over
+    every building. With "ignore" unreachable buildings are simply left out and scores are
+    averaged over the buildings the initial grid reaches, so a grid that cuts buildings off
+    can score better than one serving them all.
+
     Parameters:
-        grid (list[list[int]]): The initial city grid with intersections.
+        grid (CityGrid): The initial city grid with intersections.
         max_iterations (int): Maximum number of iterations for the algorithm.
+        num_candidates (int): Number of neighbors tried per iteration.
+        policy (str): "first" (first improvement, in the order the neighbors were drawn) or
+                      "best" (best improvement among all candidates of the iteration).
+        max_workers (int): Number of worker processes, defaulting to the number of CPUs.
+                           With 1 worker, or a single candidate, everything runs in-process.
+        batch_evaluation (bool): Whether to score the candidates with the batched search
+                                 rather than one by one or in a pool.
+        max_table_entries (int): The number of configurations kept in the transposition
+                                 table, least recently used first out. 0 disables the table.
+        early_abort (bool): Whether merged grids are evaluated with the current score as
+                            cutoff (see `evaluate_candidate`). The same candidates are
+                            accepted either way.
+        screen_fraction (float): The share of the neighbors of an iteration that is
+                                 evaluated exactly, all of them with 1.
+        feasibility (str): "penalize", "reject" or "ignore".
+        unreachable_penalty (float): The fitness added per unreachable building, by default
+                                     the number of cells of the grid.
+        dir_path (str): The directory the visualizations are saved to, created if needed.
+                        A new timestamped directory in RES_DIR when omitted.
+        shared_store (SharedFitnessStore): Fitness scores shared with other optimizers of
+                                           the same grid, asked before evaluating a merged
+                                           grid in-process (see `evaluate_candidate`). The
+                                           pool and batched evaluations do not use it.
+        progress (callable): Called with the iteration and the current score before each
+                             iteration. The climb stops when it returns True.
 
     Returns:
         tuple: The optimized grid and the corresponding paths after hill climbing.
     """
+    if policy not in IMPROVEMENT_POLICIES:
+        raise ValueError(f"Unknown improvement policy {policy!r}, expected one of {IMPROVEMENT_POLICIES}")
+
     grid = place_intersections_in_every_column_randomly(grid)
-    current_grid = deepcopy(grid)
-    current_paths = find_all_shortest_paths(current_grid)
-    initial_fitness_scores = calculate_fitness(current_grid, current_paths)
-    current_score = sum(initial_fitness_scores.values()) / len(initial_fitness_scores)
+    current_grid = grid.copy()
+    current_state = evaluate_from_scratch(current_grid)
+    current_paths = current_state.shortest_paths
+    initial_fitness_scores = current_state.fitness_scores
+    feasibility_filter = FeasibilityFilter(current_grid, feasibility, unreachable_penalty)
+    building_count = feasibility_filter.building_count
+    if feasibility_filter.policy == "ignore":
+        building_count = len(initial_fitness_scores)  # The buildings the initial grid reaches
+    current_score = fitness_sum(initial_fitness_scores, feasibility_filter) / building_count
+    if shared_store is not None:
+        shared_store.put(current_grid, initial_fitness_scores)
 
-    dir_path = os.path.join(RES_DIR, "hill_climbing_" + datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
-    os.mkdir(dir_path)
+    if dir_path is None:
+        dir_path = os.path.join(RES_DIR, "hill_climbing_" + datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        os.mkdir(dir_path)
+    else:
+        os.makedirs(dir_path, exist_ok=True)
     save_city_grid(grid, current_paths, dir_path,current_score, "hill_climbing_initial.png")
 
-    for _ in range(max_iterations):
-        print(f"Iteration {_}")
-        new_grid = generate_neighbor(current_grid)
-        new_paths = find_all_shortest_paths(new_grid)
-        fitness_scores = calculate_fitness(new_grid, new_paths)
-        new_grid = best_path_retention(current_grid, new_grid, current_paths, new_paths)
-        new_paths = find_all_shortest_paths(new_grid)
-        fitness_scores = calculate_fitness(new_grid, new_paths)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    use_pool = num_candidates > 1 and max_workers > 1 and not batch_evaluation
+    executor = ProcessPoolExecutor(max_workers) if use_pool else None
+
+    table = TranspositionTable(current_grid.shape, max_table_entries) if max_table_entries and not use_pool else None
+    current_hash = None
+    if table is not None:
+        current_hash = table.hash_grid(current_grid)
+        table.store(current_hash, fitness_sum(initial_fitness_scores, feasibility_filter))
+    surrogate = SurrogateModel(current_grid) if screen_fraction < 1 and num_candidates > 1 else None
+
+    try:
+        for _ in range(max_iterations):
+            if progress is not None and progress(_, current_score):
+                print(f"Stopped at iteration {_}")
+                break
+            print(f"Iteration {_}")
+            neighbors = [generate_neighbor(current_grid) for _neighbor in range(num_candidates)]
+            current_fitness = fitness_sum(current_state.fitness_scores, feasibility_filter)
+            scored = []
+            if surrogate is not None:
+                neighbors = [neighbors[index] for index in prescreen(surrogate, neighbors, screen_fraction)]
+
+            if batch_evaluation:
+                candidates = evaluate_candidates_in_batch(current_state, neighbors, table, current_hash,
+                                                          feasibility_filter)
+                new_grid = select_candidate(record_candidates(candidates, scored), current_fitness, policy)
+                new_state = reevaluate(new_grid, current_state) if new_grid is not None else None
+            elif executor is None:
+                # Evaluated lazily, so the "first" policy stops at the first improvement
+                candidates = (evaluate_candidate(current_state, neighbor, table, current_hash, early_abort,
+                                                 feasibility_filter, shared_store)
+                              for neighbor in neighbors)
+                new_state = select_candidate(record_candidates(candidates, scored), current_fitness, policy)
+                if isinstance(new_state, CityGrid):
+                    # Scored without paths, from the transposition table or with a cutoff
+                    new_state = reevaluate(new_state, current_state)
+            else:
+                futures = [executor.submit(evaluate_candidate_in_worker, current_grid, neighbor, early_abort,
+                                           feasibility_filter)
+                           for neighbor in neighbors]
+                new_grid = select_candidate(record_candidates(collect_candidates(futures, feasibility_filter), scored),
+                                            current_fitness, policy)
+                for future in futures:
+                    future.cancel()
+                # Only the accepted grid needs its paths, repaired from the current state
+                new_state = reevaluate(new_grid, current_state) if new_grid is not None else None
+
+            if surrogate is not None:
+                # The candidates are scored in the order of their neighbors, and the neighbors
+                # are what the pre-screen ranks, so they are learned with the merged grids' scores
+                surrogate.observe(neighbors[:len(scored)], [fitness / building_count for _, fitness in scored],
+                                  cutoff=current_fitness / building_count)
+
+            if new_state is None:
+                continue
+            new_paths = new_state.shortest_paths
+            fitness_scores = new_state.fitness_scores
+
+            new_score = fitness_sum(fitness_scores, feasibility_filter) / building_count
 
-        new_score = sum(fitness_scores.values()) / len(initial_fitness_scores)
+            # If the new configuration is better, accept it
+            if new_score < current_score:
+                print(f"Accepted new configuration with score {new_score} at iteration {_}")
 
-        # If the new configuration is better, accept it
-        if new_score < current_score:
-            print(f"Accepted new configuration with score {new_score} at iteration {_}")
+                if table is not None:
+                    current_hash = table.update_hash(current_hash, current_grid.changed_cells(new_state.grid))
+                current_grid = new_state.grid
+                current_state = new_state
+                current_score = new_score
+                current_paths = new_paths
+                save_city_grid(current_grid, new_paths, dir_path,current_score, f"iter{_}_cost_{current_score}.png")
 
-            current_grid = new_grid
-            current_score = new_score
-            current_paths = new_paths
-            save_city_grid(new_grid, new_paths, dir_path,current_score, f"iter{_}_cost_{current_score}.png")
+            # Optionally print progress
+            # print(f"Iteration {_}: Current Score = {current_score}")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
-        # Optionally print progress
-        # print(f"Iteration {_}: Current Score = {current_score}")
+    if table is not None and shared_store is not None:
+        shared_store.local_hits += table.hits
+    if table is not None:
+        print(f"Transposition table: {table.hits} hits, {table.misses} misses "
+              f"({table.hit_rate():.0%} hit rate, {table.evictions} evictions)")
+    if feasibility_filter.rejected:
+        print(f"Feasibility filter: {feasibility_filter.rejected} neighbors with unreachable buildings rejected")
+    if surrogate is not None:
+        print(surrogate.report())
 
     return current_grid, current_paths, current_score
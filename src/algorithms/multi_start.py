@@ -0,0 +1,161 @@
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from algorithms.local_search import local_search_algorithm
+from utils.helper import silenced_output
+from grid_constants import RES_DIR
+
+# Best score reached by any climb, shared by the worker processes
+_incumbent = None
+
+
+def init_worker(incumbent):
+    """
+    Pool initializer giving each worker the shared incumbent score.
+
+    Parameters:
+        incumbent (multiprocessing.Value): The best score reached by any climb so far.
+    """
+    global _incumbent
+    _incumbent = incumbent
+
+
+def publish_score(score):
+    """
+    Lowers the shared incumbent to `score` if it is better.
+    """
+    with _incumbent.get_lock():
+        if score < _incumbent.value:
+            _incumbent.value = score
+
+
+def run_start(start, seed, grid, dir_path, patience, stop_margin, local_search_options, verbose):
+    """
+    Runs one climb of `multi_start_local_search` in a worker process.
+
+    The climb publishes every score it reaches to the shared incumbent. Once it has gone
+    `patience` iterations without improving while its score is more than `stop_margin`
+    (relative) above the incumbent, it is considered hopeless and stopped.
+
+    Parameters:
+        start (int): The index of the start.
+        seed (int): The seed of the start's `random` and NumPy generators, which decides its
+                    random intersection placement and its neighbors.
+        grid (CityGrid): The initial grid.
+        dir_path (str): The directory the climb saves its visualizations to.
+        patience (int): The number of iterations without improvement before a climb may be
+                        stopped, None to never stop early.
+        stop_margin (float): How far above the incumbent, relative to it, a stalled climb
+                             must be to be stopped.
+        local_search_options (dict): Keyword arguments of `local_search_algorithm`.
+        verbose (bool): Whether to let the climb print its progress.
+
+    Returns:
+        tuple:
+            - CityGrid: The best grid of the climb.
+            - list[list[tuple]]: Its shortest paths.
+            - dict: The trace of the start (see `multi_start_local_search`).
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    trace = {"start": start, "seed": seed, "history": [], "iterations": 0, "stopped_early": False}
+    last_improvement = [0, math.inf]  # Iteration and score of the last improvement
+
+    def progress(iteration, score):
+        trace["iterations"] = iteration
+        if score < last_improvement[1]:
+            last_improvement[:] = [iteration, score]
+            trace["history"].append((iteration, score))
+            publish_score(score)
+        if patience is None or iteration - last_improvement[0] < patience:
+            return False
+        trace["stopped_early"] = score > _incumbent.value * (1 + stop_margin)
+        return trace["stopped_early"]
+
+    start_time = time.perf_counter()
+    with silenced_output(verbose):
+        best_grid, best_paths, best_score = local_search_algorithm(
+            grid, **local_search_options, dir_path=dir_path, progress=progress)
+    if best_score < last_improvement[1]:
+        trace["history"].append((trace["iterations"] + 1, best_score))
+        publish_score(best_score)
+    if not trace["stopped_early"]:
+        trace["iterations"] = local_search_options.get("max_iterations", 200)
+    trace["best_score"] = best_score
+    trace["seconds"] = time.perf_counter() - start_time
+    return best_grid, best_paths, trace
+
+
+def multi_start_local_search(grid, num_starts, max_workers=None, seed=None, patience=50, stop_margin=0.05,
+                             dir_path=None, verbose=False, **local_search_options):
+    """
+    Runs `num_starts` hill climbs of the same grid, each from its own random intersection
+    placement, in a process pool, and keeps the best grid any of them reached.
+
+    `local_search_algorithm` starts by placing intersections randomly, so its outcome
+    varies a lot from one start to another. The climbs share the best score reached so far
+    (the incumbent) and a climb that stalls well above it is stopped early rather than
+    running its remaining iterations (see `run_start`), which frees its worker for the next
+    start. Each start draws its seed from the main random generator (or from `seed`), so
+    with `patience` None a run is reproducible whatever the number of workers. With early
+    stopping, when a climb stops depends on how far the others got.
+    The climbs already run in parallel, so each of them scores its candidates in-process
+    (`local_search_algorithm` with a single worker) rather than in a pool of its own.
+
+    Parameters:
+        grid (CityGrid): The initial grid, left unchanged.
+        num_starts (int): The number of climbs.
+        max_workers (int): The number of worker processes, one per CPU when None.
+        seed (int): The seed the start seeds are derived from, the main random generator
+                    being used when None.
+        patience (int): The number of iterations a climb may go without improving before
+                        it can be stopped, None to run every climb to the end.
+        stop_margin (float): How far above the incumbent, relative to it, a stalled climb
+                             must be to be stopped.
+        dir_path (str): The directory the climbs save their visualizations to, one
+                        subdirectory each. A "multi_start" directory in RES_DIR when omitted.
+        verbose (bool): Whether to let the climbs print their progress.
+        **local_search_options: Keyword arguments of `local_search_algorithm`, except
+                                `max_workers`.
+
+    Returns:
+        tuple:
+            - CityGrid: The best grid found by any climb.
+            - list[list[tuple]]: The shortest paths corresponding to the best grid.
+            - float: The score of the best grid.
+            - list[dict]: The trace of each start, in start order: its seed, the
+                          (iteration, score) of each improvement starting with its initial
+                          score, its best score, the number of iterations it ran, whether it
+                          was stopped early and its elapsed time.
+    """
+    if dir_path is None:
+        dir_path = os.path.join(RES_DIR, "multi_start")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    generator = random.Random(seed) if seed is not None else random
+    seeds = [generator.getrandbits(32) for _ in range(num_starts)]
+    incumbent = multiprocessing.Value("d", math.inf)
+    local_search_options = {**local_search_options, "max_workers": 1}  # One process per climb
+
+    outcomes = []
+    with ProcessPoolExecutor(max_workers, initializer=init_worker, initargs=(incumbent,)) as executor:
+        futures = [executor.submit(run_start, start, seeds[start], grid.copy(), os.path.join(dir_path, f"start_{start}"),
+                                   patience, stop_margin, local_search_options, verbose)
+                   for start in range(num_starts)]
+        for future in as_completed(futures):
+            best_grid, best_paths, trace = future.result()
+            outcomes.append((best_grid, best_paths, trace))
+            print(f"Start {trace['start'] + 1}: Best Score = {trace['best_score']} after {trace['iterations']} "
+                  f"iterations{' (stopped early)' if trace['stopped_early'] else ''}")
+    outcomes.sort(key=lambda outcome: outcome[2]["start"])
+
+    traces = [trace for _, _, trace in outcomes]
+    best_grid, best_paths, best_trace = min(outcomes, key=lambda outcome: outcome[2]["best_score"])
+    stopped = sum(trace["stopped_early"] for trace in traces)
+    print(f"Multi-start: best score {best_trace['best_score']} from start {best_trace['start'] + 1}, "
+          f"{stopped} of {num_starts} climbs stopped early")
+    return best_grid, best_paths, best_trace["best_score"], traces
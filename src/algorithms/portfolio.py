@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import random
+import time
+import traceback
+import numpy as np
+from algorithms.evaluation_cache import SharedFitnessStore, evaluation_cache, share_evaluations
+from algorithms.local_search import local_search_algorithm
+from algorithms.genetic_algo import genetic_algorithm
+from algorithms.island_model import collect_results
+from utils.helper import silenced_output
+from grid_constants import RES_DIR, POPULATION_SIZE
+
+PORTFOLIO_ALGORITHMS = ("local_search", "genetic_algorithm")
+
+
+def run_member(member, algorithm, initial_grid, options, seed, shared_entries, dir_path, verbose, results):
+    """
+    Runs one optimizer of a portfolio in its own process and reports its best grid.
+
+    Parameters:
+        member (int): The index of the member.
+        algorithm (str): "local_search" or "genetic_algorithm".
+        initial_grid (CityGrid): The initial grid shared by the portfolio.
+        options (dict): Keyword arguments of the optimizer.
+        seed (int): The seed of the member's `random` and NumPy generators.
+        shared_entries (dict): The shared mapping behind the member's `SharedFitnessStore`.
+        dir_path (str): The directory the member saves its visualizations to.
+        verbose (bool): Whether to let the optimizer print its progress.
+        results (multiprocessing.Queue): The queue the member reports its outcome on.
+    """
+    try:
+        random.seed(seed)
+        np.random.seed(seed)
+        evaluation_cache.clear()  # A forked member would start with the parent's entries
+        store = SharedFitnessStore(shared_entries)
+        start_time = time.perf_counter()
+        with silenced_output(verbose):
+            if algorithm == "local_search":
+                best_grid, best_paths, best_score = local_search_algorithm(
+                    initial_grid, **options, dir_path=dir_path, shared_store=store)
+            else:
+                share_evaluations(store)
+                best_grid, best_paths, best_score = genetic_algorithm(
+                    **options, initial_grid=initial_grid, dir_path=dir_path)
+                store.local_hits = evaluation_cache.hits
+        stats = {
+            "member": member,
+            "algorithm": algorithm,
+            "seed": seed,
+            "best_score": best_score,
+            "seconds": time.perf_counter() - start_time,
+            "evaluations": store.published,
+            "cache_hits": store.hits + store.local_hits,
+            "shared_hits": store.hits,
+            "scoring_hits": store.scoring_hits,
+            "hit_share": store.hit_share(),
+        }
+        results.put((member, best_grid, best_paths, stats))
+    except Exception:
+        results.put((member, None, None, {"member": member, "error": traceback.format_exc()}))
+
+
+def portfolio_search(initial_grid, local_search_options=None, genetic_algorithm_options=None, restarts=0,
+                     seed=None, dir_path=None, verbose=False):
+    """
+    Runs local search and the genetic algorithm concurrently on the same initial grid, one
+    process each, and keeps the best grid any of them found.
+
+    The members share their evaluations through a `SharedFitnessStore` held by a
+    `multiprocessing.Manager`: a grid one member evaluated is not searched again by
+    another, nor by itself once it dropped out of its own memo. Each member draws its seed
+    from the main random generator (or from `seed`). Members share their evaluations as
+    they run, so which of them evaluates a grid first depends on timing, but the scores,
+    and therefore the grids each member accepts, do not.
+
+    Parameters:
+        initial_grid (CityGrid): The initial grid every member optimizes.
+        local_search_options (dict): Keyword arguments of `local_search_algorithm`.
+        genetic_algorithm_options (dict): Keyword arguments of `genetic_algorithm`.
+        restarts (int): The number of extra runs of each algorithm, with their own seeds.
+        seed (int): The seed the member seeds are derived from, the main random generator
+                    being used when None.
+        dir_path (str): The directory the members save their visualizations to, one
+                        subdirectory each. A "portfolio" directory in RES_DIR when omitted.
+        verbose (bool): Whether to let the members print their progress.
+
+    Returns:
+        tuple:
+            - CityGrid: The best grid found by any member.
+            - list[list[tuple]]: The shortest paths corresponding to the best grid.
+            - float: The score of the best grid.
+            - dict: The report of the run: its wall-clock time, the total number of
+                    evaluations and cache hits, the share of the evaluations asked for
+                    that were cache hits, the number of scoring hits (grids whose scores
+                    came from the shared store but whose paths were still searched) and,
+                    under "members", per member statistics (its algorithm, seed, best score
+                    and elapsed time, its evaluations, cache hits, hits answered by the
+                    shared store and scoring hits, its hit share, and its best grid and
+                    paths).
+    """
+    if dir_path is None:
+        dir_path = os.path.join(RES_DIR, "portfolio")
+    algorithms = [algorithm for _ in range(restarts + 1) for algorithm in PORTFOLIO_ALGORITHMS]
+    options = {"local_search": {"max_iterations": 400, **(local_search_options or {})},
+               "genetic_algorithm": {"population_size": POPULATION_SIZE, "generations": 40, "mutation_rate": 0.2,
+                                     **(genetic_algorithm_options or {})}}
+    generator = random.Random(seed) if seed is not None else random
+    seeds = [generator.getrandbits(32) for _ in algorithms]
+
+    start_time = time.perf_counter()
+    with multiprocessing.Manager() as manager:
+        shared_entries = manager.dict()
+        results = multiprocessing.Queue()
+        processes = []
+        for member, algorithm in enumerate(algorithms):
+            process = multiprocessing.Process(
+                target=run_member,
+                args=(member, algorithm, initial_grid, options[algorithm], seeds[member], shared_entries,
+                      os.path.join(dir_path, f"{algorithm}_{member}"), verbose, results))
+            process.start()
+            processes.append(process)
+
+        # Drain the results before joining, so no member blocks on a full queue
+        outcomes = collect_results(processes, results, "Portfolio member")
+        for process in processes:
+            process.join()
+    wall_clock = time.perf_counter() - start_time
+    outcomes.sort(key=lambda outcome: outcome[0])
+
+    members = []
+    for _, best_grid, best_paths, stats in outcomes:
+        members.append({**stats, "grid": best_grid, "paths": best_paths})
+    evaluations = sum(stats["evaluations"] for stats in members)
+    cache_hits = sum(stats["cache_hits"] for stats in members)
+    scoring_hits = sum(stats["scoring_hits"] for stats in members)
+    asked = cache_hits + scoring_hits + evaluations
+    report = {
+        "wall_clock": wall_clock,
+        "evaluations": evaluations,
+        "cache_hits": cache_hits,
+        "scoring_hits": scoring_hits,
+        "hit_share": cache_hits / asked if asked else 0.0,
+        "members": members,
+    }
+
+    for stats in members:
+        print(f"{stats['algorithm']} {stats['member'] + 1}: Best Score = {stats['best_score']} "
+              f"({stats['seconds']:.1f}s, {stats['evaluations']} evaluations, {stats['cache_hits']} cache hits "
+              f"of which {stats['shared_hits']} shared, {stats['scoring_hits']} shared scores still searched for "
+              f"their paths, {stats['hit_share']:.0%} hit share)")
+    print(f"Portfolio: {wall_clock:.1f}s wall-clock, {evaluations} evaluations, {cache_hits} cache hits, "
+          f"{scoring_hits} scoring hits ({report['hit_share']:.0%} of the evaluations asked for)")
+
+    best = min(members, key=lambda stats: stats["best_score"])
+    return best["grid"], best["paths"], best["best_score"], report
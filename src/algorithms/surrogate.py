@@ -0,0 +1,239 @@
+import math
+from collections import deque
+import numpy as np
+
+FEATURE_NAMES = ("building_to_intersection", "building_to_service", "counted_intersections",
+                 "road_row_share")
+RIDGE = 1e-3  # Regularization keeping the fit stable while features are still collinear
+
+
+def rank_data(values):
+    """
+    Ranks values from 0 upwards, tied values sharing the average of their ranks.
+
+    Parameters:
+        values (numpy.ndarray): The values to rank.
+
+    Returns:
+        numpy.ndarray: The rank of each value.
+    """
+    values = np.asarray(values, dtype=float)
+    order = values.argsort(kind="stable")
+    sorted_values = values[order]
+    # Start and end of each run of tied values
+    boundaries = np.flatnonzero(np.diff(sorted_values)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(values)]))
+    ranks = np.empty(len(values))
+    ranks[order] = np.repeat((starts + ends - 1) / 2, ends - starts)
+    return ranks
+
+
+def rank_correlation(first, second):
+    """
+    Spearman's rank correlation of two sequences of the same length.
+
+    Returns:
+        float: The correlation, NaN when there are fewer than two values or one of the
+               sequences is constant.
+    """
+    if len(first) < 2:
+        return float('nan')
+    first_ranks, second_ranks = rank_data(first), rank_data(second)
+    first_ranks -= first_ranks.mean()
+    second_ranks -= second_ranks.mean()
+    norm = math.sqrt((first_ranks ** 2).sum() * (second_ranks ** 2).sum())
+    return float((first_ranks * second_ranks).sum() / norm) if norm else float('nan')
+
+
+class SurrogateModel:
+    """
+    A cheap estimate of the average `calculate_fitness` score of a grid, used to rank
+    candidate grids before they are evaluated exactly.
+
+    A grid is described by a few features computed from its intersection positions alone,
+    without any search (see `features`), and the estimate is a linear model of them,
+    refitted by ridge regression on the most recent exact evaluations it was given. Until
+    it has seen `min_samples` evaluations the model is not ready and does not rank.
+
+    Every exact evaluation given to a ready model is first predicted, so the reported rank
+    correlation compares estimates with scores the model had not been fitted on.
+
+    Attributes:
+        min_samples (int): The number of evaluations needed before the model ranks grids.
+        max_samples (int): The number of most recent evaluations the model is fitted on.
+        predictions (list[float]): The out-of-sample estimates of the evaluated grids.
+        exact_scores (list[float]): Their exact scores.
+    """
+
+    def __init__(self, grid, min_samples=20, max_samples=512):
+        """
+        Parameters:
+            grid (CityGrid): Any grid of the run, giving the buildings and emergency services
+                             shared by every grid the model sees.
+            min_samples (int): The number of evaluations needed before the model ranks grids.
+            max_samples (int): The number of most recent evaluations the model is fitted on.
+        """
+        self.height, self.width = grid.shape
+        self.buildings = np.array(grid.buildings(), dtype=int).reshape(-1, 2)
+        # Routes end next to a service, in the cell right above or below it
+        goal_cells = [(y + step, x) for y, x in grid.emergency_services() for step in (-1, 1)
+                      if 0 <= y + step < self.height]
+        self.goal_cells = np.array(goal_cells, dtype=int).reshape(-1, 2)
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=max_samples)
+        self._weights = None
+        self._fitted = True
+        self.predictions = []
+        self.exact_scores = []
+        self._batch_correlations = []
+
+    @property
+    def ready(self):
+        """
+        Returns:
+            bool: Whether the model has seen enough evaluations to rank grids.
+        """
+        return len(self._samples) >= self.min_samples
+
+    def features(self, grid):
+        """
+        Describes a grid by:
+          - the mean Manhattan distance from each building to its nearest intersection,
+          - the mean length of the shortest building-intersection-service detour, a proxy of
+            the route length,
+          - the mean number of cells `calculate_fitness` counts as intersections inside the
+            bounding box of each building and its nearest service, a proxy of the
+            intersection penalty (a node (x, y) counts when the cell at row x, column y is
+            an interior intersection),
+          - the share of intersections in odd (road) rows.
+
+        Parameters:
+            grid (CityGrid | Genome): The grid to describe.
+
+        Returns:
+            numpy.ndarray: The feature vector, with a leading 1 for the intercept.
+        """
+        intersections = np.array(grid.intersections(), dtype=int).reshape(-1, 2)
+        buildings, goal_cells = self.buildings, self.goal_cells
+        if not len(intersections) or not len(buildings) or not len(goal_cells):
+            return np.array([1.0, self.height + self.width, 2 * (self.height + self.width), 0.0, 0.0])
+
+        to_intersection = np.abs(buildings[:, np.newaxis] - intersections[np.newaxis]).sum(axis=2)
+        intersection_to_goal = np.abs(intersections[:, np.newaxis] - goal_cells[np.newaxis]).sum(axis=2).min(axis=1)
+        detour = (to_intersection + intersection_to_goal[np.newaxis]).min(axis=1)
+
+        counted = np.zeros((self.height + 1, self.width + 1), dtype=int)
+        side = min(self.height, self.width)
+        rows, columns = intersections[:, 0], intersections[:, 1]
+        inside = (rows < side - 1) & (columns < side - 1)
+        # The cell at row y, column x is counted when a route passes the node at row x, column y
+        np.add.at(counted, (columns[inside] + 1, rows[inside] + 1), 1)
+        counted = counted.cumsum(axis=0).cumsum(axis=1)
+        nearest_goals = goal_cells[np.abs(buildings[:, np.newaxis] - goal_cells[np.newaxis]).sum(axis=2).argmin(axis=1)]
+        top, bottom = np.minimum(buildings[:, 0], nearest_goals[:, 0]), np.maximum(buildings[:, 0], nearest_goals[:, 0]) + 1
+        left, right = np.minimum(buildings[:, 1], nearest_goals[:, 1]), np.maximum(buildings[:, 1], nearest_goals[:, 1]) + 1
+        in_boxes = counted[bottom, right] - counted[top, right] - counted[bottom, left] + counted[top, left]
+
+        return np.array([1.0, to_intersection.min(axis=1).mean(), detour.mean(), in_boxes.mean(),
+                         (rows % 2 == 1).mean()])
+
+    def predict(self, grids):
+        """
+        Parameters:
+            grids (list[CityGrid | Genome]): The grids to estimate.
+
+        Returns:
+            numpy.ndarray: The estimated average fitness score of each grid, NaN while the
+                           model is not ready.
+        """
+        if not self.ready:
+            return np.full(len(grids), np.nan)
+        self._fit()
+        return np.array([self.features(grid) @ self._weights for grid in grids])
+
+    def observe(self, grids, scores, cutoff=None):
+        """
+        Adds exact evaluations to the samples of the model. When the model is ready, the
+        grids are predicted first and the estimates kept for the rank correlation report.
+
+        Parameters:
+            grids (list[CityGrid | Genome]): Grids evaluated exactly.
+            scores (list[float]): Their exact average fitness scores, infinite for the
+                                  evaluations given up.
+            cutoff (float): The score the given-up evaluations were known to be no better
+                            than, learned as their score. They are ignored without one, so
+                            the samples would only hold the grids that were good enough.
+        """
+        if cutoff is not None:
+            scores = [score if math.isfinite(score) else cutoff for score in scores]
+        evaluated = [(grid, score) for grid, score in zip(grids, scores) if math.isfinite(score)]
+        if not evaluated:
+            return
+        grids, scores = zip(*evaluated)
+        features = [self.features(grid) for grid in grids]
+        if self.ready:
+            self._fit()
+            predictions = [float(row @ self._weights) for row in features]
+            self.predictions.extend(predictions)
+            self.exact_scores.extend(scores)
+            correlation = rank_correlation(predictions, scores)
+            if not math.isnan(correlation):
+                self._batch_correlations.append(correlation)
+        self._samples.extend(zip(features, scores))
+        self._fitted = False
+
+    def _fit(self):
+        if self._fitted:
+            return
+        features = np.array([row for row, _ in self._samples])
+        scores = np.array([score for _, score in self._samples])
+        regularization = RIDGE * len(scores) * np.eye(features.shape[1])
+        regularization[0, 0] = 0  # The intercept is not shrunk
+        self._weights = np.linalg.solve(features.T @ features + regularization, features.T @ scores)
+        self._fitted = True
+
+    def rank_correlation(self):
+        """
+        Returns:
+            float: The rank correlation of the out-of-sample estimates with the exact scores
+                   over the whole run, NaN before two grids were predicted.
+        """
+        return rank_correlation(self.predictions, self.exact_scores)
+
+    def batch_rank_correlation(self):
+        """
+        Returns:
+            float: The mean rank correlation within each group of grids evaluated together,
+                   which is the ranking pre-screening relies on. NaN when no group had two
+                   distinct scores.
+        """
+        return float(np.mean(self._batch_correlations)) if self._batch_correlations else float('nan')
+
+    def report(self):
+        """
+        Returns:
+            str: A one-line summary of how well the estimates ranked the evaluated grids.
+        """
+        return (f"Surrogate: rank correlation {self.rank_correlation():.2f} over {len(self.predictions)} "
+                f"predicted grids ({self.batch_rank_correlation():.2f} within evaluation batches)")
+
+
+def prescreen(model, grids, fraction):
+    """
+    Keeps the most promising grids according to the surrogate model.
+
+    Parameters:
+        model (SurrogateModel): The surrogate model.
+        grids (list[CityGrid | Genome]): The candidate grids.
+        fraction (float): The share of the grids to keep, at least one grid being kept.
+
+    Returns:
+        list[int]: The indexes of the kept grids, in their original order. All of them when
+                   the fraction is 1 or more or the model is not ready yet.
+    """
+    if fraction >= 1 or not model.ready or not grids:
+        return list(range(len(grids)))
+    kept = max(1, math.ceil(fraction * len(grids)))
+    estimates = model.predict(grids)
+    return sorted(np.argsort(estimates, kind="stable")[:kept].tolist())
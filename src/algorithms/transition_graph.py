@@ -0,0 +1,294 @@
+from array import array
+from utils.helper import is_cell_in_margins
+
+# Directions in alphabetical order, so that comparing state ids compares states the way
+# `a_star` compares ((x, y), direction) tuples
+DIRECTIONS = ("down", "left", "right", "up")
+DOWN, LEFT, RIGHT, UP = range(4)
+NO_DIRECTION = 4  # Direction index of a start node
+
+DIRECTION_OFFSETS = ((0, 1), (-1, 0), (1, 0), (0, -1))
+
+# Kinds of cells, as far as the transition rules of `get_possible_directions` are concerned
+INTERSECTION = 0  # Value 3: every direction is allowed
+EVEN_ROW_ROAD = 1  # Value 0 in an even row: vertical moves go straight on
+OTHER_CELL = 2  # Everything else: up/right turn right, down/left turn left
+
+# Allowed moves, indexed by [cell kind][incoming direction]
+TRANSITIONS = (
+    ((DOWN, LEFT, RIGHT, UP),) * 5,
+    ((DOWN,), (LEFT,), (RIGHT,), (UP,), (UP, DOWN)),
+    ((LEFT,), (LEFT,), (RIGHT,), (RIGHT,), (UP, DOWN)),
+)
+
+ROW_CAPACITY = 4  # No state has more than four successors or four predecessors
+
+
+class TransitionGraph:
+    """
+    The ((x, y), direction) state graph of `get_possible_directions`, compiled once per grid
+    layout into flat arrays.
+
+    A cell (x, y) has the index x * height + y and a search state the id
+    cell_index * 4 + direction, with directions numbered as in `DIRECTIONS`. The start node
+    of a cell, which has no direction yet, gets the extra id state_count + cell_index.
+
+    Moves are stored in CSR form twice: forward (`out_*`, rows for every state and start
+    node) and reversed (`in_*`, rows for every state). Row s holds the entries
+    indptr[s] to indptr[s] + degree[s] of the `indices` (the other state) and `costs`
+    (the `get_step_cost` of the move) arrays. Every row reserves `ROW_CAPACITY` slots,
+    unused ones holding -1, so moving an intersection rewrites the few rows around it in
+    place and never shifts the rest of the graph.
+
+    Attributes:
+        height, width (int): The grid dimensions.
+        cell_count (int): The number of cells.
+        state_count (int): The number of directed states, 4 * cell_count.
+        label_base (int): A number larger than any path length, used to pack a
+                          (cost, length) label into the single int cost * label_base + length.
+        values (bytearray): The value of each cell.
+        kinds (bytearray): The transition kind of each cell.
+        step_costs (array): The cost of leaving each cell.
+        neighbors (array): For each cell * 4 + direction, the index of the neighboring cell
+                           in that direction, or -1 outside the grid.
+    """
+
+    def __init__(self, grid):
+        """
+        Parameters:
+            grid (CityGrid | list[list[int]]): The grid to compile.
+        """
+        self.height, self.width = len(grid), len(grid[0])
+        self.cell_count = self.height * self.width
+        self.state_count = 4 * self.cell_count
+        self.label_base = self.state_count + 2
+        self._margin_cost = self.height // 8
+
+        self.values = bytearray(self.cell_count)
+        self.kinds = bytearray(self.cell_count)
+        self.step_costs = array("i", [0]) * self.cell_count
+        self.neighbors = array("i", [-1]) * (4 * self.cell_count)
+        for x in range(self.width):
+            for y in range(self.height):
+                cell = x * self.height + y
+                for direction, (dx, dy) in enumerate(DIRECTION_OFFSETS):
+                    if 0 <= x + dx < self.width and 0 <= y + dy < self.height:
+                        self.neighbors[cell * 4 + direction] = (x + dx) * self.height + y + dy
+
+        source_count = self.state_count + self.cell_count
+        self.out_indptr = array("i", range(0, ROW_CAPACITY * source_count, ROW_CAPACITY))
+        self.out_degree = bytearray(source_count)
+        self.out_indices = array("i", [-1]) * (ROW_CAPACITY * source_count)
+        self.out_costs = array("i", [0]) * (ROW_CAPACITY * source_count)
+        self.in_indptr = array("i", range(0, ROW_CAPACITY * self.state_count, ROW_CAPACITY))
+        self.in_degree = bytearray(self.state_count)
+        self.in_indices = array("i", [-1]) * (ROW_CAPACITY * self.state_count)
+        self.in_costs = array("i", [0]) * (ROW_CAPACITY * self.state_count)
+
+        self._buildings = set()
+        self._emergency_services = set()
+        for y in range(self.height):
+            for x in range(self.width):
+                self._set_cell(grid, x, y)
+        for cell in range(self.cell_count):
+            self._write_out_rows(cell)
+        for state in range(self.state_count):
+            self._write_in_row(state)
+
+    def _set_cell(self, grid, x, y):
+        """
+        Reads the value of a cell from the grid and derives its kind and step cost.
+        """
+        cell = x * self.height + y
+        value = grid[y][x]
+        self.values[cell] = value
+        if value == 3:
+            self.kinds[cell] = INTERSECTION
+        elif y % 2 == 0 and value == 0:
+            self.kinds[cell] = EVEN_ROW_ROAD
+        else:
+            self.kinds[cell] = OTHER_CELL
+        # Same rule as `get_step_cost`
+        if value == 3 and is_cell_in_margins(grid, (x, y)):
+            self.step_costs[cell] = self._margin_cost
+        else:
+            self.step_costs[cell] = 1
+
+        for cells in (self._buildings, self._emergency_services):
+            cells.discard(cell)
+        if value == 1:
+            self._buildings.add(cell)
+        elif value == 2:
+            self._emergency_services.add(cell)
+
+    def _write_out_rows(self, cell):
+        """
+        Rewrites the forward rows of the four states and the start node of a cell.
+        """
+        transitions = TRANSITIONS[self.kinds[cell]]
+        cost = self.step_costs[cell]
+        for direction in range(5):
+            source = self.state_count + cell if direction == NO_DIRECTION else cell * 4 + direction
+            offset = self.out_indptr[source]
+            degree = 0
+            for move in transitions[direction]:
+                neighbor_cell = self.neighbors[cell * 4 + move]
+                if neighbor_cell < 0:
+                    continue
+                self.out_indices[offset + degree] = neighbor_cell * 4 + move
+                self.out_costs[offset + degree] = cost
+                degree += 1
+            self.out_degree[source] = degree
+            for edge in range(offset + degree, offset + ROW_CAPACITY):
+                self.out_indices[edge] = -1
+                self.out_costs[edge] = 0
+
+    def _write_in_row(self, state):
+        """
+        Rewrites the reversed row of a state. All its predecessors lie on the cell behind it.
+        """
+        cell, move = divmod(state, 4)
+        offset = self.in_indptr[state]
+        degree = 0
+        predecessor_cell = self.neighbors[cell * 4 + (3 - move)]  # Opposite direction
+        if predecessor_cell >= 0:
+            transitions = TRANSITIONS[self.kinds[predecessor_cell]]
+            cost = self.step_costs[predecessor_cell]
+            for direction in range(4):
+                if move in transitions[direction]:
+                    self.in_indices[offset + degree] = predecessor_cell * 4 + direction
+                    self.in_costs[offset + degree] = cost
+                    degree += 1
+        self.in_degree[state] = degree
+        for edge in range(offset + degree, offset + ROW_CAPACITY):
+            self.in_indices[edge] = -1
+            self.in_costs[edge] = 0
+
+    def update_cells(self, grid, changed_cells):
+        """
+        Patches the graph in place after some cells of its grid changed value, for instance
+        when an intersection moved. Only the rows of states on or next to the changed cells
+        are rewritten.
+
+        Parameters:
+            grid (CityGrid | list[list[int]]): The grid after the change.
+            changed_cells (list[tuple]): The (y, x) positions of the changed cells.
+        """
+        cells = []
+        for y, x in changed_cells:
+            self._set_cell(grid, x, y)
+            cells.append(x * self.height + y)
+        for cell in cells:
+            self._write_out_rows(cell)
+            for move in range(4):
+                neighbor_cell = self.neighbors[cell * 4 + move]
+                if neighbor_cell >= 0:
+                    self._write_in_row(neighbor_cell * 4 + move)
+
+    def copy(self):
+        """
+        Returns an independent copy of the graph, to be patched for a neighboring grid.
+
+        Returns:
+            TransitionGraph: The copied graph.
+        """
+        new_graph = TransitionGraph.__new__(TransitionGraph)
+        new_graph.__dict__.update(self.__dict__)
+        # The dimensions, neighbor table and row offsets never change and are shared
+        for name in ("values", "kinds", "step_costs", "out_degree", "out_indices", "out_costs",
+                     "in_degree", "in_indices", "in_costs"):
+            setattr(new_graph, name, getattr(self, name)[:])
+        new_graph._buildings = set(self._buildings)
+        new_graph._emergency_services = set(self._emergency_services)
+        return new_graph
+
+    def encode(self, node):
+        """
+        Converts a ((x, y), direction) node into its state id. Nodes without a direction
+        are start nodes.
+
+        Parameters:
+            node (tuple): The node as ((x, y), direction), direction being a string or None.
+
+        Returns:
+            int: The state id.
+        """
+        (x, y), direction = node
+        cell = x * self.height + y
+        if direction is None:
+            return self.state_count + cell
+        return cell * 4 + DIRECTIONS.index(direction)
+
+    def decode(self, state):
+        """
+        Converts a state id back into a ((x, y), direction) node.
+
+        Parameters:
+            state (int): The state id.
+
+        Returns:
+            tuple: The node as ((x, y), direction).
+        """
+        if state >= self.state_count:
+            return (divmod(state - self.state_count, self.height), None)
+        cell, direction = divmod(state, 4)
+        return (divmod(cell, self.height), DIRECTIONS[direction])
+
+    def buildings(self):
+        """
+        Returns:
+            list[int]: The cell indexes of all buildings, in the row-major order of the grid.
+        """
+        return sorted(self._buildings, key=lambda cell: (cell % self.height, cell))
+
+    def emergency_services(self):
+        """
+        Returns:
+            list[int]: The cell indexes of all emergency services, in the row-major order
+                       of the grid.
+        """
+        return sorted(self._emergency_services, key=lambda cell: (cell % self.height, cell))
+
+    def goal_states(self):
+        """
+        Lists, for every emergency service, the state ids in which `a_star` would stop.
+        A state is a goal state when it sits in the column of the emergency service and either
+        enters the cell above it moving right, enters the cell below it moving left, or is an
+        intersection directly above or below it.
+
+        Returns:
+            list[list[int]]: One list of goal state ids per emergency service, in the
+                             row-major order of the services.
+        """
+        goal_states = []
+        for service_cell in self.emergency_services():
+            x, y = divmod(service_cell, self.height)
+            service_goal_states = []
+            for cell_y, entering_direction in ((y - 1, RIGHT), (y + 1, LEFT)):
+                if not 0 <= cell_y < self.height:
+                    continue
+                cell = x * self.height + cell_y
+                if self.values[cell] == 3:
+                    service_goal_states.extend(cell * 4 + direction for direction in range(4))
+                else:
+                    service_goal_states.append(cell * 4 + entering_direction)
+            goal_states.append(service_goal_states)
+        return goal_states
+
+    def counted_cells(self):
+        """
+        Marks the cells whose nodes `calculate_fitness` counts as intersections. It reads a
+        node ((x, y), direction) as grid[x][y] and only counts it away from the border, so a
+        cell is counted when 0 < x < min(height - 1, width), 0 < y < min(width - 1, height)
+        and grid[x][y] is an intersection. On a non-square grid these are not the
+        intersections of the cells themselves.
+
+        Returns:
+            bytearray: 1 for each counted cell, 0 for the others, by cell index.
+        """
+        counted = bytearray(self.cell_count)
+        for x in range(1, min(self.height - 1, self.width)):
+            for y in range(1, min(self.width - 1, self.height)):
+                if self.values[y * self.height + x] == 3:
+                    counted[x * self.height + y] = 1
+        return counted
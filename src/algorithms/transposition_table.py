@@ -0,0 +1,118 @@
+import random
+from collections import OrderedDict
+
+
+class TranspositionTable:
+    """
+    A bounded memo of the scores of grid configurations, keyed by Zobrist hashes of their
+    interior intersections.
+
+    Every cell gets a random 64-bit key and the hash of a grid is the XOR of the keys of its
+    interior intersections. Moving, adding or removing an intersection toggles the key of the
+    cells involved, so the hash of a grid that differs from a hashed one in a few cells is
+    updated in O(changed cells) instead of being recomputed. Buildings and emergency
+    services are not hashed: a table must only be used for grids sharing them, like the
+    configurations of one hill climb.
+
+    Lookups and stores are O(1). Beyond `max_entries` the least recently used entry is
+    evicted. Two configurations sharing a hash would share a score, which with 64-bit keys
+    is vanishingly unlikely over a climb.
+
+    Attributes:
+        max_entries (int): The number of configurations kept before evicting.
+        hits (int): The number of lookups answered from the table.
+        misses (int): The number of lookups of unknown configurations.
+        evictions (int): The number of entries dropped to respect `max_entries`.
+    """
+
+    def __init__(self, shape, max_entries=65536, seed=0):
+        """
+        Parameters:
+            shape (tuple): The (height, width) of the grids.
+            max_entries (int): The number of configurations kept before evicting.
+            seed (int): The seed of the cell keys. They come from their own generator, so
+                        creating a table does not consume the main random stream.
+        """
+        height, width = shape
+        generator = random.Random(seed)
+        self._cell_keys = [[generator.getrandbits(64) for _ in range(width)] for _ in range(height)]
+        self._interior = (height, width)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hash_grid(self, grid):
+        """
+        Parameters:
+            grid (CityGrid): The grid to hash.
+
+        Returns:
+            int: The Zobrist hash of the grid's interior intersections.
+        """
+        configuration_hash = 0
+        for y, x in grid.intersections():
+            configuration_hash ^= self._cell_keys[y][x]
+        return configuration_hash
+
+    def update_hash(self, configuration_hash, changed_cells):
+        """
+        Updates a hash for cells that gained or lost an intersection.
+
+        Parameters:
+            configuration_hash (int): The hash of the original grid.
+            changed_cells (list[tuple]): The (y, x) positions that differ between the
+                                         original and the new grid, as listed by
+                                         `CityGrid.changed_cells`.
+
+        Returns:
+            int: The hash of the new grid.
+        """
+        height, width = self._interior
+        for y, x in changed_cells:
+            if 0 < y < height - 1 and 0 < x < width - 1:
+                configuration_hash ^= self._cell_keys[y][x]
+        return configuration_hash
+
+    def lookup(self, configuration_hash):
+        """
+        Parameters:
+            configuration_hash (int): The hash of a configuration.
+
+        Returns:
+            float: The stored score of the configuration, or None if it is unknown.
+        """
+        score = self._entries.get(configuration_hash)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(configuration_hash)
+        return score
+
+    def store(self, configuration_hash, score):
+        """
+        Stores the score of a configuration, evicting the least recently used entries
+        beyond `max_entries`.
+
+        Parameters:
+            configuration_hash (int): The hash of the configuration.
+            score (float): Its score.
+        """
+        self._entries[configuration_hash] = score
+        self._entries.move_to_end(configuration_hash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self):
+        """
+        Returns:
+            float: The share of lookups answered from the table, 0 when nothing was looked up.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,285 @@
+import argparse
+import contextlib
+import heapq
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from algorithms.a_star_algo import a_star, a_star_multiple_goals, find_all_shortest_paths, find_all_path_costs
+from algorithms.transition_graph import TransitionGraph
+from algorithms.hierarchical_search import HierarchicalGraph
+from algorithms.cost_function import calculate_fitness
+from utils.helper import generate_neighbor, best_path_retention, silenced_output
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from grid_constants import RES_DIR
+
+BENCHMARKS = ("a_star", "a_star_multiple_goals", "a_star_indexed", "a_star_multiple_goals_indexed",
+              "find_all_shortest_paths", "find_all_path_costs", "find_all_path_costs_hierarchical",
+              "find_all_path_costs_hierarchical_inexact", "calculate_fitness", "generate_neighbor", "best_path_retention",
+              "place_intersections_in_every_column_randomly")
+SCENARIO_FIELDS = ("benchmark", "size", "buildings", "services")
+
+
+def benchmark_operations(size, num_buildings, num_emergency_services, seed):
+    """
+    Builds the fixed inputs of every benchmark for one scenario.
+
+    Parameters:
+        size (int): The width and height of the grid before its border.
+        num_buildings (int): The number of buildings.
+        num_emergency_services (int): The number of emergency services.
+        seed (int): The seed of the grid and of the intersection placements.
+
+    Returns:
+        dict: The operation timed by each benchmark, a function without arguments.
+    """
+    random.seed(seed)
+    base_grid = generate_city_grid_with_only_bordering_intersections(size, size, num_buildings, num_emergency_services)
+    random.seed(seed)
+    grid = place_intersections_in_every_column_randomly(base_grid.copy())
+    graph = TransitionGraph(grid)
+    paths = find_all_shortest_paths(grid)
+    neighbor = generate_neighbor(grid)
+    neighbor_paths = find_all_shortest_paths(neighbor)
+    (building_y, building_x), (service_y, service_x) = grid.buildings()[0], grid.emergency_services()[0]
+    start, goal = ((building_x, building_y), None), ((service_x, service_y), None)
+
+    return {
+        "a_star": lambda: a_star(grid, start, goal),
+        "a_star_multiple_goals": lambda: a_star_multiple_goals(grid, start),
+        # The same searches over the integer states of a graph compiled once per grid
+        "a_star_indexed": lambda: a_star(grid, start, goal, graph),
+        "a_star_multiple_goals_indexed": lambda: a_star_multiple_goals(grid, start, graph),
+        "find_all_shortest_paths": lambda: find_all_shortest_paths(grid),
+        # The hierarchical graph caches its labels, so each call builds it over the compiled graph
+        "find_all_path_costs": lambda: find_all_path_costs(grid, graph),
+        "find_all_path_costs_hierarchical": lambda: find_all_path_costs(grid, HierarchicalGraph(grid, graph=graph)),
+        "find_all_path_costs_hierarchical_inexact":
+            lambda: find_all_path_costs(grid, HierarchicalGraph(grid, graph=graph, exact=False)),
+        "calculate_fitness": lambda: calculate_fitness(grid, paths),
+        "generate_neighbor": lambda: generate_neighbor(grid),
+        "best_path_retention": lambda: best_path_retention(grid, neighbor, paths, neighbor_paths),
+        # Intersections are placed in place, so every call works on a fresh copy
+        "place_intersections_in_every_column_randomly":
+            lambda: place_intersections_in_every_column_randomly(base_grid.copy()),
+    }
+
+
+@contextlib.contextmanager
+def count_node_expansions():
+    """
+    Counts the nodes expanded by the searches run inside the context, as the number of
+    entries popped from their priority queues.
+
+    Yields:
+        list[int]: A one-element list holding the count, updated as the searches run.
+    """
+    count = [0]
+    heappop = heapq.heappop
+
+    def counting_heappop(heap):
+        count[0] += 1
+        return heappop(heap)
+
+    heapq.heappop = counting_heappop
+    try:
+        yield count
+    finally:
+        heapq.heappop = heappop
+
+
+def measure(operation, seed, min_time, repeat):
+    """
+    Times an operation and measures its peak memory and node expansions.
+
+    The operation is called in rounds of a fixed number of calls, sized so that a round
+    lasts at least `min_time`, and the fastest of `repeat` rounds is kept. Memory and node
+    expansions are measured over one more call each, outside the timed rounds. The random
+    generator is reseeded before every round and measurement.
+
+    Parameters:
+        operation (callable): The operation to measure.
+        seed (int): The seed of the random generator.
+        min_time (float): The minimum duration of a timed round, in seconds.
+        repeat (int): The number of timed rounds.
+
+    Returns:
+        dict: The calls per second of the fastest round, the seconds per call, the number
+              of calls per round, the peak memory allocated by one call in bytes and the
+              number of nodes it expanded.
+    """
+    random.seed(seed)
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        random.seed(seed)
+        start = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        best = min(best, time.perf_counter() - start)
+
+    random.seed(seed)
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    random.seed(seed)
+    with count_node_expansions() as expansions:
+        operation()
+
+    return {
+        "ops_per_sec": calls / best,
+        "seconds_per_op": best / calls,
+        "calls_per_round": calls,
+        "peak_memory_bytes": peak_memory,
+        "node_expansions": expansions[0],
+    }
+
+
+def run_benchmarks(sizes, populations, benchmarks=BENCHMARKS, seed=0, min_time=0.2, repeat=5):
+    """
+    Runs the benchmarks over every combination of grid size and population.
+
+    Parameters:
+        sizes (list[int]): The grid sizes, before the border.
+        populations (list[tuple]): The (buildings, emergency services) counts.
+        benchmarks (list[str]): The benchmarks to run, among `BENCHMARKS`.
+        seed (int): The seed of the grids and of the random operations.
+        min_time (float): The minimum duration of a timed round, in seconds.
+        repeat (int): The number of timed rounds.
+
+    Returns:
+        dict: The run, with the environment and settings under "meta" and one entry per
+              benchmark and scenario under "results".
+    """
+    results = []
+    for size in sizes:
+        for num_buildings, num_emergency_services in populations:
+            try:
+                operations = benchmark_operations(size, num_buildings, num_emergency_services, seed)
+            except ValueError as error:
+                print(f"Skipping size {size} with {num_buildings} buildings and "
+                      f"{num_emergency_services} services: {error}")
+                continue
+            for benchmark in benchmarks:
+                with silenced_output():
+                    result = measure(operations[benchmark], seed, min_time, repeat)
+                results.append({"benchmark": benchmark, "size": size, "buildings": num_buildings,
+                                "services": num_emergency_services, **result})
+                print(f"{benchmark:<46} size {size:>4} {num_buildings:>4}/{num_emergency_services:<3} "
+                      f"{result['ops_per_sec']:>12.1f} ops/s {result['peak_memory_bytes'] / 1024:>10.1f} KiB "
+                      f"{result['node_expansions']:>9} expansions")
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": seed,
+            "min_time": min_time,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare_results(base, new, threshold=0.1):
+    """
+    Compares two benchmark runs scenario by scenario.
+
+    Parameters:
+        base (dict): The reference run, as saved by `run_benchmarks`.
+        new (dict): The run to compare with it.
+        threshold (float): The relative slowdown beyond which a scenario is a regression.
+
+    Returns:
+        tuple:
+            - list[dict]: For each scenario found in both runs, its fields, the speedup
+                          (new ops/sec over base ops/sec) and the ratios of peak memory and
+                          node expansions, new over base.
+            - list[dict]: The compared scenarios that are regressions.
+    """
+    def key(result):
+        return tuple(result[field] for field in SCENARIO_FIELDS)
+
+    def ratio(new_value, base_value):
+        return new_value / base_value if base_value else (1.0 if new_value == base_value else float('inf'))
+
+    base_results = {key(result): result for result in base["results"]}
+    comparisons = []
+    for result in new["results"]:
+        base_result = base_results.get(key(result))
+        if base_result is None:
+            continue
+        comparisons.append({
+            **{field: result[field] for field in SCENARIO_FIELDS},
+            "speedup": result["ops_per_sec"] / base_result["ops_per_sec"],
+            "memory_ratio": ratio(result["peak_memory_bytes"], base_result["peak_memory_bytes"]),
+            "expansions_ratio": ratio(result["node_expansions"], base_result["node_expansions"]),
+        })
+    regressions = [comparison for comparison in comparisons if comparison["speedup"] < 1 - threshold]
+    return comparisons, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the optimization hot paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and save the results to JSON.")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[15, 31, 63], help="The grid sizes.")
+    run_parser.add_argument("--populations", nargs="+", default=["18:4", "72:16"],
+                            help="The BUILDINGS:SERVICES counts, each run at every size.")
+    run_parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="The minimum duration of a timed round.")
+    run_parser.add_argument("--repeat", type=int, default=5, help="The number of timed rounds, the fastest is kept.")
+    run_parser.add_argument("--output", default=os.path.join(RES_DIR, "benchmarks.json"))
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files.")
+    compare_parser.add_argument("base", help="The reference results.")
+    compare_parser.add_argument("new", help="The results to compare with the reference.")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="The relative slowdown reported as a regression.")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        populations = [tuple(int(count) for count in population.split(":")) for population in args.populations]
+        run = run_benchmarks(args.sizes, populations, args.benchmarks, args.seed, args.min_time, args.repeat)
+        with open(args.output, "w") as results_file:
+            json.dump(run, results_file, indent=2)
+        print(f"Saved {len(run['results'])} results to {args.output}")
+        return
+
+    with open(args.base) as base_file, open(args.new) as new_file:
+        comparisons, regressions = compare_results(json.load(base_file), json.load(new_file), args.threshold)
+    for comparison in comparisons:
+        flag = "  REGRESSION" if comparison in regressions else ""
+        print(f"{comparison['benchmark']:<46} size {comparison['size']:>4} "
+              f"{comparison['buildings']:>4}/{comparison['services']:<3} {comparison['speedup']:>7.2f}x speed "
+              f"{comparison['memory_ratio']:>6.2f}x memory {comparison['expansions_ratio']:>6.2f}x expansions{flag}")
+    print(f"{len(regressions)} regressions out of {len(comparisons)} compared benchmarks")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    """
+    Entry point for the script. Run `python benchmarks.py run` to benchmark, then
+    `python benchmarks.py compare BASE NEW` to compare two result files.
+    """
+    main()
@@ -0,0 +1,243 @@
+import csv
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections
+from utils.helper import silenced_output
+from algorithms.local_search import local_search_algorithm
+from algorithms.genetic_algo import genetic_algorithm
+from algorithms.portfolio import portfolio_search
+from grid_constants import RES_DIR, POPULATION_SIZE
+
+RESULT_FIELDS = ("trial", "seed", "local_search_best_score", "genetic_algorithm_best_score",
+                 "local_search_seconds", "genetic_algorithm_seconds")
+
+
+def trial_seed(base_seed, trial):
+    """
+    Derives the seed of one trial, so every trial draws the same grid and random choices
+    whichever worker runs it and in whatever order.
+
+    Parameters:
+        base_seed (int): The seed of the whole batch.
+        trial (int): The index of the trial.
+
+    Returns:
+        int: The seed of the trial.
+    """
+    return (base_seed * 1_000_003 + trial) % 2 ** 32
+
+
+def run_trial(trial, seed, output_dir, local_search_options=None, genetic_algorithm_options=None, verbose=False,
+              portfolio=False, restarts=0, grid_options=None):
+    """
+    Runs one comparison: generates a grid, then optimizes it with local search and with the
+    genetic algorithm. This is the task run by the worker processes of `run_experiments`.
+
+    With `portfolio`, both algorithms and their restarts run concurrently and share their
+    evaluations (see `portfolio_search`), each algorithm being credited with the best grid
+    of its runs and the time of its slowest run.
+
+    Parameters:
+        trial (int): The index of the trial.
+        seed (int): The seed of the trial, applied to the `random` and NumPy generators.
+        output_dir (str): The directory the visualizations of the trial are saved to.
+        local_search_options (dict): Keyword arguments of `local_search_algorithm`.
+        genetic_algorithm_options (dict): Keyword arguments of `genetic_algorithm`.
+        verbose (bool): Whether to let the algorithms print their progress.
+        portfolio (bool): Whether to run the algorithms concurrently rather than in turn.
+        restarts (int): The number of extra runs of each algorithm in portfolio mode.
+        grid_options (dict): Keyword arguments of `generate_city_grid_with_only_bordering_intersections`,
+                             the grid constants by default.
+
+    Returns:
+        tuple:
+            - dict: The result row of the trial, with the `RESULT_FIELDS` keys.
+            - tuple: The best grids and paths, as (local search grid, local search paths,
+                     genetic algorithm grid, genetic algorithm paths).
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    trial_dir = os.path.join(output_dir, f"trial_{trial}")
+    with silenced_output(verbose):
+        initial_grid = generate_city_grid_with_only_bordering_intersections(**(grid_options or {}))
+
+    if portfolio:
+        _, _, _, report = portfolio_search(initial_grid, local_search_options, genetic_algorithm_options, restarts,
+                                           seed, trial_dir, verbose)
+        best_runs = {}
+        for algorithm in ("local_search", "genetic_algorithm"):
+            runs = [stats for stats in report["members"] if stats["algorithm"] == algorithm]
+            best_runs[algorithm] = (min(runs, key=lambda stats: stats["best_score"]),
+                                    max(stats["seconds"] for stats in runs))
+        (local, local_seconds), (genetic, genetic_seconds) = best_runs["local_search"], best_runs["genetic_algorithm"]
+        best_grid, shortest_paths, local_cost = local["grid"], local["paths"], local["best_score"]
+        optimized_grid, short_paths, genetic_cost = genetic["grid"], genetic["paths"], genetic["best_score"]
+    else:
+        with silenced_output(verbose):
+            start = time.perf_counter()
+            best_grid, shortest_paths, local_cost = local_search_algorithm(
+                initial_grid, **{"max_iterations": 400, **(local_search_options or {})},
+                dir_path=os.path.join(trial_dir, "hill_climbing"))
+            local_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            optimized_grid, short_paths, genetic_cost = genetic_algorithm(
+                **{"population_size": POPULATION_SIZE, "generations": 40, "mutation_rate": 0.2, **(genetic_algorithm_options or {})},
+                initial_grid=initial_grid, dir_path=os.path.join(trial_dir, "genetic_algorithm"))
+            genetic_seconds = time.perf_counter() - start
+
+    row = {"trial": trial, "seed": seed,
+           "local_search_best_score": local_cost, "genetic_algorithm_best_score": genetic_cost,
+           "local_search_seconds": round(local_seconds, 3), "genetic_algorithm_seconds": round(genetic_seconds, 3)}
+    return row, (best_grid, shortest_paths, optimized_grid, short_paths)
+
+
+def read_results(output_path):
+    """
+    Reads the result rows of a CSV or JSON Lines results file. A last row cut short by a
+    crash is ignored.
+
+    Parameters:
+        output_path (str): The results file, JSON Lines if it ends with ".jsonl", CSV otherwise.
+
+    Returns:
+        list[dict]: The complete rows, in file order, with numeric values.
+    """
+    if not os.path.exists(output_path):
+        return []
+    rows = []
+    with open(output_path, newline="") as results_file:
+        if output_path.endswith(".jsonl"):
+            for line in results_file:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if all(field in row for field in RESULT_FIELDS):
+                    rows.append(row)
+        else:
+            for row in csv.DictReader(results_file):
+                if all(row.get(field) not in (None, "") for field in RESULT_FIELDS):
+                    rows.append({field: int(row[field]) if field in ("trial", "seed") else float(row[field])
+                                 for field in RESULT_FIELDS})
+    return rows
+
+
+def write_results(output_path, rows):
+    """
+    Rewrites a results file with the given rows only, atomically, so a file left with a
+    partial row by a crash can be appended to again.
+
+    Parameters:
+        output_path (str): The results file, JSON Lines if it ends with ".jsonl", CSV otherwise.
+        rows (list[dict]): The rows to keep.
+    """
+    temporary_path = output_path + ".tmp"
+    with open(temporary_path, "w", newline="") as results_file:
+        if not output_path.endswith(".jsonl"):
+            csv.DictWriter(results_file, RESULT_FIELDS).writeheader()
+        for row in rows:
+            write_row(results_file, output_path, row)
+    os.replace(temporary_path, output_path)
+
+
+def write_row(results_file, output_path, row):
+    """
+    Appends one result row to an open results file and flushes it to disk.
+
+    Parameters:
+        results_file (file): The results file, opened for appending.
+        output_path (str): Its path, JSON Lines if it ends with ".jsonl", CSV otherwise.
+        row (dict): The row to append.
+    """
+    if output_path.endswith(".jsonl"):
+        results_file.write(json.dumps({field: row[field] for field in RESULT_FIELDS}) + "\n")
+    else:
+        csv.DictWriter(results_file, RESULT_FIELDS).writerow({field: row[field] for field in RESULT_FIELDS})
+    results_file.flush()
+    os.fsync(results_file.fileno())
+
+
+def run_experiments(num_trials, output_path, max_workers=None, base_seed=0, resume=True,
+                    local_search_options=None, genetic_algorithm_options=None, output_dir=None, verbose=False,
+                    portfolio=False, restarts=0, grid_options=None):
+    """
+    Runs a batch of local search vs genetic algorithm trials in a process pool.
+
+    Every trial has its own seed derived from `base_seed` (see `trial_seed`), so its result
+    does not depend on the number of workers or on the order trials finish in. Each result
+    row is appended to `output_path` and flushed as soon as its trial finishes. With
+    `resume`, the trials already recorded in `output_path` are skipped, so a batch that
+    crashed or was interrupted picks up where it stopped.
+
+    Parameters:
+        num_trials (int): The number of trials of the batch.
+        output_path (str): The results file, JSON Lines if it ends with ".jsonl", CSV otherwise.
+        max_workers (int): The number of worker processes, one per CPU when None. A single
+                           worker runs the trials in-process.
+        base_seed (int): The seed of the batch.
+        resume (bool): Whether to keep the trials already in `output_path`. Otherwise the
+                       file is started over.
+        local_search_options (dict): Keyword arguments of `local_search_algorithm`.
+        genetic_algorithm_options (dict): Keyword arguments of `genetic_algorithm`.
+        output_dir (str): The directory the visualizations of the trials are saved to, an
+                        "experiments" directory in RES_DIR by default.
+        verbose (bool): Whether to let the algorithms print their progress.
+        portfolio (bool): Whether each trial runs its algorithms concurrently, sharing their
+                          evaluations (see `run_trial`).
+        restarts (int): The number of extra runs of each algorithm in portfolio mode.
+        grid_options (dict): Keyword arguments of `generate_city_grid_with_only_bordering_intersections`,
+                             the grid constants by default. A batch must be resumed with
+                             the same options.
+
+    Returns:
+        tuple:
+            - list[dict]: The result rows of every trial of the batch, resumed ones
+                          included, in trial order.
+            - dict: The best grids and paths of the trials run by this call, by trial.
+
+    Raises:
+        ValueError: If the results file holds trials run with another base seed.
+    """
+    if output_dir is None:
+        output_dir = os.path.join(RES_DIR, "experiments")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    rows = read_results(output_path) if resume else []
+    for row in rows:
+        if row["seed"] != trial_seed(base_seed, row["trial"]):
+            raise ValueError(f"{output_path} holds trial {row['trial']} run with another base seed")
+    write_results(output_path, rows)
+    completed = {row["trial"] for row in rows}
+    pending = [trial for trial in range(num_trials) if trial not in completed]
+    if completed:
+        print(f"Resuming: {len(completed)} trials already done, {len(pending)} to run")
+
+    results = {}
+    with open(output_path, "a", newline="") as results_file:
+        def record(row, grids):
+            write_row(results_file, output_path, row)
+            rows.append(row)
+            results[row["trial"]] = grids
+            print(f"Trial {row['trial']}: local search {row['local_search_best_score']}, "
+                  f"genetic algorithm {row['genetic_algorithm_best_score']}")
+
+        arguments = [(trial, trial_seed(base_seed, trial), output_dir, local_search_options,
+                      genetic_algorithm_options, verbose, portfolio, restarts, grid_options)
+                     for trial in pending]
+        if max_workers == 1:
+            for trial_arguments in arguments:
+                record(*run_trial(*trial_arguments))
+        else:
+            with ProcessPoolExecutor(max_workers) as executor:
+                futures = [executor.submit(run_trial, *trial_arguments) for trial_arguments in arguments]
+                for future in as_completed(futures):
+                    record(*future.result())
+
+    rows = sorted((row for row in rows if row["trial"] < num_trials), key=lambda row: row["trial"])
+    return rows, results
@@ -10,5 +10,8 @@ NUM_BUILDINGS = 18
 # The number of emergency services to place in the grid. Emergency services are represented by the value `2` in the grid.
 NUM_EMERGENCY_SERVICES = 4
 
+# The number of grids bred per generation of the genetic algorithm. Each generation is scored in a worker pool.
+POPULATION_SIZE = 200
+
 # The directory path where the visualizations and results of the city grid simulations will be saved.
 RES_DIR = rf""
\ No newline at end of file
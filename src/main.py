@@ -1,33 +1,44 @@
-from utils.grid_generation import generate_city_grid_with_only_bordering_intersections
-from algorithms.local_search import local_search_algorithm
-from algorithms.genetic_algo import genetic_algorithm
+from experiment_runner import run_experiments
 from visuals.project_demo import run_visualizations
+import argparse
 import pandas as pd
 import os 
-from grid_constants import RES_DIR
+from grid_constants import RES_DIR, GRID_WIDTH, GRID_HEIGHT, NUM_BUILDINGS, NUM_EMERGENCY_SERVICES, POPULATION_SIZE
 
 
 def main():
-    local_search_scores = []
-    genetic_algorithm_scores = []
-    for _ in range(50):
-        print("**************** Combat: ", _)
-        initial_grid = generate_city_grid_with_only_bordering_intersections()
-        
-        best_grid, shortest_paths, local_cost = local_search_algorithm(initial_grid, max_iterations=400)
-        local_search_scores.append(local_cost)
-
-        optimized_grid, short_paths, genetic_cost = genetic_algorithm( population_size=10, generations=40, 
-                                                                        mutation_rate=0.2, initial_grid=initial_grid)
-        genetic_algorithm_scores.append(genetic_cost)
-        
-        print("Final cost after hill climbing: ", local_cost)
-        print("Final cost after genetic algorithm: ", genetic_cost)
+    parser = argparse.ArgumentParser(description="Compares local search and the genetic algorithm over many grids.")
+    parser.add_argument("--trials", type=int, default=50, help="The number of grids to optimize.")
+    parser.add_argument("--workers", type=int, default=None, help="The number of worker processes, one per CPU by default.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed the seed of every trial is derived from.")
+    parser.add_argument("--output", default=os.path.join(RES_DIR, "trials.csv"),
+                        help="The file each trial result is appended to, JSON Lines if it ends with .jsonl.")
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of skipping the trials already in --output.")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="Run both algorithms of a trial concurrently, sharing their evaluations.")
+    parser.add_argument("--restarts", type=int, default=0, help="The number of extra runs of each algorithm with --portfolio.")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH, help="The number of columns of the grids.")
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT, help="The number of rows of the grids.")
+    parser.add_argument("--buildings", type=int, default=NUM_BUILDINGS, help="The number of buildings.")
+    parser.add_argument("--services", type=int, default=NUM_EMERGENCY_SERVICES, help="The number of emergency services.")
+    parser.add_argument("--population", type=int, default=POPULATION_SIZE,
+                        help="The number of grids bred per generation of the genetic algorithm.")
+    parser.add_argument("--ga-workers", type=int, default=1,
+                        help="The number of worker processes scoring each generation of a trial's genetic algorithm.")
+    args = parser.parse_args()
+    grid_options = {"width": args.width, "height": args.height, "num_buildings": args.buildings,
+                    "num_emergency_services": args.services}
+
+    rows, results = run_experiments(args.trials, args.output, max_workers=args.workers, base_seed=args.seed,
+                                    resume=not args.no_resume, portfolio=args.portfolio, restarts=args.restarts,
+                                    grid_options=grid_options,
+                                    genetic_algorithm_options={"population_size": args.population,
+                                                               "max_workers": args.ga_workers})
     
     comparision_df = pd.DataFrame({
-    "iteration": list(range(1, 51)),
-    "local_search_best_score": local_search_scores,
-    "genetic_algorithm_best_score": genetic_algorithm_scores})
+    "iteration": [row["trial"] + 1 for row in rows],
+    "local_search_best_score": [row["local_search_best_score"] for row in rows],
+    "genetic_algorithm_best_score": [row["genetic_algorithm_best_score"] for row in rows]})
 
     local_better = sum(comparision_df["local_search_best_score"]<comparision_df["genetic_algorithm_best_score"])
     genetic_better = sum(comparision_df["local_search_best_score"]>comparision_df["genetic_algorithm_best_score"])
@@ -37,7 +48,9 @@ def main():
 
     comparision_df.to_csv(os.path.join(RES_DIR,"comparision.csv"), index=False)
 
-    run_visualizations([best_grid, optimized_grid], [shortest_paths, short_paths], ["Local Search", "Genetic Algorithm"])
+    if results:
+        best_grid, shortest_paths, optimized_grid, short_paths = results[max(results)]
+        run_visualizations([best_grid, optimized_grid], [shortest_paths, short_paths], ["Local Search", "Genetic Algorithm"])
     
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+import argparse
+import csv
+import itertools
+import math
+import os
+import random
+import time
+import numpy as np
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from utils.helper import silenced_output
+from algorithms.a_star_algo import find_all_shortest_paths
+from algorithms.cost_function import calculate_fitness
+from algorithms.evaluation_cache import SharedFitnessStore, evaluation_cache
+from algorithms.local_search import local_search_algorithm
+from algorithms.genetic_algo import genetic_algorithm
+from experiment_runner import trial_seed
+from visuals.scaling_curves import save_line_chart
+from grid_constants import RES_DIR
+
+SWEEP_ALGORITHMS = ("local_search", "genetic_algorithm")
+SWEEP_FIELDS = ("width", "height", "buildings", "services", "trial", "seed", "algorithm", "evaluation_seconds",
+                "seconds", "evaluations", "seconds_per_evaluation", "final_cost")
+# Metrics drawn as scaling curves, with their axis labels and whether they are plotted on log-log axes
+CURVES = (("evaluation_seconds", "seconds per from-scratch evaluation", True),
+          ("seconds_per_evaluation", "seconds per optimizer evaluation", True),
+          ("seconds", "optimizer wall-clock seconds", True),
+          ("final_cost", "final cost", False))
+
+
+def time_evaluation(grid, repeat=3):
+    """
+    Times the from-scratch evaluation of a grid: the search of every building's path to
+    its nearest emergency service and the scoring of the paths.
+
+    Parameters:
+        grid (CityGrid): The grid to evaluate.
+        repeat (int): The number of timed evaluations, the fastest is kept.
+
+    Returns:
+        float: The duration of one evaluation in seconds.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        calculate_fitness(grid, find_all_shortest_paths(grid))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_point(width, height, num_buildings, num_emergency_services, trial, seed, algorithms,
+              local_search_options, genetic_algorithm_options, output_dir):
+    """
+    Runs one trial of the sweep at one point: generates a grid with the given size and
+    counts, times its evaluation, then optimizes it with each algorithm.
+
+    Evaluations are counted as the path searches each optimizer ran: for local search the
+    neighbor drawn at each iteration plus the merged grids it scored (counted by a
+    `SharedFitnessStore` private to the run, which also answers the configurations it
+    revisits), for the genetic algorithm the misses of the evaluation cache. Local search
+    repairs the paths of the current grid rather than searching from scratch, so its time
+    per evaluation is not comparable with the from-scratch evaluation time.
+
+    Parameters:
+        width (int): The number of columns of the grid, before its border.
+        height (int): The number of rows of the grid, before its border.
+        num_buildings (int): The number of buildings.
+        num_emergency_services (int): The number of emergency services.
+        trial (int): The index of the trial at this point.
+        seed (int): The seed of the grid and of the optimizers.
+        algorithms (list[str]): The optimizers to run, among `SWEEP_ALGORITHMS`.
+        local_search_options (dict): Keyword arguments of `local_search_algorithm`.
+        genetic_algorithm_options (dict): Keyword arguments of `genetic_algorithm`.
+        output_dir (str): The directory the optimizers save their visualizations to.
+
+    Returns:
+        list[dict]: One row per algorithm, with the `SWEEP_FIELDS` keys.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    initial_grid = generate_city_grid_with_only_bordering_intersections(width, height, num_buildings,
+                                                                         num_emergency_services)
+    evaluation_seconds = time_evaluation(place_intersections_in_every_column_randomly(initial_grid.copy()))
+    point_dir = os.path.join(output_dir, f"{width}x{height}_{num_buildings}_{num_emergency_services}_{trial}")
+
+    rows = []
+    for algorithm in algorithms:
+        random.seed(seed)
+        np.random.seed(seed)
+        start = time.perf_counter()
+        if algorithm == "local_search":
+            store = SharedFitnessStore()
+            _, _, final_cost = local_search_algorithm(initial_grid.copy(), **local_search_options,
+                                                      dir_path=os.path.join(point_dir, algorithm),
+                                                      shared_store=store)
+            neighbors = local_search_options.get("max_iterations", 200) * local_search_options.get("num_candidates", 1)
+            evaluations = neighbors + store.published
+        else:
+            evaluation_cache.clear()
+            _, _, final_cost = genetic_algorithm(**genetic_algorithm_options, initial_grid=initial_grid.copy(),
+                                                 dir_path=os.path.join(point_dir, algorithm))
+            evaluations = evaluation_cache.misses
+        seconds = time.perf_counter() - start
+        rows.append({"width": width, "height": height, "buildings": num_buildings,
+                     "services": num_emergency_services, "trial": trial, "seed": seed, "algorithm": algorithm,
+                     "evaluation_seconds": evaluation_seconds, "seconds": seconds, "evaluations": evaluations,
+                     "seconds_per_evaluation": seconds / evaluations if evaluations else math.nan,
+                     "final_cost": final_cost})
+    return rows
+
+
+def scaling_exponents(points):
+    """
+    Estimates how fast a metric grows between consecutive points of a series.
+
+    Parameters:
+        points (list[tuple]): The (cells, value) points of the series, sorted by cells.
+
+    Returns:
+        list[float]: The slope of the metric against the number of cells on log-log axes
+                     between each pair of consecutive points: about 1 for linear growth, 2
+                     for quadratic growth. NaN where a value is not positive.
+    """
+    exponents = []
+    for (cells, value), (next_cells, next_value) in zip(points, points[1:]):
+        if value > 0 and next_value > 0 and next_cells != cells:
+            exponents.append(math.log(next_value / value) / math.log(next_cells / cells))
+        else:
+            exponents.append(math.nan)
+    return exponents
+
+
+def save_scaling_curves(rows, output_dir):
+    """
+    Averages the rows of a sweep over its trials and draws each metric of `CURVES` against
+    the number of cells of the grid, one series per algorithm and building and emergency
+    service count.
+
+    Parameters:
+        rows (list[dict]): The rows of the sweep.
+        output_dir (str): The directory the charts are saved to.
+
+    Returns:
+        dict: The averaged (cells, value) points of each series, by metric then by series label.
+    """
+    grouped = {}
+    for row in rows:
+        key = (row["algorithm"], row["buildings"], row["services"], row["width"] * row["height"])
+        grouped.setdefault(key, []).append(row)
+
+    curves = {}
+    for metric, label, log_scale in CURVES:
+        series = {}
+        for (algorithm, num_buildings, num_emergency_services, cells), group in sorted(grouped.items()):
+            values = [row[metric] for row in group if not math.isnan(row[metric])]
+            if values:
+                series.setdefault(f"{algorithm} B={num_buildings} E={num_emergency_services}", []).append(
+                    (cells, sum(values) / len(values)))
+        curves[metric] = series
+        save_line_chart(series, f"{label} vs grid cells", "grid cells", label,
+                        os.path.join(output_dir, f"scaling_{metric}.png"), log_scale)
+    return curves
+
+
+def run_sweep(sizes, building_counts, service_counts, trials=1, algorithms=SWEEP_ALGORITHMS, seed=0,
+              local_search_options=None, genetic_algorithm_options=None, output_dir=None, verbose=False):
+    """
+    Runs both optimizers over the Cartesian product of grid sizes, building counts and
+    emergency service counts, and saves the rows and scaling curves of the sweep.
+
+    The points run one after the other in-process, so their timings do not compete for
+    the CPU. Points where the buildings and emergency services do not fit in the alternate
+    rows of the grid are skipped.
+
+    Parameters:
+        sizes (list[tuple]): The (width, height) of the grids, before their border.
+        building_counts (list[int]): The numbers of buildings.
+        service_counts (list[int]): The numbers of emergency services.
+        trials (int): The number of grids per point.
+        algorithms (list[str]): The optimizers to run, among `SWEEP_ALGORITHMS`.
+        seed (int): The seed the seed of every grid is derived from.
+        local_search_options (dict): Keyword arguments of `local_search_algorithm`.
+        genetic_algorithm_options (dict): Keyword arguments of `genetic_algorithm`.
+        output_dir (str): The directory of the results, a "scaling_sweep" directory in
+                          RES_DIR by default. It receives "scaling_sweep.csv", one row per
+                          point, trial and algorithm, and a "scaling_<metric>.png" chart per
+                          metric.
+        verbose (bool): Whether to let the optimizers print their progress.
+
+    Returns:
+        tuple:
+            - list[dict]: The rows of the sweep, with the `SWEEP_FIELDS` keys.
+            - dict: The averaged points of each scaling curve (see `save_scaling_curves`).
+    """
+    if output_dir is None:
+        output_dir = os.path.join(RES_DIR, "scaling_sweep")
+    os.makedirs(output_dir, exist_ok=True)
+    local_search_options = {"max_iterations": 100, **(local_search_options or {})}
+    genetic_algorithm_options = {"population_size": 10, "generations": 10, "mutation_rate": 0.2,
+                                 **(genetic_algorithm_options or {})}
+
+    rows = []
+    points = itertools.product(sizes, building_counts, service_counts, range(trials))
+    for index, ((width, height), num_buildings, num_emergency_services, trial) in enumerate(points):
+        # Buildings and emergency services are placed in the odd rows only
+        if num_buildings + num_emergency_services > (height // 2) * width:
+            if trial == 0:
+                print(f"Skipping {width}x{height}: {num_buildings} buildings and {num_emergency_services} "
+                      f"services do not fit in its alternate rows")
+            continue
+        with silenced_output(verbose):
+            point_rows = run_point(width, height, num_buildings, num_emergency_services, trial,
+                                   trial_seed(seed, index), algorithms, local_search_options,
+                                   genetic_algorithm_options, output_dir)
+        rows.extend(point_rows)
+        for row in point_rows:
+            print(f"{width}x{height} B={num_buildings} E={num_emergency_services} trial {trial} "
+                  f"{row['algorithm']}: cost {row['final_cost']:.3f}, {row['seconds']:.2f}s, "
+                  f"{row['evaluations']} evaluations ({row['seconds_per_evaluation'] * 1000:.2f} ms each), "
+                  f"{row['evaluation_seconds'] * 1000:.2f} ms per from-scratch evaluation")
+
+    with open(os.path.join(output_dir, "scaling_sweep.csv"), "w", newline="") as results_file:
+        writer = csv.DictWriter(results_file, SWEEP_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    curves = save_scaling_curves(rows, output_dir)
+
+    for metric, _, log_scale in CURVES:
+        if not log_scale:
+            continue
+        for label, points in curves[metric].items():
+            exponents = ", ".join(f"{exponent:.2f}" for exponent in scaling_exponents(points))
+            if exponents:
+                print(f"{metric} of {label} grows as cells^k with k = {exponents}")
+    print(f"Saved {len(rows)} rows and the scaling curves to {output_dir}")
+    return rows, curves
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweeps the optimizers over grid sizes, building and service counts.")
+    parser.add_argument("--sizes", nargs="+", default=["15", "31", "63"],
+                        help="The grid sizes, as N for an N x N grid or WIDTHxHEIGHT.")
+    parser.add_argument("--buildings", type=int, nargs="+", default=[18, 72], help="The numbers of buildings.")
+    parser.add_argument("--services", type=int, nargs="+", default=[4, 16],
+                        help="The numbers of emergency services.")
+    parser.add_argument("--trials", type=int, default=1, help="The number of grids per point.")
+    parser.add_argument("--algorithms", nargs="+", choices=SWEEP_ALGORITHMS, default=list(SWEEP_ALGORITHMS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=100, help="The iterations of local search.")
+    parser.add_argument("--generations", type=int, default=10, help="The generations of the genetic algorithm.")
+    parser.add_argument("--output-dir", default=os.path.join(RES_DIR, "scaling_sweep"))
+    parser.add_argument("--verbose", action="store_true", help="Let the optimizers print their progress.")
+    args = parser.parse_args()
+
+    sizes = [tuple(int(side) for side in size.split("x")) if "x" in size else (int(size), int(size))
+             for size in args.sizes]
+    run_sweep(sizes, args.buildings, args.services, args.trials, args.algorithms, args.seed,
+              {"max_iterations": args.iterations}, {"generations": args.generations}, args.output_dir, args.verbose)
+
+
+if __name__ == "__main__":
+    """
+    Entry point for the script. Executes the `main` function when the script is run directly.
+    """
+    main()
@@ -0,0 +1,275 @@
+import bisect
+import hashlib
+import numpy as np
+
+
+class CityGrid:
+    """
+    A city grid backed by a compact int8 NumPy array.
+
+    Cell values follow the usual convention:
+        - 0: Roads
+        - 1: Buildings
+        - 2: Emergency services
+        - 3: Intersections
+
+    The grid keeps cached indexes of buildings, emergency services, interior intersections
+    and empty cells in odd (road) rows, so callers no longer rescan the whole grid with nested
+    loops. All cached positions are stored as (y, x) tuples in lists kept in row-major order:
+    a write inserts or removes the cell with a binary search, so the accessors on the hot path
+    of the neighbour and retention operators only copy a list and never sort one.
+
+    Reading `grid[y][x]` works like it does on a list of lists, so the search, fitness and
+    visualization code can use either representation. Rows are returned as tuples, built on
+    first read and rebuilt only after a write to that row: cells must be written with
+    `grid[y, x] = value` so the cached indexes stay in sync.
+    """
+
+    def __init__(self, cells):
+        """
+        Parameters:
+            cells (list[list[int]] | numpy.ndarray | CityGrid): The cell values of the grid.
+        """
+        if isinstance(cells, CityGrid):
+            cells = cells._cells
+        self._cells = np.array(cells, dtype=np.int8)
+        self._rows = [None] * self._cells.shape[0]  # Row tuples, None until read after a write
+        self._key = None
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Rebuilds the cached indexes from the cell array.
+        """
+        height, width = self._cells.shape
+        interior = np.zeros_like(self._cells, dtype=bool)
+        interior[1:height - 1, 1:width - 1] = True
+        odd_rows = np.zeros_like(interior)
+        odd_rows[1::2, :] = True
+
+        def positions(mask):
+            # np.nonzero lists the positions in row-major order, which is the sorted order
+            return list(zip(*(axis.tolist() for axis in np.nonzero(mask))))
+
+        self._buildings = positions(self._cells == 1)
+        self._emergency_services = positions(self._cells == 2)
+        self._intersections = positions((self._cells == 3) & interior)
+        self._empty_cells = positions((self._cells == 0) & interior)
+        self._empty_odd_row_cells = positions((self._cells == 0) & interior & odd_rows)
+
+    @property
+    def shape(self):
+        """
+        tuple: The (height, width) of the grid.
+        """
+        return self._cells.shape
+
+    @property
+    def array(self):
+        """
+        numpy.ndarray: A read-only view of the underlying int8 cell array.
+        """
+        view = self._cells.view()
+        view.flags.writeable = False
+        return view
+
+    def __len__(self):
+        return self._cells.shape[0]
+
+    def __getitem__(self, key):
+        if type(key) is tuple:
+            y, x = key
+            return int(self._cells[y, x])
+        row = self._rows[key]
+        if row is None:
+            row = self._rows[key] = tuple(self._cells[key].tolist())
+        return row
+
+    def __setitem__(self, key, value):
+        """
+        Sets the cell at `grid[y, x]` and keeps the cached indexes up to date.
+        """
+        y, x = key
+        old_value = int(self._cells[y, x])
+        if old_value == value:
+            return
+        self._cells[y, x] = value
+        self._rows[y] = None
+        self._key = None
+
+        position = (y, x)
+        for index in self._indexes_for(old_value, position):
+            del index[bisect.bisect_left(index, position)]
+        for index in self._indexes_for(value, position):
+            bisect.insort(index, position)
+
+    def _indexes_for(self, value, position):
+        """
+        Returns the cached indexes a cell with the given value belongs to.
+        """
+        y, x = position
+        height, width = self._cells.shape
+        is_interior = 0 < y < height - 1 and 0 < x < width - 1
+        if value == 1:
+            return [self._buildings]
+        if value == 2:
+            return [self._emergency_services]
+        if not is_interior:
+            return []
+        if value == 3:
+            return [self._intersections]
+        if value == 0:
+            return [self._empty_cells, self._empty_odd_row_cells] if y % 2 != 0 else [self._empty_cells]
+        return []
+
+    def __iter__(self):
+        for y in range(len(self)):
+            yield self[y]
+
+    def __eq__(self, other):
+        if isinstance(other, CityGrid):
+            return np.array_equal(self._cells, other._cells)
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CityGrid({self.to_list()})"
+
+    def __reduce__(self):
+        # Pickle only the shape and the raw cells: the cached sets are rebuilt on load
+        return (CityGrid.from_bytes, self.to_bytes())
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def key(self):
+        """
+        Returns a compact digest of the grid contents, suitable as a dictionary key.
+        Grids with equal cells always share a key. The digest is cached until a cell changes.
+
+        Returns:
+            bytes: A 16-byte BLAKE2 digest of the grid shape and cells.
+        """
+        if self._key is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.array(self._cells.shape, dtype=np.int32).tobytes())
+            digest.update(self._cells.tobytes())
+            self._key = digest.digest()
+        return self._key
+
+    def copy(self):
+        """
+        Returns an independent copy of the grid. Only the int8 array, the row tuples and the
+        cached indexes are copied, nothing is rescanned or sorted.
+
+        Returns:
+            CityGrid: The copied grid.
+        """
+        new_grid = CityGrid.__new__(CityGrid)
+        new_grid._cells = self._cells.copy()
+        new_grid._rows = list(self._rows)
+        new_grid._key = self._key
+        new_grid._buildings = self._buildings.copy()
+        new_grid._emergency_services = self._emergency_services.copy()
+        new_grid._intersections = self._intersections.copy()
+        new_grid._empty_cells = self._empty_cells.copy()
+        new_grid._empty_odd_row_cells = self._empty_odd_row_cells.copy()
+        return new_grid
+
+    def with_moved_intersection(self, source, target):
+        """
+        Returns a copy of the grid with the intersection at `source` moved to `target`.
+
+        Parameters:
+            source (tuple): The (y, x) position of the intersection to move.
+            target (tuple): The (y, x) position of the empty cell to move it to.
+
+        Returns:
+            CityGrid: The new grid.
+        """
+        new_grid = self.copy()
+        new_grid[source] = 0
+        new_grid[target] = 3
+        return new_grid
+
+    def changed_cells(self, other):
+        """
+        Lists the cells whose values differ between this grid and another grid of the same shape.
+
+        Parameters:
+            other (CityGrid): The grid to compare with.
+
+        Returns:
+            list[tuple]: The (y, x) positions of the differing cells in row-major order.
+        """
+        return [tuple(position) for position in np.argwhere(self._cells != other._cells).tolist()]
+
+    def to_bytes(self):
+        """
+        Returns a compact serialized form of the grid, one byte per cell.
+
+        Returns:
+            tuple: The (height, width) of the grid and its int8 cells as bytes.
+        """
+        return self._cells.shape, self._cells.tobytes()
+
+    @classmethod
+    def from_bytes(cls, shape, data):
+        """
+        Rebuilds a grid from the output of `to_bytes`.
+
+        Parameters:
+            shape (tuple): The (height, width) of the grid.
+            data (bytes): The int8 cells in row-major order.
+
+        Returns:
+            CityGrid: The grid.
+        """
+        return cls(np.frombuffer(data, dtype=np.int8).reshape(shape))
+
+    def to_list(self):
+        """
+        Returns:
+            list[list[int]]: The grid as a list of lists.
+        """
+        return self._cells.tolist()
+
+    def buildings(self):
+        """
+        Returns:
+            list[tuple]: The (y, x) positions of all buildings in row-major order.
+        """
+        return list(self._buildings)
+
+    def emergency_services(self):
+        """
+        Returns:
+            list[tuple]: The (y, x) positions of all emergency services in row-major order.
+        """
+        return list(self._emergency_services)
+
+    def intersections(self):
+        """
+        Returns:
+            list[tuple]: The (y, x) positions of all intersections off the border in row-major order.
+        """
+        return list(self._intersections)
+
+    def empty_cells(self):
+        """
+        Returns:
+            list[tuple]: The (y, x) positions of all empty cells off the border in row-major order.
+        """
+        return list(self._empty_cells)
+
+    def empty_odd_row_cells(self):
+        """
+        Returns:
+            list[tuple]: The (y, x) positions of all empty cells off the border in odd rows,
+                         in row-major order.
+        """
+        return list(self._empty_odd_row_cells)
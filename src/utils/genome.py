@@ -0,0 +1,236 @@
+import hashlib
+import random
+
+
+class GenomeLayout:
+    """
+    The part of a city grid that never changes during a run: buildings, emergency services
+    and the border. It is shared by every genome of a population.
+
+    Each interior cell that is not a building or an emergency service may hold an
+    intersection and gets a bit, numbered in row-major order, so iterating over bits in
+    increasing order visits cells the way `CityGrid.intersections()` lists them.
+
+    Attributes:
+        base (CityGrid): The grid with every interior intersection removed.
+        height (int): The number of rows of the grid.
+        positions (list[tuple]): The (y, x) position of each bit.
+        bits (dict): Maps a (y, x) position to its bit index.
+        odd_row_mask (int): The bits of the cells in odd (road) rows.
+        full_mask (int): All bits of the layout.
+        key (bytes): A digest of the base grid, telling layouts apart.
+    """
+
+    def __init__(self, grid):
+        """
+        Parameters:
+            grid (CityGrid): Any grid of the run. Its interior intersections are ignored.
+        """
+        self.base = grid.copy()
+        for y, x in self.base.intersections():
+            self.base[y, x] = 0
+        self.height = len(self.base)
+        self.positions = self.base.empty_cells()
+        self.bits = {position: bit for bit, position in enumerate(self.positions)}
+        self.odd_row_mask = 0
+        for bit, (y, _) in enumerate(self.positions):
+            if y % 2 != 0:
+                self.odd_row_mask |= 1 << bit
+        self.full_mask = (1 << len(self.positions)) - 1
+        self.key = self.base.key()
+
+    def __reduce__(self):
+        # Pickle the base grid only, the bit numbering is rebuilt on load
+        return (GenomeLayout, (self.base,))
+
+    def positions_of(self, bits):
+        """
+        Lists the cells of the set bits of a bitset in row-major order.
+
+        Parameters:
+            bits (int): The bitset.
+
+        Returns:
+            list[tuple]: The (y, x) positions of the set bits.
+        """
+        positions = []
+        while bits:
+            lowest = bits & -bits
+            positions.append(self.positions[lowest.bit_length() - 1])
+            bits ^= lowest
+        return positions
+
+
+class Genome:
+    """
+    A member of a genetic algorithm population: a shared `GenomeLayout` plus a packed bitset
+    (a Python int) of the interior cells holding an intersection.
+
+    Mutation, crossover, equality and hashing work on the bitset alone; `to_grid` expands a
+    genome back into a `CityGrid` for the search and for rendering.
+    """
+
+    __slots__ = ("layout", "bits")
+
+    def __init__(self, layout, bits):
+        """
+        Parameters:
+            layout (GenomeLayout): The shared layout.
+            bits (int): The bitset of interior intersections.
+        """
+        self.layout = layout
+        self.bits = bits
+
+    @classmethod
+    def from_grid(cls, layout, grid):
+        """
+        Encodes a grid sharing the given layout.
+
+        Parameters:
+            layout (GenomeLayout): The layout of the grid.
+            grid (CityGrid): The grid to encode.
+
+        Returns:
+            Genome: The genome of the grid.
+        """
+        bits = 0
+        for position in grid.intersections():
+            bits |= 1 << layout.bits[position]
+        return cls(layout, bits)
+
+    def to_grid(self):
+        """
+        Returns:
+            CityGrid: The grid the genome stands for.
+        """
+        grid = self.layout.base.copy()
+        for y, x in self.intersections():
+            grid[y, x] = 3
+        return grid
+
+    def intersections(self):
+        """
+        Returns:
+            list[tuple]: The (y, x) positions of the interior intersections in row-major order.
+        """
+        return self.layout.positions_of(self.bits)
+
+    def key(self):
+        """
+        Returns a compact digest of the genome, suitable as a dictionary key. Genomes with the
+        same layout and bits share a key.
+
+        Returns:
+            bytes: A 16-byte BLAKE2 digest of the layout key and the bitset.
+        """
+        digest = hashlib.blake2b(self.layout.key, digest_size=16)
+        digest.update(self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little"))
+        return digest.digest()
+
+    def __eq__(self, other):
+        if not isinstance(other, Genome):
+            return NotImplemented
+        return self.bits == other.bits and (self.layout is other.layout or self.layout.key == other.layout.key)
+
+    def __hash__(self):
+        return hash((self.layout.key, self.bits))
+
+    def __repr__(self):
+        return f"Genome({self.bits:#x})"
+
+
+def to_city_grid(grid):
+    """
+    Expands a genome into its grid, leaving grids untouched.
+
+    Parameters:
+        grid (Genome | CityGrid | list[list[int]]): A genome or a grid.
+
+    Returns:
+        CityGrid | list[list[int]]: The grid.
+    """
+    return grid.to_grid() if isinstance(grid, Genome) else grid
+
+
+def mutate_genome(genome):
+    """
+    Bitset version of `generate_neighbor`: moves a random interior intersection to a random
+    empty cell of an odd row, then adds or removes random intersections until there are
+    `len(grid) + 1` of them. It draws the same random numbers as `generate_neighbor` and so
+    produces the genome of the same grid.
+
+    Parameters:
+        genome (Genome): The current genome.
+
+    Returns:
+        Genome: A new genome with adjusted intersections.
+    """
+    layout = genome.layout
+    bits = genome.bits
+    target_intersections = layout.height + 1
+
+    intersections = layout.positions_of(bits)
+    if intersections:
+        # Randomly select an intersection to move to an empty cell in an odd row
+        position = random.choice(intersections)
+        empty_cells = layout.positions_of(~bits & layout.odd_row_mask)
+        if empty_cells:
+            new_position = random.choice(empty_cells)
+            bits &= ~(1 << layout.bits[position])
+            bits |= 1 << layout.bits[new_position]
+
+    intersections = layout.positions_of(bits)
+    current_intersections = len(intersections)
+
+    # Add intersections if needed
+    if current_intersections < target_intersections:
+        empty_cells = layout.positions_of(~bits & layout.full_mask)
+        while current_intersections < target_intersections and empty_cells:
+            new_position = random.choice(empty_cells)
+            bits |= 1 << layout.bits[new_position]
+            empty_cells.remove(new_position)
+            current_intersections += 1
+
+    # Remove intersections if needed
+    elif current_intersections > target_intersections:
+        while current_intersections > target_intersections:
+            position = random.choice(intersections)
+            bits &= ~(1 << layout.bits[position])
+            intersections.remove(position)
+            current_intersections -= 1
+
+    return Genome(layout, bits)
+
+
+def crossover_genomes(genome, new_genome, paths, new_paths, fitness_scores, new_fitness_scores):
+    """
+    Bitset version of `best_path_retention`: every building keeps the parent whose path
+    scores better, and the intersections along the kept paths are copied from that parent.
+    Like `best_path_retention`, a path node (x, y) copies the cell at row y, column x.
+
+    Parameters:
+        genome (Genome): The first parent.
+        new_genome (Genome): The second parent.
+        paths (list[list[tuple]]): The shortest paths of the first parent.
+        new_paths (list[list[tuple]]): The shortest paths of the second parent.
+        fitness_scores (dict): The `calculate_fitness` scores of the first parent's paths.
+        new_fitness_scores (dict): The `calculate_fitness` scores of the second parent's paths.
+
+    Returns:
+        Genome: The child genome.
+    """
+    layout_bits = genome.layout.bits
+    new_paths_dict = {path[0][0]: path for path in new_paths}
+
+    merged_bits = 0
+    for path in paths:
+        building = path[0][0]
+        if fitness_scores.get(building, float('inf')) <= new_fitness_scores.get(building, float('inf')):
+            selected_bits, selected_path = genome.bits, path
+        else:
+            selected_bits, selected_path = new_genome.bits, new_paths_dict[building]
+        for (x, y), _ in selected_path:
+            bit = layout_bits.get((y, x))
+            if bit is not None:
+                merged_bits = (merged_bits & ~(1 << bit)) | (selected_bits & (1 << bit))
+    return Genome(genome.layout, merged_bits)
@@ -1,8 +1,12 @@
 import random
+import numpy as np
+from utils.city_grid import CityGrid
 from grid_constants import NUM_BUILDINGS, NUM_EMERGENCY_SERVICES, GRID_WIDTH, GRID_HEIGHT
 
 
-def generate_city_grid_with_only_bordering_intersections():
+def generate_city_grid_with_only_bordering_intersections(width=GRID_WIDTH, height=GRID_HEIGHT,
+                                                          num_buildings=NUM_BUILDINGS,
+                                                          num_emergency_services=NUM_EMERGENCY_SERVICES):
     """
     Generates a city grid with buildings, emergency services, roads, and intersections.
     Buildings are placed only in alternate rows, and intersections are added as a border around the grid.
@@ -13,10 +17,14 @@ def generate_city_grid_with_only_bordering_intersections():
     3. Expands the grid to include a border of intersections (3) on all sides.
 
     Parameters:
-        None (Relies on constants: NUM_BUILDINGS, NUM_EMERGENCY_SERVICES, GRID_WIDTH, GRID_HEIGHT)
+        width (int): The number of columns of the grid, before its border. GRID_WIDTH by default.
+        height (int): The number of rows of the grid, before its border. GRID_HEIGHT by default.
+        num_buildings (int): The number of buildings to place. NUM_BUILDINGS by default.
+        num_emergency_services (int): The number of emergency services to place.
+                                      NUM_EMERGENCY_SERVICES by default.
 
     Returns:
-        list[list[int]]: A 2D grid where:
+        CityGrid: A 2D grid where:
                          - 0 represents roads,
                          - 1 represents buildings,
                          - 2 represents emergency services,
@@ -25,11 +33,6 @@ def generate_city_grid_with_only_bordering_intersections():
         ValueError: If the number of buildings and emergency services exceeds available positions
                     or if the grid size is insufficient for the required elements.
     """
-    num_buildings = NUM_BUILDINGS
-    num_emergency_services = NUM_EMERGENCY_SERVICES
-    width = GRID_WIDTH
-    height = GRID_HEIGHT
-
     # print(
     #     f"Generating grid with {num_buildings} buildings and {num_emergency_services} emergency services..."
     # )
@@ -83,7 +86,7 @@ def generate_city_grid_with_only_bordering_intersections():
     # for row in new_grid:
     #     print(row)
 
-    return new_grid
+    return CityGrid(new_grid)
 
 
 def place_intersections_in_every_column_randomly(grid):
@@ -96,19 +99,19 @@ def place_intersections_in_every_column_randomly(grid):
     3. Randomly selects one empty cell in the column to place an intersection (3), if possible.
 
     Parameters:
-        grid (list[list[int]]): A 2D grid representing the city.
+        grid (CityGrid): A 2D grid representing the city.
 
     Returns:
-        list[list[int]]: A modified 2D grid with intersections placed randomly in every column.
+        CityGrid: A modified 2D grid with intersections placed randomly in every column.
     """
     for col in range(len(grid[0])):  # Iterate over each column
         # Find rows in the current column that are empty (0)
-        possible_rows = [row for row in range(len(grid)) if grid[row][col] == 0]
+        possible_rows = np.flatnonzero(grid.array[:, col] == 0).tolist()
 
         # If there are empty spots in this column, place an intersection
         if possible_rows:
             selected_row = random.choice(possible_rows)
-            grid[selected_row][col] = 3  # Place intersection (3) at the selected position
+            grid[selected_row, col] = 3  # Place intersection (3) at the selected position
 
     # print("Grid generated after placing intersections in each column randomly:")
     # for row in grid:
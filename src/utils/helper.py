@@ -1,4 +1,5 @@
-from copy import deepcopy
+import contextlib
+import os
 import random
 from algorithms.cost_function import calculate_fitness
 
@@ -69,58 +70,41 @@ def generate_neighbor(grid):
     3. Ensures the total number of intersections matches the target by adding or removing intersections as needed.
 
     Parameters:
-        grid (list[list[int]]): The current city grid.
+        grid (CityGrid): The current city grid.
 
     Returns:
-        list[list[int]]: A new grid configuration with adjusted intersections.
+        CityGrid: A new grid configuration with adjusted intersections.
     """
-    new_grid = deepcopy(grid)
+    new_grid = grid.copy()
     target_intersections = len(new_grid) + 1
 
     # Find all intersections
-    intersections = [
-        (y, x) for y in range(1, len(new_grid) - 1)
-               for x in range(1, len(new_grid[0]) - 1)
-               if new_grid[y][x] == 3
-    ]
+    intersections = new_grid.intersections()
 
     if intersections:
         # Randomly select an intersection to move
         y, x = random.choice(intersections)
 
-        # Find empty cells (0) to move to
-        empty_cells = [
-            (new_y, new_x) for new_y in range(1, len(new_grid) - 1)
-                           for new_x in range(1, len(new_grid[0]) - 1)
-                           if (new_grid[new_y][new_x] == 0 and
-                               new_y % 2 != 0)  # Satisfies y % 2 != 0
-        ]
+        # Find empty cells (0) in odd rows to move to
+        empty_cells = new_grid.empty_odd_row_cells()
 
         if empty_cells:
             # Move the intersection to a random empty cell
             new_y, new_x = random.choice(empty_cells)
-            new_grid[y][x] = 0  # Remove from the current position
-            new_grid[new_y][new_x] = 3  # Place at the new position
+            new_grid[y, x] = 0  # Remove from the current position
+            new_grid[new_y, new_x] = 3  # Place at the new position
 
     # Recalculate the number of intersections
-    intersections = [
-        (y, x) for y in range(1, len(new_grid) - 1)
-               for x in range(1, len(new_grid[0]) - 1)
-               if new_grid[y][x] == 3
-    ]
+    intersections = new_grid.intersections()
 
     current_intersections = len(intersections)
 
     # Add intersections if needed
     if current_intersections < target_intersections:
-        empty_cells = [
-            (new_y, new_x) for new_y in range(1, len(new_grid) - 1)
-                           for new_x in range(1, len(new_grid[0]) - 1)
-                           if new_grid[new_y][new_x] == 0
-        ]
+        empty_cells = new_grid.empty_cells()
         while current_intersections < target_intersections and empty_cells:
             new_y, new_x = random.choice(empty_cells)
-            new_grid[new_y][new_x] = 3
+            new_grid[new_y, new_x] = 3
             empty_cells.remove((new_y, new_x))
             current_intersections += 1
 
@@ -128,7 +112,7 @@ def generate_neighbor(grid):
     elif current_intersections > target_intersections:
         while current_intersections > target_intersections:
             y, x = random.choice(intersections)
-            new_grid[y][x] = 0
+            new_grid[y, x] = 0
             intersections.remove((y, x))
             current_intersections -= 1
 
@@ -146,13 +130,13 @@ def best_path_retention(grid, new_grid, paths, new_paths):
     3. Resets all intersections in the merged grid before applying the selected configurations.
 
     Parameters:
-        grid (list[list[int]]): The current city grid.
-        new_grid (list[list[int]]): The new city grid configuration.
+        grid (CityGrid): The current city grid.
+        new_grid (CityGrid): The new city grid configuration.
         paths (list[list[tuple]]): Paths from the current grid.
         new_paths (list[list[tuple]]): Paths from the new grid.
 
     Returns:
-        list[list[int]]: The merged grid with updated intersections based on the best paths.
+        CityGrid: The merged grid with updated intersections based on the best paths.
     """
     # Initialize merged grid as a deep copy of the old grid
     old_paths_dict= {}
@@ -161,12 +145,10 @@ def best_path_retention(grid, new_grid, paths, new_paths):
     new_paths_dict = {}
     for path in new_paths:
         new_paths_dict[path[0][0]] = path
-    merged_grid = deepcopy(grid)
-    for i in range(1,len(merged_grid)-1):
-        for j in range(1,len(merged_grid[0])-1):
-            if merged_grid[i][j] == 3:
-                merged_grid[i][j] = 0
+    merged_grid = grid.copy()
     # Replace all 3s in merged grid with 0s
+    for i, j in merged_grid.intersections():
+        merged_grid[i, j] = 0
 
     current_fitness_scores = calculate_fitness(grid, paths)
     new_fitness_scores = calculate_fitness(new_grid, new_paths)
@@ -193,9 +175,25 @@ def best_path_retention(grid, new_grid, paths, new_paths):
     # print(selected_config)
     for building, (selected_grid, selected_path) in selected_config.items():
         for step in selected_path:
-            coord, _ = step  # Each step is ((x, y), 'direction')
+            coord, _ = step  # Each step is ((x, y), 'direction'), x being the column
             x, y = coord
             # Use the value from the selected grid at the given coordinate
-            merged_grid[x][y] = selected_grid[x][y]
+            merged_grid[y, x] = selected_grid[y][x]
   
-    return merged_grid
\ No newline at end of file
+    return merged_grid
+
+
+@contextlib.contextmanager
+def silenced_output(verbose=False):
+    """
+    Discards everything printed inside the context, unless `verbose` is set. The null
+    device the output goes to is closed on leaving the context.
+
+    Parameters:
+        verbose (bool): Whether to let the output through.
+    """
+    if verbose:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
@@ -0,0 +1,246 @@
+import numpy as np
+from utils.city_grid import CityGrid
+
+
+class PopulationTensor:
+    """
+    A whole population of city grids stored as one (pop, H, W) int8 NumPy array.
+
+    The variation operators of the genetic algorithm are implemented over the whole array at
+    once: `initialize` places intersections like `place_intersections_in_every_column_randomly`,
+    `mutate` moves and rebalances intersections like `generate_neighbor` and
+    `merge_intersections` performs the merge of `best_path_retention`. Every random choice
+    is uniform over the same candidates as in the grid operators, but the numbers are drawn
+    from a NumPy generator in bulk, so the resulting grids differ from those of the
+    one-grid-at-a-time operators under the same seed.
+
+    Attributes:
+        cells (numpy.ndarray): The (pop, H, W) int8 cell values of every grid.
+    """
+
+    def __init__(self, cells):
+        """
+        Parameters:
+            cells (numpy.ndarray): The (pop, H, W) cell values. Copied into an int8 array.
+        """
+        self.cells = np.array(cells, dtype=np.int8)
+        height, width = self.cells.shape[1:]
+        self._interior = np.zeros((height, width), dtype=bool)
+        self._interior[1:height - 1, 1:width - 1] = True
+        self._odd_rows = np.zeros((height, width), dtype=bool)
+        self._odd_rows[1::2, :] = True
+
+    @classmethod
+    def from_grids(cls, grids):
+        """
+        Stacks grids of the same shape into a population.
+
+        Parameters:
+            grids (list[CityGrid | list[list[int]]]): The grids.
+
+        Returns:
+            PopulationTensor: The population.
+        """
+        return cls(np.stack([grid.array if isinstance(grid, CityGrid) else np.asarray(grid) for grid in grids]))
+
+    @classmethod
+    def repeat(cls, grid, size):
+        """
+        Creates a population of identical copies of one grid.
+
+        Parameters:
+            grid (CityGrid): The grid to copy.
+            size (int): The number of copies.
+
+        Returns:
+            PopulationTensor: The population.
+        """
+        return cls(np.repeat(grid.array[np.newaxis], size, axis=0))
+
+    def __len__(self):
+        return self.cells.shape[0]
+
+    def __getitem__(self, index):
+        """
+        Returns:
+            CityGrid: The grid at the given position of the population.
+        """
+        return CityGrid(self.cells[index])
+
+    def to_grids(self):
+        """
+        Returns:
+            list[CityGrid]: Every grid of the population.
+        """
+        return [CityGrid(cells) for cells in self.cells]
+
+    def copy(self):
+        """
+        Returns:
+            PopulationTensor: An independent copy of the population.
+        """
+        return PopulationTensor(self.cells)
+
+    def intersection_counts(self):
+        """
+        Returns:
+            numpy.ndarray: The number of interior intersections of each grid.
+        """
+        return ((self.cells == 3) & self._interior).sum(axis=(1, 2))
+
+    def initialize(self, rng):
+        """
+        Vectorized `place_intersections_in_every_column_randomly`: places one intersection in
+        every column of every grid, on an empty cell chosen uniformly at random. Columns with
+        no empty cell are left untouched. Updates the population in place.
+
+        Parameters:
+            rng (numpy.random.Generator): The random generator.
+
+        Returns:
+            PopulationTensor: The population itself.
+        """
+        empty = self.cells == 0
+        keys = np.where(empty, rng.random(self.cells.shape), -1.0)
+        rows = keys.argmax(axis=1)  # (pop, W): the chosen row of each column
+        has_empty = empty.any(axis=1)
+        population_index, column = np.nonzero(has_empty)
+        self.cells[population_index, rows[population_index, column], column] = 3
+        return self
+
+    def mutate(self, rng, selected=None):
+        """
+        Vectorized `generate_neighbor`: in every selected grid, one interior intersection
+        chosen at random moves to a random empty interior cell of an odd row, then random
+        intersections are added on empty interior cells, or removed, until the grid holds
+        `len(grid) + 1` interior intersections.
+
+        Parameters:
+            rng (numpy.random.Generator): The random generator.
+            selected (numpy.ndarray): A boolean mask of the grids to mutate, all when None.
+
+        Returns:
+            PopulationTensor: A new population holding the mutated grids, the other grids
+                              being copied unchanged.
+        """
+        size, height, width = self.cells.shape
+        cells = self.cells.reshape(size, height * width).copy()
+        if selected is None:
+            selected = np.ones(size, dtype=bool)
+        interior = self._interior.ravel()
+        odd_interior = interior & self._odd_rows.ravel()
+        rows = np.arange(size)
+
+        # Move one random intersection to a random empty cell of an odd row
+        intersections = (cells == 3) & interior
+        targets = (cells == 0) & odd_interior
+        can_move = selected & intersections.any(axis=1) & targets.any(axis=1)
+        source = np.where(intersections, rng.random(cells.shape), -1.0).argmax(axis=1)
+        target = np.where(targets, rng.random(cells.shape), -1.0).argmax(axis=1)
+        cells[rows[can_move], source[can_move]] = 0
+        cells[rows[can_move], target[can_move]] = 3
+
+        # Rebalance to len(grid) + 1 intersections
+        intersections = (cells == 3) & interior
+        empty = (cells == 0) & interior
+        missing = height + 1 - intersections.sum(axis=1)
+        missing[~selected] = 0
+        cells[self._random_subset(rng, empty, np.maximum(missing, 0))] = 3
+        cells[self._random_subset(rng, intersections, np.maximum(-missing, 0))] = 0
+
+        return PopulationTensor(cells.reshape(size, height, width))
+
+    @staticmethod
+    def _random_subset(rng, candidates, counts):
+        """
+        Picks, in every row of a (pop, N) boolean array, `counts[row]` of its True entries
+        uniformly at random (all of them when there are fewer).
+
+        Returns:
+            numpy.ndarray: A (pop, N) boolean mask of the picked entries.
+        """
+        picked = np.zeros_like(candidates)
+        rows = np.flatnonzero(counts > 0)  # Usually only a few grids need rebalancing
+        if len(rows):
+            keys = np.where(candidates[rows], rng.random((len(rows), candidates.shape[1])), 2.0)
+            ranks = keys.argsort(axis=1).argsort(axis=1)
+            picked[rows] = candidates[rows] & (ranks < counts[rows, np.newaxis])
+        return picked
+
+    def merge_intersections(self, first, second, writes):
+        """
+        Vectorized merge of `best_path_retention` for a batch of parent pairs.
+
+        Every child starts from its first parent with the interior intersections removed.
+        Then, building after building, the cells along the path kept for that building are
+        copied from the parent whose path was kept, so a cell on several kept paths takes
+        its value from the last of them. The writes of all children are scattered into the
+        (n, H * W) cells at once, after dropping every write that a later one overrides.
+
+        Parameters:
+            first (numpy.ndarray): The (n,) population indexes of the first parents.
+            second (numpy.ndarray): The (n,) population indexes of the second parents.
+            writes (list[tuple]): For each child, the (cells, from_first) arrays of
+                                  `retention_writes`.
+
+        Returns:
+            PopulationTensor: The n children.
+        """
+        count = len(first)
+        first_cells = self.cells[first].reshape(count, -1)
+        second_cells = self.cells[second].reshape(count, -1)
+        children = np.where((first_cells == 3) & self._interior.ravel(), 0, first_cells).astype(np.int8)
+
+        child = np.repeat(np.arange(count), [len(cells) for cells, _ in writes])
+        cells = np.concatenate([cells for cells, _ in writes])
+        from_first = np.concatenate([from_first for _, from_first in writes])
+        # The last write to each cell of each child, found as the first one in reverse order
+        _, last = np.unique((child * first_cells.shape[1] + cells)[::-1], return_index=True)
+        last = len(cells) - 1 - last
+        child, cells, from_first = child[last], cells[last], from_first[last]
+        children[child, cells] = np.where(from_first, first_cells[child, cells], second_cells[child, cells])
+        return PopulationTensor(children.reshape((count,) + self.cells.shape[1:]))
+
+
+def path_cells(shape, paths):
+    """
+    Indexes the cells along each path of a grid, the way `best_path_retention` reads them:
+    a path node (x, y) stands for the cell at row y, column x.
+
+    Parameters:
+        shape (tuple): The (H, W) shape of the grid.
+        paths (list[list[tuple]]): The shortest paths of the grid.
+
+    Returns:
+        dict: The building (x, y) of each path mapped to the flat (row * W + column) indexes
+              of its cells, in the order of the paths.
+    """
+    width = shape[1]
+    return {path[0][0]: np.array([y * width + x for (x, y), _ in path], dtype=np.intp) for path in paths}
+
+
+def retention_writes(cells, new_cells, fitness_scores, new_fitness_scores):
+    """
+    Lists the cell writes of `best_path_retention` for one parent pair, the input of
+    `PopulationTensor.merge_intersections`: for each building, in the order of the first
+    parent's paths, the cells along the path with the better score, ties going to the first.
+
+    Parameters:
+        cells (dict): The `path_cells` of the first parent.
+        new_cells (dict): The `path_cells` of the second parent.
+        fitness_scores (dict): The `calculate_fitness` scores of the first parent's paths.
+        new_fitness_scores (dict): The `calculate_fitness` scores of the second parent's paths.
+
+    Returns:
+        tuple:
+            - numpy.ndarray: The flat indexes of the written cells, in the order of the writes.
+            - numpy.ndarray: Booleans, whether each write copies the first parent's cell.
+    """
+    written, from_first = [np.zeros(0, dtype=np.intp)], [np.zeros(0, dtype=bool)]
+    for building, path in cells.items():
+        keep_first = fitness_scores.get(building, float('inf')) <= new_fitness_scores.get(building, float('inf'))
+        kept = path if keep_first else new_cells.get(building)
+        if kept is not None:
+            written.append(kept)
+            from_first.append(np.full(len(kept), keep_first))
+    return np.concatenate(written), np.concatenate(from_first)
@@ -256,6 +256,7 @@ def visualize_city_grid_with_vehicles(grid, paths_with_directions, CELL_SIZE=40,
         paths.append(path_without_directions)
 
     print("visulaization for ", title)
+    grid = [list(row) for row in grid]  # Cells are relabelled with tile names below
     change_grid(grid)
     check_paths(grid, paths)
     print_grid(grid)
@@ -265,7 +266,7 @@ def visualize_city_grid_with_vehicles(grid, paths_with_directions, CELL_SIZE=40,
 
     pygame.init()
 
-    screen = pygame.display.set_mode((len(grid) * CELL_SIZE, len(grid) * CELL_SIZE))
+    screen = pygame.display.set_mode((len(grid[0]) * CELL_SIZE, len(grid) * CELL_SIZE))
     pygame.display.set_caption(title)
     
     # Define a list of light, distinct background colors for buildings
@@ -283,7 +284,7 @@ def visualize_city_grid_with_vehicles(grid, paths_with_directions, CELL_SIZE=40,
     building_colors_map = {}
     tree_images_map = {}
     for y in range(len(grid)):
-        for x in range(len(grid)):
+        for x in range(len(grid[0])):
             if grid[y][x] == 1:
                 building_image_map[(x, y)] = random.choice(images['buildings'])
                 building_colors_map[(x, y)] = random.choice(building_bg_colors)
@@ -333,7 +334,7 @@ def visualize_city_grid_with_vehicles(grid, paths_with_directions, CELL_SIZE=40,
         
         # Draw grid
         for y in range(len(grid)):
-            for x in range(len(grid)):
+            for x in range(len(grid[0])):
                 cell_value = grid[y][x]
                 if cell_value == 1:
                     # Draw building background and border
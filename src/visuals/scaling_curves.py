@@ -0,0 +1,70 @@
+import math
+from PIL import Image, ImageDraw, ImageFont
+
+SERIES_COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf"]
+
+
+def save_line_chart(series, title, x_label, y_label, output_path, log_scale=True, width=900, height=600):
+    """
+    Draws one line per series and saves the chart as an image.
+
+    With `log_scale`, both axes are logarithmic, so a power law n^k is a straight line of
+    slope k and a change of slope shows where the growth of a series changes order.
+
+    Parameters:
+        series (dict): The (x, y) points of each series, by label. Points with a
+                       non-positive coordinate are left out on a logarithmic scale.
+        title (str): The title of the chart.
+        x_label (str): The label of the horizontal axis.
+        y_label (str): The label of the vertical axis.
+        output_path (str): The path of the image to save.
+        log_scale (bool): Whether both axes are logarithmic.
+        width (int): The width of the image in pixels.
+        height (int): The height of the image in pixels.
+    """
+    def scale(value):
+        return math.log10(value) if log_scale else value
+
+    plotted = {label: sorted((scale(x), scale(y)) for x, y in points if not log_scale or (x > 0 and y > 0))
+               for label, points in series.items()}
+    plotted = {label: points for label, points in plotted.items() if points}
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    left, top, right, bottom = 80, 40, width - 220, height - 60
+    draw.text(((left + right) // 2 - 3 * len(title), 8), title, fill="black", font=font)
+    draw.rectangle([left, top, right, bottom], outline="black")
+    draw.text(((left + right) // 2 - 3 * len(x_label), bottom + 30), x_label, fill="black", font=font)
+    draw.text((8, top - 20), y_label, fill="black", font=font)
+    if not plotted:
+        image.save(output_path)
+        return
+
+    xs = [x for points in plotted.values() for x, _ in points]
+    ys = [y for points in plotted.values() for _, y in points]
+    x_min, x_max = min(xs), max(xs) if max(xs) > min(xs) else min(xs) + 1
+    y_min, y_max = min(ys), max(ys) if max(ys) > min(ys) else min(ys) + 1
+
+    def to_pixel(x, y):
+        return (left + (x - x_min) / (x_max - x_min) * (right - left),
+                bottom - (y - y_min) / (y_max - y_min) * (bottom - top))
+
+    # Ticks at both ends of each axis, in data units
+    for x in (x_min, x_max):
+        pixel_x, _ = to_pixel(x, y_min)
+        draw.text((pixel_x - 15, bottom + 8), f"{10 ** x if log_scale else x:.3g}", fill="black", font=font)
+    for y in (y_min, y_max):
+        _, pixel_y = to_pixel(x_min, y)
+        draw.text((8, pixel_y - 6), f"{10 ** y if log_scale else y:.3g}", fill="black", font=font)
+
+    for index, (label, points) in enumerate(plotted.items()):
+        color = SERIES_COLORS[index % len(SERIES_COLORS)]
+        pixels = [to_pixel(x, y) for x, y in points]
+        if len(pixels) > 1:
+            draw.line(pixels, fill=color, width=2)
+        for pixel_x, pixel_y in pixels:
+            draw.ellipse([pixel_x - 3, pixel_y - 3, pixel_x + 3, pixel_y + 3], fill=color)
+        draw.line([right + 15, top + 10 + 18 * index, right + 35, top + 10 + 18 * index], fill=color, width=2)
+        draw.text((right + 40, top + 4 + 18 * index), label, fill="black", font=font)
+    image.save(output_path)
@@ -67,16 +67,16 @@ def save_city_grid(grid, paths, dir_name,current_score, output_file_name):
     max_offset = 6  # Maximum offset to avoid overlapping
 
     # Image dimensions
-    grid_size = len(grid)
-    image_size = (grid_size * CELL_SIZE, grid_size * CELL_SIZE)
+    grid_height, grid_width = len(grid), len(grid[0])
+    image_size = (grid_width * CELL_SIZE, grid_height * CELL_SIZE)
 
     # Create a blank image and drawing object
     img = Image.new("RGB", image_size, (128, 128, 128))  # Gray background
     draw = ImageDraw.Draw(img)
 
     # Draw the grid elements (roads, intersections, buildings, emergency services)
-    for y in range(grid_size):
-        for x in range(grid_size):
+    for y in range(grid_height):
+        for x in range(grid_width):
             top_left = (x * CELL_SIZE, y * CELL_SIZE)
             bottom_right = (top_left[0] + CELL_SIZE, top_left[1] + CELL_SIZE)
             
@@ -120,7 +120,11 @@ def save_city_grid(grid, paths, dir_name,current_score, output_file_name):
     text_color = (255, 0, 0)  # White
     font_size = 40  # Adjust this value for larger or smaller text
     font_path = "arial.ttf"  # Replace with the path to a .ttf font file on your system
-    font = ImageFont.truetype(font_path, font_size)
+    try:
+        font = ImageFont.truetype(font_path, font_size)
+    except IOError:
+        # Fallback to default font if arial.ttf is unavailable
+        font = ImageFont.load_default()
 
     # Draw the text with the specified font
     draw.text(text_position, score_text, fill=text_color, font=font)
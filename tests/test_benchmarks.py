@@ -0,0 +1,73 @@
+import heapq
+import json
+import sys
+import pytest
+import benchmarks
+from benchmarks import BENCHMARKS, compare_results, count_node_expansions, run_benchmarks
+
+
+def benchmark_run(ops_per_sec, peak_memory_bytes=1000, node_expansions=50):
+    """A run of the two a_star benchmarks at size 15 with the given measures."""
+    return {"meta": {}, "results": [
+        {"benchmark": benchmark, "size": 15, "buildings": 18, "services": 4, "ops_per_sec": ops_per_sec[index],
+         "peak_memory_bytes": peak_memory_bytes, "node_expansions": node_expansions}
+        for index, benchmark in enumerate(BENCHMARKS[:2])]}
+
+
+def test_compare_results_flags_slowdowns_beyond_the_threshold():
+    comparisons, regressions = compare_results(benchmark_run([100.0, 100.0]), benchmark_run([95.0, 80.0], 2000, 0))
+
+    assert [comparison["speedup"] for comparison in comparisons] == [0.95, 0.8]
+    assert [comparison["memory_ratio"] for comparison in comparisons] == [2.0, 2.0]
+    assert [comparison["expansions_ratio"] for comparison in comparisons] == [0.0, 0.0]
+    assert [regression["benchmark"] for regression in regressions] == [BENCHMARKS[1]]
+    assert [regression["benchmark"] for regression in
+            compare_results(benchmark_run([100.0, 100.0]), benchmark_run([95.0, 80.0]), threshold=0.01)[1]] == \
+        list(BENCHMARKS[:2])
+    assert compare_results(benchmark_run([100.0, 100.0]), benchmark_run([95.0, 80.0]), threshold=0.3)[1] == []
+
+
+def test_compare_results_skips_scenarios_missing_from_the_base_run():
+    base, new = benchmark_run([100.0, 100.0], 0, 0), benchmark_run([50.0, 150.0], 0, 10)
+    base["results"].pop(0)
+
+    comparisons, regressions = compare_results(base, new)
+
+    assert [comparison["benchmark"] for comparison in comparisons] == [BENCHMARKS[1]]
+    assert (comparisons[0]["speedup"], comparisons[0]["memory_ratio"], comparisons[0]["expansions_ratio"]) == \
+        (1.5, 1.0, float('inf'))
+    assert regressions == []
+
+
+def test_count_node_expansions_restores_heappop():
+    heappop = heapq.heappop
+    with count_node_expansions() as expansions:
+        heap = [3, 1, 2]
+        heapq.heapify(heap)
+        heapq.heappop(heap)
+        heapq.heappop(heap)
+    assert expansions == [2] and heapq.heappop is heappop
+
+
+def test_seeded_runs_expand_the_same_nodes(capsys):
+    runs = [run_benchmarks([7], [(4, 2), (1000, 2)], seed=3, min_time=0.001, repeat=1) for _ in range(2)]
+
+    assert "Skipping size 7 with 1000 buildings" in capsys.readouterr().out
+    assert [result["benchmark"] for result in runs[0]["results"]] == list(BENCHMARKS)
+    for first, second in zip(*(run["results"] for run in runs)):
+        assert first["node_expansions"] == second["node_expansions"]
+        assert first["peak_memory_bytes"] > 0
+    assert runs[0]["results"][0]["node_expansions"] > 0
+
+
+def test_compare_command_exits_with_an_error_on_regressions(tmp_path, monkeypatch):
+    base_path, new_path = str(tmp_path / "base.json"), str(tmp_path / "new.json")
+    with open(base_path, "w") as base_file:
+        json.dump(benchmark_run([100.0, 100.0]), base_file)
+    for new_run, status in ((benchmark_run([100.0, 95.0]), 0), (benchmark_run([100.0, 50.0]), 1)):
+        with open(new_path, "w") as new_file:
+            json.dump(new_run, new_file)
+        monkeypatch.setattr(sys, "argv", ["benchmarks.py", "compare", base_path, new_path])
+        with pytest.raises(SystemExit) as exit_info:
+            benchmarks.main()
+        assert exit_info.value.code == status
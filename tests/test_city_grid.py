@@ -0,0 +1,114 @@
+import copy
+import pickle
+import random
+import pytest
+from utils.city_grid import CityGrid
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from utils.helper import generate_neighbor
+
+SEEDS = range(50)
+
+
+def place_intersections_in_list_grid(grid):
+    """The list-of-lists `place_intersections_in_every_column_randomly` CityGrid replaced."""
+    for col in range(len(grid[0])):
+        possible_rows = [row for row in range(len(grid)) if grid[row][col] == 0]
+        if possible_rows:
+            grid[random.choice(possible_rows)][col] = 3
+    return grid
+
+
+def generate_list_grid_neighbor(grid):
+    """The list-of-lists `generate_neighbor` CityGrid replaced."""
+    new_grid = copy.deepcopy(grid)
+    target_intersections = len(new_grid) + 1
+    interior = [(y, x) for y in range(1, len(new_grid) - 1) for x in range(1, len(new_grid[0]) - 1)]
+
+    intersections = [(y, x) for y, x in interior if new_grid[y][x] == 3]
+    if intersections:
+        y, x = random.choice(intersections)
+        empty_cells = [(new_y, new_x) for new_y, new_x in interior if new_grid[new_y][new_x] == 0 and new_y % 2 != 0]
+        if empty_cells:
+            new_y, new_x = random.choice(empty_cells)
+            new_grid[y][x] = 0
+            new_grid[new_y][new_x] = 3
+
+    intersections = [(y, x) for y, x in interior if new_grid[y][x] == 3]
+    current_intersections = len(intersections)
+    if current_intersections < target_intersections:
+        empty_cells = [(new_y, new_x) for new_y, new_x in interior if new_grid[new_y][new_x] == 0]
+        while current_intersections < target_intersections and empty_cells:
+            new_y, new_x = random.choice(empty_cells)
+            new_grid[new_y][new_x] = 3
+            empty_cells.remove((new_y, new_x))
+            current_intersections += 1
+    elif current_intersections > target_intersections:
+        while current_intersections > target_intersections:
+            y, x = random.choice(intersections)
+            new_grid[y][x] = 0
+            intersections.remove((y, x))
+            current_intersections -= 1
+    return new_grid
+
+
+def assert_index_matches_cells(grid):
+    rebuilt = CityGrid(grid.to_list())
+    assert grid.buildings() == rebuilt.buildings()
+    assert grid.emergency_services() == rebuilt.emergency_services()
+    assert grid.intersections() == rebuilt.intersections()
+    assert grid.empty_cells() == rebuilt.empty_cells()
+    assert grid.empty_odd_row_cells() == rebuilt.empty_odd_row_cells()
+    assert grid.key() == rebuilt.key()
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_seeded_operators_give_the_grids_of_the_list_versions(seed):
+    random.seed(seed)
+    initial_grid = generate_city_grid_with_only_bordering_intersections()
+    state = random.getstate()
+    grid = place_intersections_in_every_column_randomly(initial_grid.copy())
+    neighbors = [generate_neighbor(grid) for _ in range(5)]
+
+    random.setstate(state)
+    list_grid = place_intersections_in_list_grid(initial_grid.to_list())
+    list_neighbors = [generate_list_grid_neighbor(list_grid) for _ in range(5)]
+
+    assert grid == list_grid
+    assert neighbors == list_neighbors
+    for neighbor in neighbors:
+        assert_index_matches_cells(neighbor)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_cached_indexes_follow_cell_writes(seed):
+    random.seed(seed)
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    height, width = grid.shape
+    for write in range(100):
+        y, x = random.randrange(height), random.randrange(width)
+        grid[y, x] = random.choice([0, 1, 2, 3])
+        assert grid[y][x] == grid[y, x]  # The cached row of the written cell is rebuilt
+        if write % 10 == 0:
+            grid.intersections().clear()  # The cached sorted lists are only handed out as copies
+            assert_index_matches_cells(grid)
+    assert [list(row) for row in grid] == grid.to_list()
+    assert_index_matches_cells(grid)
+
+
+@pytest.mark.parametrize("seed", SEEDS[:10])
+def test_copies_and_pickles_are_independent_equal_grids(seed):
+    random.seed(seed)
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    copied, unpickled = grid.copy(), pickle.loads(pickle.dumps(grid))
+    assert copied == unpickled == grid
+    assert copied.key() == unpickled.key() == grid.key()
+    assert [list(row) for row in grid] == grid.to_list()
+
+    y, x = grid.empty_odd_row_cells()[0]
+    copied[y, x] = 3
+    assert grid[y][x] == unpickled[y][x] == 0
+    assert copied.key() != grid.key()
+    assert copied.changed_cells(grid) == [(y, x)]
+    assert_index_matches_cells(copied)
+    assert_index_matches_cells(grid)
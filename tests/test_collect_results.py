@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+import pytest
+from algorithms.island_model import collect_results
+
+
+def report(index, results):
+    results.put((index, {"index": index}))
+
+
+def exit_silently(index, results):
+    os._exit(3)
+
+
+def start(targets, results):
+    processes = [multiprocessing.Process(target=target, args=(index, results)) for index, target in enumerate(targets)]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def test_collects_every_outcome():
+    results = multiprocessing.Queue()
+    processes = start([report, report, report], results)
+    outcomes = collect_results(processes, results, "Worker")
+    for process in processes:
+        process.join()
+    assert sorted(outcome[0] for outcome in outcomes) == [0, 1, 2]
+
+
+def test_raises_when_a_process_exits_without_reporting():
+    results = multiprocessing.Queue()
+    processes = start([report, exit_silently], results)
+    with pytest.raises(RuntimeError, match="Worker 2 exited with code 3 without reporting"):
+        collect_results(processes, results, "Worker")
+    for process in processes:
+        process.join()
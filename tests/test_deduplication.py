@@ -0,0 +1,83 @@
+import os
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections
+from utils.genome import GenomeLayout, Genome
+from algorithms import genetic_algo
+from algorithms.genetic_algo import deduplicate_population, genetic_algorithm, initialize_population, \
+    MAX_IMMIGRANT_ATTEMPTS
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+SEEDS = range(20)
+
+
+def population_with_copies(seed):
+    """Six genomes of which the last three copy the first, third and second ones."""
+    random.seed(seed)
+    initial_grid = generate_city_grid_with_only_bordering_intersections()
+    layout = GenomeLayout(initial_grid)
+    genomes = [Genome.from_grid(layout, grid) for grid in initialize_population(3, initial_grid)]
+    return genomes + [genomes[0], genomes[2], genomes[1]], layout, initial_grid
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_skip_policy_scores_each_genome_once(seed):
+    population, layout, initial_grid = population_with_copies(seed)
+
+    members, unique_grids, owners, evaluations_saved, immigrants = deduplicate_population(
+        population, "skip", layout, initial_grid)
+
+    assert members == population
+    assert unique_grids == population[:3]
+    assert owners == [0, 1, 2, 0, 2, 1]
+    assert (evaluations_saved, immigrants) == (3, 0)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_immigrants_policy_replaces_copies_with_new_genomes(seed):
+    population, layout, initial_grid = population_with_copies(seed)
+
+    members, unique_grids, owners, evaluations_saved, immigrants = deduplicate_population(
+        population, "immigrants", layout, initial_grid)
+
+    assert members[:3] == population[:3]
+    assert len(set(members)) == len(members) == len(unique_grids)
+    assert unique_grids == members and owners == list(range(6))
+    assert (evaluations_saved, immigrants) == (0, 3)
+
+
+def test_copies_are_kept_when_every_immigrant_is_a_copy(monkeypatch):
+    population, layout, initial_grid = population_with_copies(0)
+    draws = []
+
+    def copy_of_the_first_genome(size, grid):
+        draws.append(size)
+        return [population[0].to_grid()]
+
+    monkeypatch.setattr(genetic_algo, "initialize_population", copy_of_the_first_genome)
+    members, _, owners, evaluations_saved, immigrants = deduplicate_population(
+        population[:4], "immigrants", layout, initial_grid)
+
+    assert members == population[:4] and owners == [0, 1, 2, 0]
+    assert (evaluations_saved, immigrants, len(draws)) == (1, 0, MAX_IMMIGRANT_ATTEMPTS)
+
+
+def test_skipping_copies_leaves_the_run_unchanged(tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+
+    def score_every_member(population, policy, layout, initial_grid):
+        return population, list(population), list(range(len(population))), 0, 0
+
+    results = []
+    for deduplicate in (deduplicate_population, score_every_member):
+        monkeypatch.setattr(genetic_algo, "deduplicate_population", deduplicate)
+        random.seed(0)
+        initial_grid = generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2)
+        results.append(genetic_algorithm(8, 3, 0.2, initial_grid, dir_path=str(tmp_path)))
+    assert results[0] == results[1]
+
+
+def test_unknown_duplicate_policy_is_rejected():
+    with pytest.raises(ValueError):
+        genetic_algorithm(4, 1, 0.5, generate_city_grid_with_only_bordering_intersections(), duplicates="drop")
+
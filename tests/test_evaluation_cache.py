@@ -0,0 +1,114 @@
+import os
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from algorithms.a_star_algo import find_all_shortest_paths
+from algorithms.cost_function import calculate_fitness
+from algorithms import evaluation_cache as evaluation_cache_module, genetic_algo
+from algorithms.evaluation_cache import EvaluationCache, SharedFitnessStore, configure_evaluation_cache
+from algorithms.genetic_algo import genetic_algorithm
+from utils.genome import GenomeLayout, Genome
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+
+
+def random_grids(seed, count):
+    random.seed(seed)
+    initial_grid = generate_city_grid_with_only_bordering_intersections()
+    return [place_intersections_in_every_column_randomly(initial_grid.copy()) for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cached_evaluations_match_uncached_ones(seed):
+    grids = random_grids(seed, 3)
+    cache = EvaluationCache()
+    layout = GenomeLayout(grids[0])
+
+    for _ in range(2):
+        for grid in grids:
+            shortest_paths = find_all_shortest_paths(grid)
+            fitness_scores = calculate_fitness(grid, shortest_paths)
+            assert cache.fitness(Genome.from_grid(layout, grid)) == fitness_scores
+            assert cache.evaluate(grid) == (shortest_paths, fitness_scores)
+            assert cache.fitness(grid.to_list()) == fitness_scores
+        assert cache.fitness_many(grids + grids) == [calculate_fitness(grid, find_all_shortest_paths(grid))
+                                                     for grid in grids + grids]
+
+    # Genomes and grids have their own entries, list grids share the entry of their CityGrid
+    assert (len(cache), cache.hits, cache.misses, cache.evictions) == (6, 24, 6, 0)
+
+
+def test_least_recently_used_grids_are_evicted_first():
+    first, second, third = random_grids(0, 3)
+    cache = EvaluationCache(max_entries=2)
+
+    cache.fitness(first)
+    cache.fitness(second)
+    cache.fitness(first)  # Now the most recently used
+    cache.fitness(third)  # Evicts the second grid
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 3, 1)
+
+    cache.fitness(first)
+    cache.fitness(second)
+    assert (cache.hits, cache.misses, cache.evictions, len(cache)) == (2, 4, 2, 2)
+    assert cache.hit_rate() == 2 / 6
+
+    cache.evaluate(second)  # Cached without paths, so searched again
+    assert (cache.hits, cache.misses, len(cache)) == (2, 5, 2)
+
+
+def test_disabled_cache_computes_every_lookup():
+    grid = random_grids(0, 1)[0]
+    cache = EvaluationCache(enabled=False)
+
+    for _ in range(2):
+        assert cache.fitness(grid) == cache.evaluate(grid)[1] == calculate_fitness(grid, find_all_shortest_paths(grid))
+    assert cache.fitness_many([grid, grid]) == [cache.fitness(grid)] * 2
+    assert (len(cache), cache.hits, cache.misses) == (0, 0, 7)
+
+
+def test_configure_evaluation_cache_shrinks_and_disables_the_process_wide_cache(monkeypatch):
+    cache = EvaluationCache()
+    monkeypatch.setattr(evaluation_cache_module, "evaluation_cache", cache)
+    grids = random_grids(0, 3)
+    evaluation_cache_module.cached_fitness_many(grids)
+
+    configure_evaluation_cache(max_entries=1)
+    assert (len(cache), cache.evictions) == (1, 2)
+    assert evaluation_cache_module.cached_fitness(grids[2], with_paths=False) is cache.fitness(grids[2])
+
+    configure_evaluation_cache(enabled=False)
+    assert len(cache) == 0
+    evaluation_cache_module.cached_shortest_paths(grids[2])
+    assert len(cache) == 0
+
+
+def test_genetic_algorithm_results_do_not_depend_on_the_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    results = []
+    for enabled in (True, False):
+        cache = EvaluationCache(enabled=enabled)
+        monkeypatch.setattr(evaluation_cache_module, "evaluation_cache", cache)
+        monkeypatch.setattr(genetic_algo, "evaluation_cache", cache)
+        random.seed(0)
+        initial_grid = generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2)
+        results.append(genetic_algorithm(8, 3, 0.5, initial_grid, dir_path=str(tmp_path / str(enabled))))
+        assert (cache.hits > 0) == enabled
+    assert results[0] == results[1]
+
+
+def test_evaluate_reuses_shared_scores_and_counts_them_as_scoring_hits():
+    random.seed(0)
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    store = SharedFitnessStore()
+    publisher, reader = EvaluationCache(), EvaluationCache()
+    publisher.shared = reader.shared = store
+
+    publisher.evaluate(grid)
+    shortest_paths, fitness_scores = reader.evaluate(grid)
+
+    assert shortest_paths == find_all_shortest_paths(grid)
+    assert fitness_scores == calculate_fitness(grid, shortest_paths)
+    assert (store.published, store.hits, store.scoring_hits, store.misses) == (1, 0, 1, 1)
+    assert reader.fitness(grid) is fitness_scores
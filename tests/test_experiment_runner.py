@@ -0,0 +1,73 @@
+import os
+import pytest
+from experiment_runner import RESULT_FIELDS, read_results, run_experiments, trial_seed
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+OPTIONS = {"local_search_options": {"max_iterations": 5},
+           "genetic_algorithm_options": {"population_size": 4, "generations": 1},
+           "grid_options": {"width": 7, "height": 7, "num_buildings": 4, "num_emergency_services": 2}}
+
+
+def scores(rows):
+    """The rows without their timings, which vary from run to run."""
+    return [{field: row[field] for field in RESULT_FIELDS if not field.endswith("_seconds")} for row in rows]
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+
+    def run_batch(num_trials, file_name, **options):
+        return run_experiments(num_trials, str(tmp_path / file_name), output_dir=str(tmp_path / "trials"),
+                               **{"max_workers": 1, **OPTIONS, **options})
+    return run_batch
+
+
+@pytest.mark.parametrize("file_name", ["results.csv", "results.jsonl"])
+def test_trials_do_not_depend_on_the_number_of_workers(run, tmp_path, file_name):
+    rows, results = run(3, "single_" + file_name, base_seed=5)
+    pooled_rows, pooled_results = run(3, "pooled_" + file_name, base_seed=5, max_workers=2)
+
+    assert [row["seed"] for row in rows] == [trial_seed(5, trial) for trial in range(3)]
+    assert scores(pooled_rows) == scores(rows)
+    assert sorted(row["trial"] for row in read_results(str(tmp_path / ("pooled_" + file_name)))) == [0, 1, 2]
+    assert sorted(pooled_results) == sorted(results) == [0, 1, 2]
+    assert pooled_results[1][0] == results[1][0] and pooled_results[1][2] == results[1][2]
+
+
+def test_genetic_algorithm_scored_in_a_pool_matches_the_serial_run(run):
+    runs = [run(1, f"results_{max_workers}.csv", base_seed=2,
+                genetic_algorithm_options={"population_size": 40, "generations": 2, "max_workers": max_workers})
+            for max_workers in (1, 2)]
+
+    (rows, results), (pooled_rows, pooled_results) = runs
+    assert scores(pooled_rows) == scores(rows)
+    assert pooled_results[0][2:] == results[0][2:]
+
+
+@pytest.mark.parametrize("file_name", ["results.csv", "results.jsonl"])
+def test_resumed_batches_only_run_the_missing_trials(run, tmp_path, file_name):
+    output_path = str(tmp_path / file_name)
+    full_rows, _ = run(3, "full_" + file_name)
+    run(2, file_name)
+    with open(output_path, "a") as results_file:
+        results_file.write("2,3")  # A row cut short by a crash
+
+    rows, results = run(3, file_name)
+
+    assert sorted(results) == [2]
+    assert scores(rows) == scores(full_rows)
+    assert scores(read_results(output_path)) == scores(full_rows)
+
+
+def test_batches_start_over_without_resume(run, tmp_path):
+    run(2, "results.csv")
+    rows, results = run(1, "results.csv", resume=False)
+    assert sorted(results) == [0] and [row["trial"] for row in read_results(str(tmp_path / "results.csv"))] == [0]
+    assert len(rows) == 1
+
+
+def test_resuming_with_another_base_seed_is_rejected(run):
+    run(1, "results.csv", base_seed=1)
+    with pytest.raises(ValueError, match="another base seed"):
+        run(2, "results.csv", base_seed=2)
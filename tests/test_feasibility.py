@@ -0,0 +1,111 @@
+import os
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from algorithms.transition_graph import TransitionGraph
+from algorithms.incremental_search import evaluate_from_scratch
+from algorithms.feasibility import FeasibilityFilter, unreachable_buildings
+from algorithms.local_search import local_search_algorithm
+from algorithms.genetic_algo import genetic_algorithm
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+SEEDS = range(10)
+
+
+def intact_and_broken_grids(seed):
+    """A random grid, and the same grid without the intersections of its left and right borders."""
+    random.seed(seed)
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    broken_grid = grid.copy()
+    height, width = grid.shape
+    for y in range(height):
+        broken_grid[y, 0] = broken_grid[y, width - 1] = 0
+    return grid, broken_grid
+
+
+def buildings_left_out(grid, fitness_scores):
+    return sorted({(x, y) for y, x in grid.buildings()} - set(fitness_scores))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_unreachable_buildings_are_those_left_out_of_the_fitness_scores(seed):
+    grid, broken_grid = intact_and_broken_grids(seed)
+    broken_state = evaluate_from_scratch(broken_grid)
+
+    assert unreachable_buildings(TransitionGraph(grid)) == []
+    assert unreachable_buildings(broken_state.graph) == buildings_left_out(broken_grid, broken_state.fitness_scores)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_unreachable_buildings_from_a_search_state_match_a_full_check(seed):
+    grid, broken_grid = intact_and_broken_grids(seed)
+    state, broken_state = evaluate_from_scratch(grid), evaluate_from_scratch(broken_grid)
+    changed_cells = grid.changed_cells(broken_grid)
+
+    assert unreachable_buildings(broken_state.graph, state, changed_cells) == unreachable_buildings(broken_state.graph)
+    assert unreachable_buildings(state.graph, broken_state, changed_cells) == []
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_feasibility_policies_score_unreachable_buildings(seed):
+    grid, broken_grid = intact_and_broken_grids(seed)
+    broken_state = evaluate_from_scratch(broken_grid)
+    fitness_scores = broken_state.fitness_scores
+    missing = len(buildings_left_out(broken_grid, fitness_scores))
+    height, width = grid.shape
+    assert missing > 0
+
+    assert FeasibilityFilter(grid).policy == "penalize"
+    assert FeasibilityFilter(grid, "ignore").fitness(fitness_scores) == sum(fitness_scores.values())
+    assert FeasibilityFilter(grid, "ignore").average(fitness_scores) == \
+        sum(fitness_scores.values()) / len(fitness_scores)
+    assert FeasibilityFilter(grid).average(fitness_scores) == \
+        (sum(fitness_scores.values()) + height * width * missing) / len(grid.buildings())
+    assert FeasibilityFilter(grid, "penalize").fitness(fitness_scores) == \
+        sum(fitness_scores.values()) + height * width * missing
+    assert FeasibilityFilter(grid, "reject", penalty=7).fitness(fitness_scores) == \
+        sum(fitness_scores.values()) + 7 * missing
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_only_the_reject_policy_turns_down_infeasible_neighbors_of_feasible_grids(seed):
+    grid, broken_grid = intact_and_broken_grids(seed)
+    state, broken_state = evaluate_from_scratch(grid), evaluate_from_scratch(broken_grid)
+    changed_cells = grid.changed_cells(broken_grid)
+
+    for policy in ("ignore", "penalize"):
+        feasibility_filter = FeasibilityFilter(grid, policy)
+        assert feasibility_filter.admits(broken_state.graph, state, changed_cells)
+        assert feasibility_filter.rejected == 0
+
+    feasibility_filter = FeasibilityFilter(grid, "reject")
+    assert not feasibility_filter.admits(broken_state.graph, state, changed_cells)
+    assert feasibility_filter.admits(state.graph, broken_state, changed_cells)  # Towards a feasible grid
+    assert feasibility_filter.admits(broken_state.graph, broken_state, [])  # From an infeasible grid
+    assert feasibility_filter.rejected == 1
+
+
+def test_unknown_feasibility_policy_is_rejected():
+    grid, _ = intact_and_broken_grids(0)
+    with pytest.raises(ValueError):
+        FeasibilityFilter(grid, "drop")
+
+
+@pytest.mark.parametrize("algorithm", ["local_search", "genetic_algorithm"])
+def test_unreachable_buildings_are_penalized_by_default(algorithm, tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    results = {}
+    for feasibility in (None, "ignore", "penalize"):
+        _, broken_grid = intact_and_broken_grids(3)
+        options = {"feasibility": feasibility} if feasibility else {}
+        random.seed(0)
+        if algorithm == "local_search":
+            _, _, score = local_search_algorithm(broken_grid, max_iterations=0, dir_path=str(tmp_path), **options)
+        else:
+            _, _, score = genetic_algorithm(4, 1, 0.5, broken_grid, dir_path=str(tmp_path), **options)
+        results[feasibility] = score
+
+    assert results[None] == results["penalize"]
+    # Leaving the buildings out makes the grid look better than it is
+    assert results["ignore"] < results["penalize"]
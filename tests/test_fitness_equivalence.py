@@ -0,0 +1,62 @@
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from algorithms.a_star_algo import find_all_shortest_paths, find_all_path_costs
+from algorithms.batch_evaluation import batch_fitness
+from algorithms.bounded_evaluation import evaluate_with_cutoff
+from algorithms.corridor_graph import CorridorGraph, find_all_path_costs as find_corridor_path_costs
+from algorithms.hierarchical_search import HierarchicalGraph, find_all_path_costs as find_hierarchical_path_costs
+from algorithms.cost_function import calculate_fitness, calculate_fitness_from_path_costs
+
+SEEDS = range(120)
+
+
+def rectangular_grid(seed):
+    """
+    Generates a grid whose width and height are drawn independently, so that both wide and
+    tall grids are covered, with intersections placed in every column.
+    """
+    random.seed(seed)
+    width, height = random.randint(3, 15), random.randint(3, 15)
+    slots = (height // 2) * width
+    num_buildings = random.randint(1, max(1, slots // 2))
+    num_emergency_services = random.randint(1, max(1, min(4, slots - num_buildings)))
+    grid = generate_city_grid_with_only_bordering_intersections(width, height, num_buildings, num_emergency_services)
+    return place_intersections_in_every_column_randomly(grid)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_distance_only_fitness_matches_calculate_fitness(seed):
+    grid = rectangular_grid(seed)
+    expected = calculate_fitness(grid, find_all_shortest_paths(grid))
+    assert calculate_fitness_from_path_costs(grid, find_all_path_costs(grid)) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batch_fitness_matches_calculate_fitness(seed):
+    grid = rectangular_grid(seed)
+    population = [grid] + [place_intersections_in_every_column_randomly(grid.copy()) for _ in range(3)]
+    expected = [calculate_fitness(member, find_all_shortest_paths(member)) for member in population]
+    assert batch_fitness(population) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_bounded_evaluation_matches_calculate_fitness(seed):
+    grid = rectangular_grid(seed)
+    scores, _ = evaluate_with_cutoff(grid)
+    assert scores == calculate_fitness(grid, find_all_shortest_paths(grid))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_corridor_path_costs_match_calculate_fitness(seed):
+    grid = rectangular_grid(seed)
+    path_costs = find_corridor_path_costs(CorridorGraph(grid))
+    assert calculate_fitness_from_path_costs(grid, path_costs) == calculate_fitness(grid, find_all_shortest_paths(grid))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_hierarchical_path_costs_match_calculate_fitness(seed):
+    grid = rectangular_grid(seed)
+    path_costs = find_hierarchical_path_costs(HierarchicalGraph(grid, block_size=4))
+    assert calculate_fitness_from_path_costs(grid, path_costs) == calculate_fitness(grid, find_all_shortest_paths(grid))
@@ -0,0 +1,64 @@
+import pickle
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from utils.genome import GenomeLayout, Genome, mutate_genome, crossover_genomes
+from utils.helper import generate_neighbor, best_path_retention
+from algorithms.a_star_algo import find_all_shortest_paths
+from algorithms.cost_function import calculate_fitness
+
+SEEDS = range(100)
+
+
+def random_grid(seed):
+    random.seed(seed)
+    return place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_mutate_genome_draws_the_neighbor_of_generate_neighbor(seed):
+    grid = random_grid(seed)
+    layout = GenomeLayout(grid)
+    genome = Genome.from_grid(layout, grid)
+
+    state = random.getstate()
+    neighbors = [generate_neighbor(grid)]
+    for _ in range(2):
+        neighbors.append(generate_neighbor(neighbors[-1]))
+    random.setstate(state)
+    mutants = [mutate_genome(genome)]
+    for _ in range(2):
+        mutants.append(mutate_genome(mutants[-1]))
+
+    assert [mutant.to_grid() for mutant in mutants] == neighbors
+    assert mutants == [Genome.from_grid(layout, neighbor) for neighbor in neighbors]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_crossover_genomes_reproduces_best_path_retention(seed):
+    grid = random_grid(seed)
+    new_grid = generate_neighbor(grid)
+    paths, new_paths = find_all_shortest_paths(grid), find_all_shortest_paths(new_grid)
+    layout = GenomeLayout(grid)
+
+    child = crossover_genomes(Genome.from_grid(layout, grid), Genome.from_grid(layout, new_grid), paths, new_paths,
+                              calculate_fitness(grid, paths), calculate_fitness(new_grid, new_paths))
+
+    assert child.to_grid() == best_path_retention(grid, new_grid, paths, new_paths)
+
+
+@pytest.mark.parametrize("seed", SEEDS[:10])
+def test_genomes_compare_and_pickle_by_layout_and_bits(seed):
+    grid = random_grid(seed)
+    layout = GenomeLayout(grid)
+    genome = Genome.from_grid(layout, grid)
+    copy = pickle.loads(pickle.dumps(genome))
+
+    assert genome.to_grid() == grid
+    assert copy.layout is not layout and copy == genome and hash(copy) == hash(genome)
+    assert copy.key() == genome.key()
+    assert Genome.from_grid(GenomeLayout(grid), grid) == genome
+
+    other_layout = GenomeLayout(random_grid(seed + len(SEEDS)))
+    assert Genome(other_layout, genome.bits) != genome
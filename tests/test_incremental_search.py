@@ -0,0 +1,38 @@
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from utils.helper import generate_neighbor
+from algorithms.a_star_algo import find_all_shortest_paths
+from algorithms.incremental_search import evaluate_from_scratch, reevaluate
+
+SEEDS = range(20)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_cutoff_repair_gives_up_only_on_grids_scoring_no_better(seed):
+    random.seed(seed)
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    state = evaluate_from_scratch(grid)
+    cutoff = sum(state.fitness_scores.values())
+    order = sorted(state.fitness_scores, key=lambda building: state.fitness_scores[building], reverse=True)
+    for _ in range(20):
+        neighbor = generate_neighbor(grid)
+        expected = reevaluate(neighbor, state)
+        repaired = reevaluate(neighbor, state, cutoff=cutoff, order=order)
+        if sum(expected.fitness_scores.values()) >= cutoff:
+            assert repaired is None
+        else:
+            assert repaired.fitness_scores == expected.fitness_scores
+            assert repaired.shortest_paths == expected.shortest_paths
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_repaired_paths_match_a_fresh_search(seed):
+    random.seed(seed)
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    state = evaluate_from_scratch(grid)
+    for _ in range(20):
+        neighbor = generate_neighbor(state.grid)
+        state = reevaluate(neighbor, state)
+        assert state.shortest_paths == find_all_shortest_paths(neighbor)
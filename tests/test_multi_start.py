@@ -0,0 +1,34 @@
+import os
+import random
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections
+from algorithms import multi_start
+from algorithms.multi_start import multi_start_local_search
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+
+
+def test_seeded_climbs_do_not_depend_on_the_workers_or_their_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    local_search_algorithm = multi_start.local_search_algorithm
+
+    def in_process_climb(grid, **options):
+        # Workers are forked, so they run this wrapper too
+        assert options["max_workers"] == 1
+        return local_search_algorithm(grid, **options)
+
+    monkeypatch.setattr(multi_start, "local_search_algorithm", in_process_climb)
+    random.seed(0)
+    grid = generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2)
+
+    results = []
+    for max_workers in (1, 3):
+        best_grid, best_paths, best_score, traces = multi_start_local_search(
+            grid, 4, max_workers=max_workers, seed=7, patience=None, dir_path=str(tmp_path / str(max_workers)),
+            max_iterations=15, num_candidates=3)
+        for trace in traces:
+            del trace["seconds"]
+        results.append((best_grid, best_paths, best_score, traces))
+
+    assert results[0] == results[1]
+    assert [trace["start"] for trace in results[0][3]] == list(range(4))
+    assert results[0][2] == min(trace["best_score"] for trace in results[0][3])
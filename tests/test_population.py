@@ -0,0 +1,90 @@
+import os
+import random
+import numpy as np
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from utils.helper import best_path_retention, generate_neighbor
+from utils.population import PopulationTensor, path_cells, retention_writes
+from algorithms.a_star_algo import find_all_shortest_paths
+from algorithms.cost_function import calculate_fitness
+from algorithms.genetic_algo import genetic_algorithm
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+SEEDS = range(10)
+SIZES = [(13, 13), (15, 9), (9, 15)]
+
+
+def random_grid(size):
+    return place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections(*size))
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_initialize_places_intersections_like_the_grid_operator(size, seed):
+    random.seed(seed)
+    initial_grid = generate_city_grid_with_only_bordering_intersections(*size)
+    population = PopulationTensor.repeat(initial_grid, 8).initialize(np.random.default_rng(seed))
+
+    # One intersection on an empty cell of every column the grid operator fills
+    expected = place_intersections_in_every_column_randomly(initial_grid.copy()).array != initial_grid.array
+    assert expected.sum(axis=0).max() == 1
+    for grid in population.to_grids():
+        changed = grid.array != initial_grid.array
+        assert (changed.sum(axis=0) == expected.sum(axis=0)).all()
+        assert (initial_grid.array[changed] == 0).all() and (grid.array[changed] == 3).all()
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_mutate_rebalances_intersections_like_the_grid_operator(size, seed):
+    random.seed(seed)
+    grids = [random_grid(size) for _ in range(6)]
+    population = PopulationTensor.from_grids(grids)
+    selected = np.arange(len(grids)) % 2 == 0
+
+    mutated = population.mutate(np.random.default_rng(seed), selected)
+
+    for grid, mutated_grid, is_selected in zip(grids, mutated.to_grids(), selected):
+        if not is_selected:
+            assert mutated_grid == grid
+            continue
+        neighbor = generate_neighbor(grid)
+        assert len(mutated_grid.intersections()) == len(neighbor.intersections()) == len(grid) + 1
+        # Only intersections and empty cells off the border change
+        changed = mutated_grid.array != grid.array
+        assert set(grid.array[changed]) <= {0, 3}
+        assert not changed[0].any() and not changed[-1].any()
+        assert not changed[:, 0].any() and not changed[:, -1].any()
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_merge_intersections_reproduces_best_path_retention(size, seed):
+    random.seed(seed)
+    grids = [random_grid(size) for _ in range(4)]
+    grids += [generate_neighbor(grid) for grid in grids]
+    paths = [find_all_shortest_paths(grid) for grid in grids]
+    fitness_scores = [calculate_fitness(grid, grid_paths) for grid, grid_paths in zip(grids, paths)]
+    population = PopulationTensor.from_grids(grids)
+    first, second = np.arange(4), np.arange(4, 8)
+
+    cells = [path_cells(population.cells.shape[1:], grid_paths) for grid_paths in paths]
+    writes = [retention_writes(cells[i], cells[j], fitness_scores[i], fitness_scores[j]) for i, j in zip(first, second)]
+    children = population.merge_intersections(first, second, writes)
+
+    assert children.to_grids() == [best_path_retention(grids[i], grids[j], paths[i], paths[j])
+                                   for i, j in zip(first, second)]
+
+
+def test_genetic_algorithm_with_tensor_operators_is_reproducible(tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    results = []
+    for run in range(2):
+        random.seed(0)
+        initial_grid = generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2)
+        best_grid, best_paths, best_fitness = genetic_algorithm(
+            6, 3, 0.5, initial_grid, tensor_operators=True, dir_path=str(tmp_path / str(run)))
+        assert best_paths == find_all_shortest_paths(best_grid)
+        results.append((best_grid, best_fitness))
+    assert results[0] == results[1]
@@ -0,0 +1,77 @@
+import os
+import random
+import numpy as np
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from algorithms import evaluation_cache as evaluation_cache_module, genetic_algo
+from algorithms.evaluation_cache import EvaluationCache, SharedFitnessStore
+from algorithms.genetic_algo import genetic_algorithm
+from algorithms.local_search import local_search_algorithm
+from algorithms.portfolio import portfolio_search
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+LOCAL_SEARCH_OPTIONS = {"max_iterations": 15}
+GENETIC_ALGORITHM_OPTIONS = {"population_size": 6, "generations": 2, "mutation_rate": 0.2}
+
+
+def initial_grid():
+    random.seed(0)
+    return generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2)
+
+
+def test_shared_store_counts_lookups_by_kind():
+    grid = place_intersections_in_every_column_randomly(initial_grid())
+    store = SharedFitnessStore()
+
+    assert store.get(grid) is None
+    store.put(grid, {(1, 1): 3.0})
+    assert store.get(grid) == {(1, 1): 3.0}
+    assert store.get(grid.copy(), scoring_only=True) == {(1, 1): 3.0}
+    store.local_hits = 2
+    assert (store.misses, store.hits, store.scoring_hits, store.published) == (1, 1, 1, 1)
+    assert store.hit_share() == 3 / 5
+
+
+def test_local_search_reuses_a_shared_store_without_changing_its_climb(tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    grid = initial_grid()
+    store = SharedFitnessStore()
+    results = []
+    for run in range(2):
+        random.seed(1)
+        results.append(local_search_algorithm(grid.copy(), max_table_entries=0, shared_store=store,
+                                              dir_path=str(tmp_path / str(run)), **LOCAL_SEARCH_OPTIONS))
+        if run == 0:
+            published, hits = store.published, store.hits
+    random.seed(1)
+    standalone = local_search_algorithm(grid.copy(), max_table_entries=0, dir_path=str(tmp_path / "standalone"),
+                                        **LOCAL_SEARCH_OPTIONS)
+
+    assert results[0] == results[1] == standalone
+    # The second climb only searches its initial grid, for its paths, and reads the rest from the store
+    assert published > 1 and store.published == published + 1
+    assert store.hits > hits
+
+
+def test_members_accept_the_grids_of_standalone_runs(tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    grid = initial_grid()
+    best_grid, best_paths, best_score, report = portfolio_search(
+        grid, LOCAL_SEARCH_OPTIONS, GENETIC_ALGORITHM_OPTIONS, restarts=1, seed=3, dir_path=str(tmp_path / "portfolio"))
+
+    members = report["members"]
+    assert [stats["algorithm"] for stats in members] == ["local_search", "genetic_algorithm"] * 2
+    assert best_score == min(stats["best_score"] for stats in members)
+    assert report["evaluations"] == sum(stats["evaluations"] for stats in members) > 0
+    for stats in members:
+        random.seed(stats["seed"])
+        np.random.seed(stats["seed"])
+        dir_path = str(tmp_path / f"standalone_{stats['member']}")
+        if stats["algorithm"] == "local_search":
+            standalone = local_search_algorithm(grid.copy(), **LOCAL_SEARCH_OPTIONS, dir_path=dir_path)
+        else:
+            cache = EvaluationCache()
+            monkeypatch.setattr(evaluation_cache_module, "evaluation_cache", cache)
+            monkeypatch.setattr(genetic_algo, "evaluation_cache", cache)
+            standalone = genetic_algorithm(**GENETIC_ALGORITHM_OPTIONS, initial_grid=grid.copy(), dir_path=dir_path)
+        assert (stats["grid"], stats["paths"], stats["best_score"]) == standalone
@@ -0,0 +1,53 @@
+import math
+import os
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from utils.genome import GenomeLayout, Genome, crossover_genomes
+from utils.helper import best_path_retention, generate_neighbor
+from algorithms.a_star_algo import find_all_shortest_paths
+from algorithms.cost_function import calculate_fitness
+from scaling_sweep import SWEEP_ALGORITHMS, run_point
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+# (width, height) before the border, wider and taller than square
+SIZES = [(15, 9), (9, 15)]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_sweep_point_runs_both_optimizers_on_non_square_grids(size, tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    rows = run_point(*size, 6, 2, 0, 1, SWEEP_ALGORITHMS, {"max_iterations": 10},
+                     {"population_size": 4, "generations": 2, "mutation_rate": 0.5}, str(tmp_path))
+    assert [row["algorithm"] for row in rows] == list(SWEEP_ALGORITHMS)
+    assert all(math.isfinite(row["final_cost"]) for row in rows)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("seed", range(5))
+def test_crossover_copies_the_cells_along_the_kept_paths(size, seed):
+    random.seed(seed)
+    grid = place_intersections_in_every_column_randomly(
+        generate_city_grid_with_only_bordering_intersections(*size, 6, 2))
+    neighbor = generate_neighbor(grid)
+    paths, new_paths = find_all_shortest_paths(grid), find_all_shortest_paths(neighbor)
+    fitness_scores, new_fitness_scores = calculate_fitness(grid, paths), calculate_fitness(neighbor, new_paths)
+
+    merged_grid = best_path_retention(grid, neighbor, paths, new_paths)
+    # Path nodes are (x, y): the intersections left are those of the cells at row y, column x of the kept paths
+    new_paths_dict = {path[0][0]: path for path in new_paths}
+    expected = set()
+    for path in paths:
+        building = path[0][0]
+        if fitness_scores.get(building, math.inf) <= new_fitness_scores.get(building, math.inf):
+            kept_grid, kept_path = grid, path
+        else:
+            kept_grid, kept_path = neighbor, new_paths_dict[building]
+        expected |= {(y, x) for (x, y), _ in kept_path if (y, x) in kept_grid.intersections()}
+    assert set(merged_grid.intersections()) <= expected
+
+    layout = GenomeLayout(grid)
+    child = crossover_genomes(Genome.from_grid(layout, grid), Genome.from_grid(layout, neighbor), paths,
+                              new_paths, fitness_scores, new_fitness_scores)
+    assert child.to_grid() == merged_grid
@@ -0,0 +1,103 @@
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from algorithms.a_star_algo import a_star, a_star_multiple_goals, find_all_shortest_paths, find_all_path_costs
+from algorithms.transition_graph import TransitionGraph
+from algorithms.indexed_search import choose_nearest_service, find_a_star_path, route_length_bounds, \
+    search_from_emergency_services
+from algorithms.batch_evaluation import batch_evaluate
+from algorithms.corridor_graph import CorridorGraph
+from algorithms.hierarchical_search import HierarchicalGraph
+
+# (size, buildings, emergency services), the smallest grids having penalty-free intersections
+SCENARIOS = [(5, 3, 2), (7, 5, 2), (9, 8, 3), (15, 18, 4)]
+SEEDS = range(100)
+
+
+def square_grid(size, num_buildings, num_emergency_services, seed):
+    random.seed(seed)
+    grid = generate_city_grid_with_only_bordering_intersections(size, size, num_buildings, num_emergency_services)
+    return place_intersections_in_every_column_randomly(grid)
+
+
+def a_star_paths(grid):
+    """
+    The paths of the original search: one `a_star_multiple_goals` per building, in row-major order.
+    """
+    paths = []
+    for y in range(len(grid)):
+        for x in range(len(grid[0])):
+            if grid[y][x] == 1:
+                path = a_star_multiple_goals(grid, ((x, y), None))
+                if path:
+                    paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_backward_search_reproduces_a_star_paths(scenario, seed):
+    grid = square_grid(*scenario, seed)
+    assert find_all_shortest_paths(grid) == a_star_paths(grid)
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+@pytest.mark.parametrize("seed", range(20))
+def test_searches_over_a_compiled_graph_find_the_same_paths(scenario, seed):
+    grid = square_grid(*scenario, seed)
+    graph = TransitionGraph(grid)
+    for building_y, building_x in grid.buildings():
+        start = ((building_x, building_y), None)
+        for service_y, service_x in grid.emergency_services():
+            goal = ((service_x, service_y), None)
+            assert a_star(grid, start, goal, graph) == a_star(grid, start, goal)
+        assert a_star_multiple_goals(grid, start, graph) == a_star_multiple_goals(grid, start)
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS + [(31, 60, 8)])
+@pytest.mark.parametrize("seed", range(10))
+def test_a_star_fallback_only_searches_services_that_can_win(scenario, seed):
+    grid = square_grid(*scenario, seed)
+    graph = TransitionGraph(grid)
+    labels, _ = search_from_emergency_services(graph)
+    for cell in graph.buildings():
+        bounds = route_length_bounds(graph, [service_labels.__getitem__ for service_labels in labels], cell)
+        assert (bounds is None) == (graph.height < 8)
+        assert find_a_star_path(graph, cell, bounds) == find_a_star_path(graph, cell)
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+@pytest.mark.parametrize("seed", range(20))
+def test_compressed_graphs_reproduce_a_star_paths(scenario, seed):
+    grid = square_grid(*scenario, seed)
+    reference_paths = a_star_paths(grid)
+    assert find_all_shortest_paths(grid, CorridorGraph(grid)) == reference_paths
+    assert find_all_shortest_paths(grid, HierarchicalGraph(grid, block_size=4)) == reference_paths
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS[2:] + [(31, 60, 8)])  # A* finds cheapest routes from 8 rows on
+@pytest.mark.parametrize("seed", range(20))
+def test_inexact_hierarchical_graphs_keep_the_routes_the_labels_choose(scenario, seed):
+    grid = square_grid(*scenario, seed)
+    graph = TransitionGraph(grid)
+    labels, _ = search_from_emergency_services(graph)
+    path_costs = find_all_path_costs(grid, graph)
+    inexact_path_costs = find_all_path_costs(grid, HierarchicalGraph(grid, block_size=4, exact=False))
+
+    assert list(inexact_path_costs) == list(path_costs)
+    for cell in graph.buildings():
+        (label, _), _ = choose_nearest_service(graph, labels, graph.state_count + cell)
+        cost, path_length, _ = inexact_path_costs[divmod(cell, graph.height)]
+        assert (cost, path_length) == divmod(label, graph.label_base)
+        assert path_length <= path_costs[divmod(cell, graph.height)][1]
+    inexact_paths = find_all_shortest_paths(grid, HierarchicalGraph(grid, block_size=4, exact=False))
+    assert [len(path) for path in inexact_paths] == [path_length for _, path_length, _ in inexact_path_costs.values()]
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+@pytest.mark.parametrize("seed", range(20))
+def test_batch_evaluation_reproduces_a_star_paths(scenario, seed):
+    grid = square_grid(*scenario, seed)
+    population = [grid] + [place_intersections_in_every_column_randomly(grid.copy()) for _ in range(3)]
+    assert [paths for paths, _ in batch_evaluate(population)] == [a_star_paths(member) for member in population]
@@ -0,0 +1,151 @@
+import math
+import os
+import random
+import numpy as np
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from utils.genome import GenomeLayout, Genome
+from algorithms import genetic_algo, local_search
+from algorithms.a_star_algo import find_all_shortest_paths
+from algorithms.cost_function import calculate_fitness
+from algorithms.surrogate import SurrogateModel, prescreen, rank_correlation, rank_data
+from algorithms.genetic_algo import genetic_algorithm
+from algorithms.local_search import local_search_algorithm
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+
+
+def average_fitness(grid):
+    fitness_scores = calculate_fitness(grid, find_all_shortest_paths(grid))
+    return sum(fitness_scores.values()) / len(fitness_scores)
+
+
+def trained_model(seed, samples=30):
+    random.seed(seed)
+    initial_grid = generate_city_grid_with_only_bordering_intersections()
+    grids = [place_intersections_in_every_column_randomly(initial_grid.copy()) for _ in range(samples)]
+    model = SurrogateModel(initial_grid)
+    scores = [average_fitness(grid) for grid in grids]
+    # The second batch is predicted by the model fitted on the first
+    model.observe(grids[:model.min_samples], scores[:model.min_samples])
+    model.observe(grids[model.min_samples:], scores[model.min_samples:])
+    return model, initial_grid
+
+
+def test_rank_data_averages_the_ranks_of_ties():
+    assert rank_data([3.0, 1.0, 3.0, 2.0]).tolist() == [2.5, 0.0, 2.5, 1.0]
+    assert rank_correlation([1, 2, 3], [10, 20, 30]) == 1.0
+    assert rank_correlation([1, 2, 3], [30, 20, 10]) == -1.0
+    assert math.isnan(rank_correlation([1, 2, 3], [5, 5, 5]))
+    assert math.isnan(rank_correlation([1], [1]))
+
+
+def test_model_ranks_only_once_ready():
+    random.seed(0)
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    model = SurrogateModel(grid, min_samples=3)
+    grids = [grid] * 4
+
+    assert np.isnan(model.predict(grids)).all()
+    assert prescreen(model, grids, 0.5) == [0, 1, 2, 3]
+    model.observe(grids[:3], [1.0, math.inf, 2.0])  # The given-up evaluation is ignored
+    assert not model.ready and model.predictions == []
+    model.observe(grids[:1], [3.0])
+    assert model.ready and model.predictions == []  # Not predicted before being learned from
+    model.observe(grids[:1], [4.0])
+    assert len(model.predictions) == 1 and model.exact_scores == [4.0]
+    model.observe(grids[:2], [5.0, math.inf], cutoff=6.0)  # The given-up evaluation scores at least the cutoff
+    assert model.exact_scores == [4.0, 5.0, 6.0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_prescreen_keeps_the_lowest_estimates_in_order(seed):
+    model, initial_grid = trained_model(seed)
+    random.seed(seed + 100)
+    grids = [place_intersections_in_every_column_randomly(initial_grid.copy()) for _ in range(7)]
+    estimates = model.predict(grids)
+
+    kept = prescreen(model, grids, 0.4)
+    assert len(kept) == 3 and kept == sorted(kept)
+    assert max(estimates[kept]) <= min(np.delete(estimates, kept))
+    assert prescreen(model, grids, 1.0) == list(range(7))
+    assert len(prescreen(model, grids, 0.01)) == 1
+
+    layout = GenomeLayout(initial_grid)
+    genomes = [Genome.from_grid(layout, grid) for grid in grids]
+    assert np.allclose(model.predict(genomes), estimates)
+    assert model.report().startswith(f"Surrogate: rank correlation {model.rank_correlation():.2f} over 10 ")
+
+
+class RecordingSurrogateModel(SurrogateModel):
+    """A surrogate model remembering the grids it was asked to rank and the grids it learned from."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ranked, self.observed = [], []
+
+    def predict(self, grids):
+        self.ranked.extend(grids)
+        return super().predict(grids)
+
+    def observe(self, grids, scores, cutoff=None):
+        self.observed.append((list(grids), list(scores), cutoff))
+        super().observe(grids, scores, cutoff)
+
+
+def test_local_search_learns_the_scores_of_the_neighbors_it_ranks(tmp_path, monkeypatch):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    models = []
+    monkeypatch.setattr(local_search, "SurrogateModel",
+                        lambda *args, **kwargs: models.append(RecordingSurrogateModel(*args, **kwargs)) or models[-1])
+
+    random.seed(0)
+    local_search_algorithm(generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2), max_iterations=40,
+                           num_candidates=4, max_workers=1, early_abort=True, screen_fraction=0.5,
+                           dir_path=str(tmp_path))
+
+    model, = models
+    observed = [grid for grids, _, _ in model.observed for grid in grids]
+    given_up = sum(score == math.inf for _, scores, _ in model.observed for score in scores)
+    ranked = set(map(id, model.ranked))
+    assert model.predictions and all(id(grid) in ranked for grid in observed[-len(model.predictions):])
+    assert given_up > 0 and len(model.exact_scores) == len(model.predictions)  # Nothing is dropped
+    assert all(cutoff is not None and math.isfinite(cutoff) for _, _, cutoff in model.observed)
+
+
+class UnusedSurrogateModel:
+    def __init__(self, *args, **kwargs):
+        raise AssertionError("The surrogate model is built although the screen is off")
+
+
+def test_screen_is_off_at_a_fraction_of_one(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    monkeypatch.setattr(local_search, "SurrogateModel", UnusedSurrogateModel)
+    monkeypatch.setattr(genetic_algo, "SurrogateModel", UnusedSurrogateModel)
+
+    random.seed(0)
+    local_search_algorithm(generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2), max_iterations=10,
+                           num_candidates=4, max_workers=1, screen_fraction=1.0, dir_path=str(tmp_path / "local"))
+    random.seed(0)
+    genetic_algorithm(8, 2, 0.5, generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2),
+                      screen_fraction=1.0, dir_path=str(tmp_path / "genetic"))
+
+    output = capsys.readouterr().out
+    assert "Surrogate:" not in output and " 0 screened out" in output
+
+
+def test_screened_runs_report_the_rank_correlation(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+
+    random.seed(0)
+    local_search_algorithm(generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2), max_iterations=15,
+                           num_candidates=4, max_workers=1, screen_fraction=0.5, dir_path=str(tmp_path / "local"))
+    random.seed(0)
+    genetic_algorithm(10, 4, 0.5, generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2),
+                      screen_fraction=0.5, dir_path=str(tmp_path / "genetic"))
+
+    output = capsys.readouterr().out
+    assert output.count("Surrogate: rank correlation") == 2
+    screened_out = [int(line.split(" immigrants, ")[1].split()[0]) for line in output.splitlines()
+                    if "screened out" in line]
+    assert screened_out[0] == 0 and sum(screened_out) > 0
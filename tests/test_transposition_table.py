@@ -0,0 +1,64 @@
+import os
+import random
+import pytest
+from utils.grid_generation import generate_city_grid_with_only_bordering_intersections, \
+    place_intersections_in_every_column_randomly
+from utils.helper import generate_neighbor, best_path_retention
+from algorithms.a_star_algo import find_all_shortest_paths
+from algorithms.transposition_table import TranspositionTable
+from algorithms.local_search import local_search_algorithm
+
+RES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+SEEDS = range(10)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_incremental_hash_matches_a_full_hash(seed):
+    random.seed(seed)
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    table = TranspositionTable(grid.shape)
+    configuration_hash = table.hash_grid(grid)
+
+    for _ in range(10):
+        neighbor = generate_neighbor(grid)
+        merged_grid = best_path_retention(grid, neighbor, find_all_shortest_paths(grid),
+                                          find_all_shortest_paths(neighbor))
+        for new_grid in (neighbor, merged_grid):
+            assert table.update_hash(configuration_hash, grid.changed_cells(new_grid)) == table.hash_grid(new_grid)
+        configuration_hash = table.update_hash(configuration_hash, grid.changed_cells(merged_grid))
+        grid = merged_grid
+    assert table.update_hash(configuration_hash, []) == configuration_hash
+
+
+def test_tables_leave_the_random_stream_alone():
+    random.seed(0)
+    state = random.getstate()
+    first, second = TranspositionTable((17, 17)), TranspositionTable((17, 17))
+    assert random.getstate() == state
+    grid = place_intersections_in_every_column_randomly(generate_city_grid_with_only_bordering_intersections())
+    assert first.hash_grid(grid) == second.hash_grid(grid) != TranspositionTable((17, 17), seed=1).hash_grid(grid)
+
+
+def test_least_recently_used_configurations_are_evicted_first():
+    table = TranspositionTable((5, 5), max_entries=2)
+    table.store(1, 10.0)
+    table.store(2, 20.0)
+    assert table.lookup(1) == 10.0  # Now the most recently used
+    table.store(3, 30.0)
+
+    assert (table.lookup(2), table.lookup(1), table.lookup(3)) == (None, 10.0, 30.0)
+    assert (len(table), table.hits, table.misses, table.evictions) == (2, 3, 1, 1)
+    assert table.hit_rate() == 3 / 4
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_local_search_accepts_the_same_candidates_with_or_without_the_table(seed, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(RES_DIR)  # The visualizations load their images from RES_DIR
+    results = []
+    for max_table_entries in (0, 2, 65536):
+        random.seed(seed)
+        initial_grid = generate_city_grid_with_only_bordering_intersections(9, 9, 6, 2)
+        results.append(local_search_algorithm(initial_grid, max_iterations=40, max_table_entries=max_table_entries,
+                                              dir_path=str(tmp_path / str(max_table_entries))))
+    assert results[0] == results[1] == results[2]
+    assert "Transposition table: 0 hits" not in capsys.readouterr().out